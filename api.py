@@ -0,0 +1,434 @@
+"""Headless HTTP/JSON API for Bharat Tutor.
+
+Exposes the same tutoring features as the Streamlit app for LMS and mobile
+clients. Run a single worker with ``python api.py`` or scale out with
+``uvicorn api:app --workers 4``; every worker keeps its own process-wide
+clients and caches.
+
+Text endpoints accept ``"stream": true`` and then answer with server-sent
+events: ``chunk`` events carry text (or a quiz question) and a final
+``done`` or ``error`` event closes the stream.
+"""
+import os
+import json
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Iterator, Optional, Tuple
+
+from dotenv import load_dotenv
+
+# Module settings are read from the environment at import time
+load_dotenv()
+
+from starlette.applications import Starlette
+from starlette.concurrency import iterate_in_threadpool, run_in_threadpool
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+from modules.key_pool import GeminiKeyPool, NoAvailableKeyError
+from modules.gemini_client import BREAKER
+from modules.resilience import CircuitOpenError
+from modules.knowledge_base import NCERTKnowledgeBase
+from modules.quiz_generator import QuizGenerator
+from modules.conversation_memory import ConversationMemory
+from modules.token_budget import TokenBudget, PromptTooLargeError, TOKEN_USAGE
+from modules.cache import ExplanationCache, get_shared_cache
+from modules.analytics import LearnerAnalytics, ASK, EXPLAIN, HOMEWORK, PERIOD_SECONDS
+from modules.snapshot import get_snapshot, section_name
+
+MAX_STUDENT_MEMORIES = int(os.getenv("API_MAX_STUDENT_MEMORIES", "10000"))
+
+# Oversized input is rejected before retrieval or any model call
+token_budget = TokenBudget()
+
+_lock = threading.Lock()
+_gemini_client = None
+_knowledge_base = None
+_quiz_generator = None
+_analytics = None
+_explanation_cache = None
+# Per-student conversation memory and the snapshot version it matches, least recently used first
+_memories: "OrderedDict[str, Tuple[ConversationMemory, Optional[Tuple[int, int]]]]" = OrderedDict()
+
+
+class BadRequest(Exception):
+    """Raised for a malformed request body."""
+
+
+def get_gemini_client() -> GeminiKeyPool:
+    """Process-wide Gemini key pool, created on first use."""
+    global _gemini_client
+    with _lock:
+        if _gemini_client is None:
+            if not (os.getenv("GEMINI_API_KEYS") or os.getenv("GEMINI_API_KEY")):
+                raise RuntimeError("GEMINI_API_KEYS or GEMINI_API_KEY must be set")
+            _gemini_client = GeminiKeyPool.from_env()
+        return _gemini_client
+
+
+def get_knowledge_base() -> NCERTKnowledgeBase:
+    """Process-wide knowledge base, created on first use."""
+    global _knowledge_base
+    with _lock:
+        if _knowledge_base is None:
+            _knowledge_base = NCERTKnowledgeBase(
+                cache=get_shared_cache().child("retrieval"), snapshot=get_snapshot()
+            )
+        return _knowledge_base
+
+
+def get_quiz_generator() -> QuizGenerator:
+    """Process-wide quiz generator sharing the Gemini client."""
+    global _quiz_generator
+    client = get_gemini_client()
+    knowledge_base = get_knowledge_base()
+    with _lock:
+        if _quiz_generator is None:
+            _quiz_generator = QuizGenerator(
+                client, quiz_bank=get_shared_cache().child("quiz_bank"), knowledge_base=knowledge_base,
+                snapshot=get_snapshot()
+            )
+        return _quiz_generator
+
+
+def get_explanation_cache() -> ExplanationCache:
+    """Process-wide explanation cache, opened on first use rather than at import."""
+    global _explanation_cache
+    with _lock:
+        if _explanation_cache is None:
+            _explanation_cache = ExplanationCache(store=get_shared_cache().child("explanations"))
+        return _explanation_cache
+
+
+def get_analytics() -> LearnerAnalytics:
+    """Process-wide learner analytics; each worker writes its own shard."""
+    global _analytics
+    with _lock:
+        if _analytics is None:
+            _analytics = LearnerAnalytics()
+        return _analytics
+
+
+def get_memory(student_id: str) -> ConversationMemory:
+    """Conversation memory for a student, evicting the least recently used.
+
+    Memories are restored from the snapshot, and reloaded when another worker
+    has saved a newer version, so workers do not serve or overwrite stale
+    histories.
+    """
+    snapshot = get_snapshot()
+    name = section_name("memory", student_id)
+    version = snapshot.version(name, fresh=True) if snapshot is not None else None
+    with _lock:
+        memory, cached_version = _memories.pop(student_id, (None, None))
+        if memory is None or cached_version != version:
+            saved = snapshot.get(name) if version is not None else None
+            memory = ConversationMemory.from_dict(saved) if saved else ConversationMemory()
+        _memories[student_id] = (memory, version)
+        while len(_memories) > MAX_STUDENT_MEMORIES:
+            _memories.popitem(last=False)
+        return memory
+
+
+def save_memory(student_id: str, memory: ConversationMemory):
+    """Write a student's memory to the snapshot and note the version this worker holds."""
+    snapshot = get_snapshot()
+    if snapshot is None:
+        return
+    name = section_name("memory", student_id)
+    snapshot.put(name, memory.to_dict())
+    version = snapshot.version(name)
+    with _lock:
+        if student_id in _memories:
+            _memories[student_id] = (memory, version)
+
+
+async def read_body(request: Request, *required: str) -> Dict[str, Any]:
+    """Parse the JSON body and check that required fields are present."""
+    try:
+        body = await request.json()
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        raise BadRequest("Request body must be valid JSON")
+    if not isinstance(body, dict):
+        raise BadRequest("Request body must be a JSON object")
+
+    missing = [field for field in required if not str(body.get(field, "")).strip()]
+    if missing:
+        raise BadRequest(f"Missing required field(s): {', '.join(missing)}")
+    return body
+
+
+def sse_event(event: str, data: Any) -> str:
+    """Format one server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def sse_response(chunks: Iterator[Any], on_complete=None) -> StreamingResponse:
+    """Stream a blocking iterator as server-sent events without blocking the event loop."""
+    async def events() -> AsyncIterator[str]:
+        collected = []
+        try:
+            async for chunk in iterate_in_threadpool(chunks):
+                collected.append(chunk)
+                yield sse_event("chunk", {"text": chunk} if isinstance(chunk, str) else chunk)
+            if on_complete:
+                await run_in_threadpool(on_complete, collected)
+            yield sse_event("done", {})
+        except Exception as e:
+            logging.error(f"Error while streaming response: {e}")
+            yield sse_event("error", {"error": str(e)})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+async def health(request: Request) -> JSONResponse:
+    status: Dict[str, Any] = {"status": "ok", "upstream_circuit": BREAKER.state}
+    if _gemini_client is not None:
+        status["keys"] = _gemini_client.stats()
+        status["tokens"] = TOKEN_USAGE.stats()
+    return JSONResponse(status)
+
+
+async def ask(request: Request):
+    body = await read_body(request, "question", "subject", "class_level")
+    question, subject, class_level = body["question"], body["subject"], body["class_level"]
+    token_budget.check(question=question)
+    student_id = str(body["student_id"]) if body.get("student_id") else None
+
+    client = get_gemini_client()
+    context = await run_in_threadpool(get_knowledge_base().get_relevant_content, question, subject, class_level)
+
+    def remember(answer: str):
+        if student_id:
+            # Fetched after answering, so a save by another worker meanwhile is not overwritten
+            memory = get_memory(student_id)
+            memory.add_conversation(question, answer, subject, class_level)
+            save_memory(student_id, memory)
+            get_analytics().record_activity(student_id, ASK, subject, class_level)
+
+    if body.get("stream"):
+        return sse_response(
+            client.stream_answer(question, context, subject, class_level),
+            on_complete=lambda chunks: remember("".join(chunks))
+        )
+
+    answer = await run_in_threadpool(client.answer_question, question, context, subject, class_level)
+    # Snapshot and analytics writes block on disk and file locks
+    await run_in_threadpool(remember, answer)
+    return JSONResponse({"answer": answer})
+
+
+async def explain(request: Request):
+    body = await read_body(request, "topic", "subject", "class_level")
+    topic, subject, class_level = body["topic"], body["subject"], body["class_level"]
+    explanation_type = body.get("explanation_type", "Summary")
+    token_budget.check(topic=topic)
+
+    client = get_gemini_client()
+    knowledge_base = get_knowledge_base()
+
+    if body.get("stream"):
+        context = await run_in_threadpool(knowledge_base.get_relevant_content, topic, subject, class_level)
+        return sse_response(client.stream_explanation(topic, context, subject, class_level, explanation_type))
+
+    explanation = await run_in_threadpool(
+        get_explanation_cache().explain, client, knowledge_base, topic, subject, class_level, explanation_type
+    )
+    if body.get("student_id"):
+        await run_in_threadpool(
+            lambda: get_analytics().record_activity(str(body["student_id"]), EXPLAIN, subject, class_level,
+                                                    knowledge_base.topic_name(topic, subject, class_level))
+        )
+    return JSONResponse({"explanation": explanation})
+
+
+async def homework(request: Request):
+    body = await read_body(request, "problem", "subject", "class_level")
+    problem, subject, class_level = body["problem"], body["subject"], body["class_level"]
+    help_type = body.get("help_type", "Step-by-step solution")
+    token_budget.check(problem=problem)
+
+    client = get_gemini_client()
+    context = await run_in_threadpool(get_knowledge_base().get_relevant_content, problem, subject, class_level)
+
+    if body.get("stream"):
+        return sse_response(client.stream_homework_help(problem, context, subject, class_level, help_type))
+
+    help_response = await run_in_threadpool(
+        client.provide_homework_help, problem, context, subject, class_level, help_type
+    )
+    if body.get("student_id"):
+        await run_in_threadpool(
+            lambda: get_analytics().record_activity(str(body["student_id"]), HOMEWORK, subject, class_level)
+        )
+    return JSONResponse({"help": help_response})
+
+
+async def quiz_generate(request: Request):
+    body = await read_body(request, "chapter", "subject", "class_level")
+    try:
+        num_questions = int(body.get("num_questions", 5))
+    except (TypeError, ValueError):
+        raise BadRequest("num_questions must be an integer")
+    if num_questions < 1:
+        raise BadRequest("num_questions must be at least 1")
+    params = (
+        body["chapter"], body["subject"], body["class_level"],
+        num_questions, body.get("difficulty", "Medium"),
+        body.get("question_type", "Multiple Choice")
+    )
+    token_budget.check(chapter=body["chapter"])
+    quiz_generator = get_quiz_generator()
+
+    if body.get("stream"):
+        # Each chunk event carries one complete question
+        return sse_response(quiz_generator.generate_quiz_stream(*params))
+
+    quiz_data = await run_in_threadpool(quiz_generator.generate_quiz, *params)
+    return JSONResponse(quiz_data, status_code=502 if quiz_data.get("error") else 200)
+
+
+async def quiz_evaluate(request: Request):
+    body = await read_body(request, "quiz")
+    quiz = body["quiz"]
+    if not isinstance(quiz, dict) or not isinstance(quiz.get("questions"), list):
+        raise BadRequest("quiz must be a JSON object with a list of questions")
+    for field in ("answers", "answer_matrix", "student_ids"):
+        if field in body and not isinstance(body[field], list):
+            raise BadRequest(f"{field} must be a list")
+    quiz_generator = get_quiz_generator()
+    subject, class_level = quiz.get("subject", ""), quiz.get("class_level", "")
+
+    def evaluate() -> Dict[str, Any]:
+        # Progress is tracked per curriculum topic, however the chapter was worded
+        chapter = get_knowledge_base().topic_name(quiz.get("chapter", ""), subject, class_level)
+        if "answer_matrix" in body:
+            result = quiz_generator.evaluate_quiz_batch(quiz, body["answer_matrix"], body.get("student_ids"))
+            if not result.get("error") and body.get("student_ids"):
+                get_analytics().record_quizzes(
+                    [student["student_id"] for student in result["students"]], subject, class_level, chapter,
+                    [student["score"] for student in result["students"]], result["total_questions"]
+                )
+        else:
+            result = quiz_generator.evaluate_quiz(quiz, body.get("answers", []))
+            if not result.get("error") and body.get("student_id"):
+                get_analytics().record_quiz(
+                    str(body["student_id"]), subject, class_level, chapter, result["score"], result["total"]
+                )
+        return result
+
+    # Grading and the analytics write (which may save a shard) both block
+    result = await run_in_threadpool(evaluate)
+    return JSONResponse(result, status_code=400 if result.get("error") else 200)
+
+
+async def student_progress(request: Request) -> JSONResponse:
+    student_id = request.path_params["student_id"]
+    subject = request.query_params.get("subject")
+    period = request.query_params.get("period", "week")
+    if period not in PERIOD_SECONDS:
+        raise BadRequest(f"period must be one of: {', '.join(PERIOD_SECONDS)}")
+
+    def progress() -> Dict[str, Any]:
+        # Queries first re-read other workers' shards that changed
+        analytics = get_analytics()
+        return {
+            "summary": analytics.student_summary(student_id),
+            "weak_topics": analytics.weak_topics(student_id, subject),
+            "mastery_over_time": analytics.mastery_over_time(student_id, subject, period),
+        }
+
+    return JSONResponse(await run_in_threadpool(progress))
+
+
+async def class_analytics(request: Request) -> JSONResponse:
+    limit = request.query_params.get("limit")
+    return JSONResponse(await run_in_threadpool(
+        lambda: get_analytics().class_aggregates(
+            request.query_params.get("class_level"), request.query_params.get("subject"),
+            int(limit) if limit and limit.isdigit() else None
+        )
+    ))
+
+
+async def prewarm_explanations():
+    """Start generating summaries of the first topics of every class in the background."""
+    if not (os.getenv("GEMINI_API_KEYS") or os.getenv("GEMINI_API_KEY")):
+        return
+    knowledge_base = get_knowledge_base()
+    get_explanation_cache().prewarm_all(
+        get_gemini_client(), knowledge_base,
+        [(subject, class_level)
+         for subject, classes in knowledge_base.knowledge_base.items() for class_level in classes]
+    )
+
+
+@asynccontextmanager
+async def lifespan(app):
+    await prewarm_explanations()
+    yield
+    if _analytics is not None:
+        await run_in_threadpool(_analytics.save)
+
+
+async def bad_request(request: Request, exc: BadRequest) -> JSONResponse:
+    return JSONResponse({"error": str(exc)}, status_code=400)
+
+
+async def prompt_too_large(request: Request, exc: PromptTooLargeError) -> JSONResponse:
+    return JSONResponse({"error": str(exc)}, status_code=413)
+
+
+async def keys_exhausted(request: Request, exc: NoAvailableKeyError) -> JSONResponse:
+    return JSONResponse({"error": str(exc)}, status_code=503, headers={"Retry-After": "30"})
+
+
+async def upstream_down(request: Request, exc: CircuitOpenError) -> JSONResponse:
+    return JSONResponse(
+        {"error": str(exc)}, status_code=503, headers={"Retry-After": str(max(1, round(BREAKER.retry_after())))}
+    )
+
+
+async def server_error(request: Request, exc: Exception) -> JSONResponse:
+    logging.error(f"Unhandled API error: {exc}")
+    return JSONResponse({"error": str(exc)}, status_code=500)
+
+
+app = Starlette(
+    lifespan=lifespan,
+    routes=[
+        Route("/healthz", health, methods=["GET"]),
+        Route("/api/ask", ask, methods=["POST"]),
+        Route("/api/explain", explain, methods=["POST"]),
+        Route("/api/homework", homework, methods=["POST"]),
+        Route("/api/quiz/generate", quiz_generate, methods=["POST"]),
+        Route("/api/quiz/evaluate", quiz_evaluate, methods=["POST"]),
+        Route("/api/students/{student_id}/progress", student_progress, methods=["GET"]),
+        Route("/api/analytics/classes", class_analytics, methods=["GET"]),
+    ],
+    exception_handlers={
+        BadRequest: bad_request,
+        PromptTooLargeError: prompt_too_large,
+        NoAvailableKeyError: keys_exhausted,
+        CircuitOpenError: upstream_down,
+        Exception: server_error,
+    },
+)
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(
+        "api:app",
+        host=os.getenv("API_HOST", "0.0.0.0"),
+        port=int(os.getenv("API_PORT", "8000")),
+        workers=int(os.getenv("API_WORKERS", "1")),
+    )
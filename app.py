@@ -1,14 +1,23 @@
 import streamlit as st
 import os
+import uuid
+import atexit
+from dotenv import load_dotenv
+
+# Module settings are read from the environment at import time
+load_dotenv()
+
 from modules.gemini_client import GeminiClient
 from modules.knowledge_base import NCERTKnowledgeBase
-from modules.quiz_generator import QuizGenerator
-from modules.conversation_memory import ConversationMemory
-
-# Initialize session state variables
-if 'conversation_memory' not in st.session_state:
-    st.session_state.conversation_memory = ConversationMemory()
+from modules.session_manager import SessionManager
+from modules.job_queue import JobQueue, DONE, FAILED
+from modules.cache import ExplanationCache, get_shared_cache
+from modules.analytics import LearnerAnalytics, ASK, EXPLAIN, HOMEWORK
+from modules.answer_render import render_answer, rendered_for, LATEX
+from modules.snapshot import get_snapshot
+from modules.profiling import span, traced
 
+# Initialize session state variables; history and quizzes are kept by the session manager
 if 'api_key' not in st.session_state:
     st.session_state.api_key = os.getenv("GEMINI_API_KEY", "")
 
@@ -18,8 +27,117 @@ if 'gemini_client' not in st.session_state:
 if 'knowledge_base' not in st.session_state:
     st.session_state.knowledge_base = None
 
-if 'quiz_generator' not in st.session_state:
-    st.session_state.quiz_generator = None
+if 'jobs' not in st.session_state:
+    # Latest job ID per learning mode, so results survive reruns
+    st.session_state.jobs = {}
+
+if 'handled_jobs' not in st.session_state:
+    st.session_state.handled_jobs = set()
+
+if 'student_id' not in st.session_state:
+    # Anonymous learner ID for progress analytics
+    st.session_state.student_id = uuid.uuid4().hex
+
+# Longest a panel waits for its job; Gemini calls time out well before this
+JOB_WAIT_TIMEOUT = float(os.getenv("BHARATTUTOR_JOB_WAIT_TIMEOUT", "180"))
+
+@st.cache_resource
+def get_job_queue():
+    """Process-wide job queue shared by all sessions."""
+    return JobQueue()
+
+@st.cache_resource
+def get_explanation_cache():
+    """Process-wide topic explanation cache shared by all sessions."""
+    return ExplanationCache(store=get_shared_cache().child("explanations"))
+
+@st.cache_resource
+def get_analytics():
+    """Process-wide learner analytics store shared by all sessions."""
+    analytics = LearnerAnalytics()
+    # Events since the last autosave are only in memory; write them when the server stops
+    atexit.register(analytics.save)
+    return analytics
+
+@st.cache_resource
+def get_session_manager():
+    """Process-wide owner of per-session history and quiz state, spilled to disk when idle."""
+    return SessionManager(snapshot=get_snapshot())
+
+def get_session():
+    """This session's history and quiz state, restored if it was spilled while idle."""
+    return get_session_manager().session(st.session_state.student_id)
+
+@st.cache_resource(max_entries=16)
+def get_gemini_client(api_key):
+    """Gemini client shared by every session using the same API key."""
+    return GeminiClient(api_key)
+
+@st.cache_resource
+def get_knowledge_base():
+    """Process-wide knowledge base; it is read-only in the app, so sessions share it."""
+    return NCERTKnowledgeBase(cache=get_shared_cache().child("retrieval"), snapshot=get_snapshot())
+
+@st.cache_resource(max_entries=16)
+def get_shared_quiz_generator(client_id, _gemini_client, _knowledge_base):
+    """Quiz generator shared by the sessions of one Gemini client."""
+    from modules.quiz_generator import QuizGenerator
+    return QuizGenerator(
+        _gemini_client, quiz_bank=get_shared_cache().child("quiz_bank"),
+        knowledge_base=_knowledge_base, snapshot=get_snapshot()
+    )
+
+def get_quiz_generator():
+    """Quiz generator for this session's client, created the first time a quiz is used."""
+    gemini_client = st.session_state.gemini_client
+    return get_shared_quiz_generator(id(gemini_client), gemini_client, st.session_state.knowledge_base)
+
+def submit_job(mode, kind, params, function):
+    """Run a generation task in the background and remember it for this mode."""
+    # Scoped to the session, as the task uses this session's client and history
+    st.session_state.jobs[mode] = get_job_queue().submit(kind, params, function, scope=st.session_state.student_id)
+
+def await_job(mode, message, on_progress=None):
+    """Wait for this mode's latest job, resuming after a rerun if needed."""
+    job_id = st.session_state.jobs.get(mode)
+    if not job_id:
+        return None
+    
+    job_queue = get_job_queue()
+    job = job_queue.get(job_id)
+    if job and job['status'] not in (DONE, FAILED):
+        with st.spinner(message), span("job.wait", mode=mode):
+            job = job_queue.wait(job_id, timeout=JOB_WAIT_TIMEOUT, on_progress=on_progress)
+        if job and job['status'] not in (DONE, FAILED):
+            # Forget the job so the next click submits a fresh one
+            st.session_state.jobs.pop(mode, None)
+            st.error("⏱️ This is taking much longer than usual. Please try again.")
+            return None
+    
+    if job and job['status'] == FAILED:
+        st.error(f"❌ {job['error']}")
+        if job['retryable'] and st.button("🔄 Retry", key=f"retry_{mode}"):
+            job_queue.retry(job_id)
+            st.rerun()
+    return job
+
+# Fragments rerun only the active panel on widget interaction (Streamlit >= 1.33)
+fragment = getattr(st, 'fragment', None) or getattr(st, 'experimental_fragment', None) or (lambda func: func)
+
+def show_answer(rendered):
+    """Display an answer prepared by render_answer, with large formulas typeset on their own."""
+    for kind, text in rendered['blocks']:
+        if kind == LATEX:
+            st.latex(text)
+        else:
+            st.markdown(text)
+
+def first_time_handled(job):
+    """True the first time a finished job is seen, so side effects run once."""
+    if job['id'] in st.session_state.handled_jobs:
+        return False
+    st.session_state.handled_jobs.add(job['id'])
+    return True
 
 # Sidebar for API Key input
 with st.sidebar:
@@ -34,10 +152,8 @@ with st.sidebar:
             st.session_state.api_key = api_key_input.strip()
             try:
                 # Test the API key by creating a client
-                test_client = GeminiClient(st.session_state.api_key)
-                st.session_state.gemini_client = test_client
-                st.session_state.knowledge_base = NCERTKnowledgeBase()
-                st.session_state.quiz_generator = QuizGenerator(st.session_state.gemini_client)
+                st.session_state.gemini_client = get_gemini_client(st.session_state.api_key)
+                st.session_state.knowledge_base = get_knowledge_base()
                 st.success("✅ API Key saved successfully!")
             except Exception as e:
                 st.error(f"❌ Invalid API Key. Please check and try again. Error: {str(e)}")
@@ -63,25 +179,23 @@ st.set_page_config(
 )
 
 # Load custom CSS
+@st.cache_resource(max_entries=16)
+def read_asset(path, mtime):
+    """Read a static asset once per process; a new mtime invalidates the entry."""
+    with open(path, encoding='utf-8') as f:
+        return f.read()
+
+def load_asset(path):
+    """Cached asset contents, reloaded only when the file changes on disk."""
+    return read_asset(path, os.path.getmtime(path))
+
 def load_css():
-    with open('static/styles.css') as f:
-        st.markdown(f'<style>{f.read()}</style>', unsafe_allow_html=True)
+    st.markdown(f'<style>{load_asset("static/styles.css")}</style>', unsafe_allow_html=True)
 
 load_css()
 
 # Modern header with improved design
-st.markdown("""
-<div class="bt-header">
-    <h1 class="bt-title">Bharat Tutor</h1>
-    <p class="bt-tagline">Personalized learning support for every student, every step of the way.</p>
-    <p class="bt-subtagline">Unlock your academic potential with expert guidance and interactive tools.</p>
-    <div class="bt-tags">
-        <span class="bt-tag">AI Powered</span>
-        <span class="bt-tag ncert">NCERT Based</span>
-        <span class="bt-tag classes">Classes 6-12</span>
-    </div>
-</div>
-""", unsafe_allow_html=True)
+st.markdown(load_asset('static/header.html'), unsafe_allow_html=True)
 
 # Sidebar with simplified layout
 with st.sidebar:
@@ -118,12 +232,12 @@ with st.sidebar:
     col1, col2 = st.columns(2)
     with col1:
         if st.button("🗑️ Clear History"):
-            st.session_state.conversation_memory.clear()
+            get_session()['conversation_memory'].clear()
             st.success("History cleared!")
     
     with col2:
         if st.button("📊 View Stats"):
-            stats = st.session_state.conversation_memory.get_statistics()
+            stats = get_session()['conversation_memory'].get_statistics()
             if stats['total_conversations'] > 0:
                 st.json(stats)
             else:
@@ -134,19 +248,30 @@ with st.sidebar:
     # Progress Section
     st.subheader("📈 Your Progress")
     
-    total_conversations = len(st.session_state.conversation_memory.get_history())
-    if total_conversations > 0:
+    progress = get_analytics().student_summary(st.session_state.student_id)
+    if progress['questions'] or progress['quizzes']:
         col1, col2 = st.columns(2)
         with col1:
-            st.metric("Questions", total_conversations, delta=None)
+            st.metric("Questions", progress['questions'], delta=None)
         
         with col2:
-            stats = st.session_state.conversation_memory.get_statistics()
-            if 'subjects_used' in stats:
-                most_active = stats.get('most_active_subject', 'None')
-                if len(most_active) > 8:
-                    most_active = most_active[:8] + "..."
-                st.metric("Top Subject", most_active)
+            most_active = progress['top_subject'] or 'None'
+            if len(most_active) > 8:
+                most_active = most_active[:8] + "..."
+            st.metric("Top Subject", most_active)
+        
+        if progress['quizzes']:
+            col1, col2 = st.columns(2)
+            with col1:
+                st.metric("Quizzes", progress['quizzes'])
+            with col2:
+                st.metric("Avg Score", f"{progress['average_percentage']:.0f}%")
+            
+            weak_topics = get_analytics().weak_topics(st.session_state.student_id, limit=3)
+            if weak_topics:
+                st.markdown("**Topics to revise:**")
+                for weak_topic in weak_topics:
+                    st.markdown(f"• {weak_topic['topic']} ({weak_topic['mastery']:.0f}%)")
     else:
         st.markdown("""
         <div style="text-align: center; padding: 1.5rem; background: #111111; border-radius: 10px; border: 1px solid #333;">
@@ -156,7 +281,9 @@ with st.sidebar:
         """, unsafe_allow_html=True)
 
 # Main content area with modern styling
-if feature == "Ask Doubts":
+@fragment
+@traced("mode:Ask Doubts")
+def ask_doubts_panel(subject, class_level):
     # Modern feature header
     st.markdown("""
     <div style="background: linear-gradient(135deg, #111111, #000000); padding: 2.5rem; border-radius: 20px; margin-bottom: 2rem; border: 1px solid #333; box-shadow: 0 8px 25px rgba(0, 255, 136, 0.1);">
@@ -174,18 +301,20 @@ if feature == "Ask Doubts":
     tab1, tab2 = st.tabs(["💬 Ask Question", "📚 Conversation History"])
     
     with tab2:
-        if st.session_state.conversation_memory.get_history():
+        history = get_session()['conversation_memory'].get_history()
+        if history:
             st.markdown("### 🕒 Your Learning History")
             
             # Display conversation history with enhanced styling
-            for i, entry in enumerate(st.session_state.conversation_memory.get_history()[-5:][::-1]):  # Show last 5, newest first
-                with st.expander(f"Q{len(st.session_state.conversation_memory.get_history())-i}: {entry['question'][:60]}{'...' if len(entry['question']) > 60 else ''}"):
+            for i, entry in enumerate(history[-5:][::-1]):  # Show last 5, newest first
+                with st.expander(f"Q{len(history)-i}: {entry['question'][:60]}{'...' if len(entry['question']) > 60 else ''}"):
                     col1, col2 = st.columns([3, 1])
                     with col1:
                         st.markdown(f"**🤔 Question:**")
                         st.write(entry['question'])
                         st.markdown(f"**💡 Answer:**")
-                        st.write(entry['answer'])
+                        # Rendered once when the answer was generated
+                        show_answer(rendered_for(entry))
                     with col2:
                         st.markdown(f"**📚 Subject:** {entry.get('subject', 'N/A')}")
                         st.markdown(f"**🎓 Class:** {entry.get('class', 'N/A')}")
@@ -221,55 +350,63 @@ if feature == "Ask Doubts":
         with col2:
             if st.button("🚀 Get Answer", type="primary", use_container_width=True):
                 if question:
-                    with st.spinner("🤖 AI is thinking... Please wait"):
-                        try:
-                            # Get relevant context from knowledge base
-                            context = st.session_state.knowledge_base.get_relevant_content(
-                                question, subject, class_level
-                            )
-                            
-                            # Generate answer using Gemini
-                            answer = st.session_state.gemini_client.answer_question(
-                                question, context, subject, class_level
-                            )
-                            
-                            # Store in conversation memory
-                            st.session_state.conversation_memory.add_conversation(
-                                question, answer, subject, class_level
-                            )
-                            
-                            # Display answer with enhanced styling
-                            st.success("✅ Answer generated successfully!")
-                            
-                            # Enhanced answer display
-                            st.markdown("""
-                            <div style="background: linear-gradient(135deg, #111111, #000000); padding: 2.5rem; border-radius: 15px; margin: 1.5rem 0; border-left: 5px solid #00ff88; box-shadow: 0 5px 15px rgba(0, 255, 136, 0.1);">
-                                <h3 style="color: #00ff88; margin-bottom: 1.5rem; font-size: 1.4rem; font-weight: 600;">💡 Your Answer</h3>
-                            </div>
-                            """, unsafe_allow_html=True)
-                            
-                            st.markdown(answer)
-                            
-                            # Add feedback options
-                            st.markdown("---")
-                            col1, col2, col3 = st.columns(3)
-                            with col1:
-                                if st.button("👍 Helpful"):
-                                    st.success("Thank you for your feedback!")
-                            with col2:
-                                if st.button("👎 Not helpful"):
-                                    st.info("We'll improve! Try rephrasing your question.")
-                            with col3:
-                                if st.button("🔄 Ask follow-up"):
-                                    st.info("Feel free to ask a related question!")
-                            
-                        except Exception as e:
-                            st.error(f"❌ Error generating answer: {str(e)}")
-                            st.info("💡 Try rephrasing your question or check your internet connection.")
+                    gemini_client = st.session_state.gemini_client
+                    knowledge_base = st.session_state.knowledge_base
+                    
+                    def answer_job(progress):
+                        # Get relevant context from knowledge base
+                        context = knowledge_base.get_relevant_content(question, subject, class_level)
+                        # Generate answer using Gemini
+                        return gemini_client.answer_question(question, context, subject, class_level)
+                    
+                    submit_job("ask", "answer_question",
+                               {"question": question, "subject": subject, "class_level": class_level},
+                               answer_job)
                 else:
                     st.warning("⚠️ Please enter a question to get started!")
+        
+        job = await_job("ask", "🤖 AI is thinking... Please wait")
+        if job and job['status'] == DONE:
+            answer = job['result']
+            params = job['params']
+            rendered = render_answer(answer)
+            
+            if first_time_handled(job):
+                # Store in conversation memory, with the rendering for the history tab
+                get_session()['conversation_memory'].add_conversation(
+                    params['question'], answer, params['subject'], params['class_level'],
+                    metadata={"rendered": rendered}
+                )
+                get_analytics().record_activity(
+                    st.session_state.student_id, ASK, params['subject'], params['class_level']
+                )
+                st.success("✅ Answer generated successfully!")
+            
+            # Enhanced answer display
+            st.markdown("""
+            <div style="background: linear-gradient(135deg, #111111, #000000); padding: 2.5rem; border-radius: 15px; margin: 1.5rem 0; border-left: 5px solid #00ff88; box-shadow: 0 5px 15px rgba(0, 255, 136, 0.1);">
+                <h3 style="color: #00ff88; margin-bottom: 1.5rem; font-size: 1.4rem; font-weight: 600;">💡 Your Answer</h3>
+            </div>
+            """, unsafe_allow_html=True)
+            
+            show_answer(rendered)
+            
+            # Add feedback options
+            st.markdown("---")
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                if st.button("👍 Helpful"):
+                    st.success("Thank you for your feedback!")
+            with col2:
+                if st.button("👎 Not helpful"):
+                    st.info("We'll improve! Try rephrasing your question.")
+            with col3:
+                if st.button("🔄 Ask follow-up"):
+                    st.info("Feel free to ask a related question!")
 
-elif feature == "Explain Topic":
+@fragment
+@traced("mode:Explain Topic")
+def explain_topic_panel(subject, class_level):
     # Modern feature header
     st.markdown("""
     <div style="background: linear-gradient(135deg, #111111, #000000); padding: 2.5rem; border-radius: 20px; margin-bottom: 2rem; border: 1px solid #333; box-shadow: 0 8px 25px rgba(0, 180, 255, 0.1);">
@@ -283,6 +420,10 @@ elif feature == "Explain Topic":
     </div>
     """, unsafe_allow_html=True)
     
+    # Generate the first topics of this class in the background so they open instantly
+    explanation_cache = get_explanation_cache()
+    explanation_cache.prewarm(st.session_state.gemini_client, st.session_state.knowledge_base, subject, class_level)
+    
     # Input section with better layout
     col1, col2 = st.columns([2, 1])
     
@@ -308,50 +449,61 @@ elif feature == "Explain Topic":
     with col2:
         if st.button("📚 Explain Topic", type="primary", use_container_width=True):
             if topic:
-                with st.spinner("🔍 Analyzing topic and preparing explanation..."):
-                    try:
-                        # Get relevant content
-                        context = st.session_state.knowledge_base.get_relevant_content(
-                            topic, subject, class_level
-                        )
-                        
-                        # Generate explanation
-                        explanation = st.session_state.gemini_client.explain_topic(
-                            topic, context, subject, class_level, explanation_type
-                        )
-                        
-                        st.success(f"✅ {explanation_type} explanation generated!")
-                        
-                        # Enhanced explanation display
-                        st.markdown(f"""
-                        <div style="background: linear-gradient(135deg, #111111, #000000); padding: 2.5rem; border-radius: 15px; margin: 1.5rem 0; border-left: 5px solid #00b4ff; box-shadow: 0 5px 15px rgba(0, 180, 255, 0.1);">
-                            <h3 style="color: #00b4ff; margin-bottom: 1.5rem; font-size: 1.4rem; font-weight: 600;">📚 {explanation_type} Explanation: {topic}</h3>
-                        </div>
-                        """, unsafe_allow_html=True)
-                        
-                        st.markdown(explanation)
-                        
-                        # Additional learning options
-                        st.markdown("---")
-                        st.markdown("### 🚀 Continue Learning")
-                        col1, col2, col3 = st.columns(3)
-                        with col1:
-                            if st.button("❓ Ask Question", key="topic_ask"):
-                                st.info("Switch to 'Ask Doubts' to ask specific questions about this topic!")
-                        with col2:
-                            if st.button("📝 Generate Quiz", key="topic_quiz"):
-                                st.info("Switch to 'Generate Quiz' to test your understanding!")
-                        with col3:
-                            if st.button("🔄 Related Topics", key="topic_related"):
-                                st.info("Ask for related topics in the question section!")
-                        
-                    except Exception as e:
-                        st.error(f"❌ Error generating explanation: {str(e)}")
-                        st.info("💡 Try checking your internet connection or rephrasing the topic.")
+                gemini_client = st.session_state.gemini_client
+                knowledge_base = st.session_state.knowledge_base
+                
+                def explain_job(progress):
+                    # Served from the cache when possible, refreshed in the background once stale
+                    return explanation_cache.explain(
+                        gemini_client, knowledge_base, topic, subject, class_level, explanation_type
+                    )
+                
+                submit_job("explain", "explain_topic",
+                           {"topic": topic, "subject": subject, "class_level": class_level,
+                            "explanation_type": explanation_type},
+                           explain_job)
             else:
                 st.warning("⚠️ Please enter a topic name to get started!")
+    
+    job = await_job("explain", "🔍 Analyzing topic and preparing explanation...")
+    if job and job['status'] == DONE:
+        explanation = job['result']
+        params = job['params']
+        
+        if first_time_handled(job):
+            get_analytics().record_activity(
+                st.session_state.student_id, EXPLAIN, params['subject'], params['class_level'],
+                st.session_state.knowledge_base.topic_name(params['topic'], params['subject'], params['class_level'])
+            )
+        
+        st.success(f"✅ {params['explanation_type']} explanation generated!")
+        
+        # Enhanced explanation display
+        st.markdown(f"""
+        <div style="background: linear-gradient(135deg, #111111, #000000); padding: 2.5rem; border-radius: 15px; margin: 1.5rem 0; border-left: 5px solid #00b4ff; box-shadow: 0 5px 15px rgba(0, 180, 255, 0.1);">
+            <h3 style="color: #00b4ff; margin-bottom: 1.5rem; font-size: 1.4rem; font-weight: 600;">📚 {params['explanation_type']} Explanation: {params['topic']}</h3>
+        </div>
+        """, unsafe_allow_html=True)
+        
+        show_answer(render_answer(explanation))
+        
+        # Additional learning options
+        st.markdown("---")
+        st.markdown("### 🚀 Continue Learning")
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            if st.button("❓ Ask Question", key="topic_ask"):
+                st.info("Switch to 'Ask Doubts' to ask specific questions about this topic!")
+        with col2:
+            if st.button("📝 Generate Quiz", key="topic_quiz"):
+                st.info("Switch to 'Generate Quiz' to test your understanding!")
+        with col3:
+            if st.button("🔄 Related Topics", key="topic_related"):
+                st.info("Ask for related topics in the question section!")
 
-elif feature == "Generate Quiz":
+@fragment
+@traced("mode:Generate Quiz")
+def generate_quiz_panel(subject, class_level):
     # Modern feature header
     st.markdown("""
     <div style="background: linear-gradient(135deg, #111111, #000000); padding: 2.5rem; border-radius: 20px; margin-bottom: 2rem; border: 1px solid #333; box-shadow: 0 8px 25px rgba(255, 193, 7, 0.1);">
@@ -389,51 +541,122 @@ elif feature == "Generate Quiz":
     
     if st.button("Generate Quiz", type="primary"):
         if chapter:
-            with st.spinner("Generating quiz..."):
-                try:
-                    quiz_data = st.session_state.quiz_generator.generate_quiz(
-                        chapter, subject, class_level, num_questions, difficulty, question_type
-                    )
-                    
-                    st.success("Quiz generated!")
-                    st.markdown("### 📋 Quiz:")
-                    
-                    # Store quiz in session state for answering
-                    st.session_state.current_quiz = quiz_data
-                    
-                    # Display quiz questions
-                    for i, question in enumerate(quiz_data['questions'], 1):
-                        st.markdown(f"**Question {i}:** {question['question']}")
-                        
-                        if question_type == "Multiple Choice":
-                            options = question.get('options', [])
-                            selected = st.radio(
-                                f"Select answer for Question {i}:",
-                                options,
-                                key=f"q_{i}"
-                            )
-                        elif question_type == "True/False":
-                            selected = st.radio(
-                                f"Answer for Question {i}:",
-                                ["True", "False"],
-                                key=f"q_{i}"
-                            )
-                        else:  # Short Answer
-                            selected = st.text_input(
-                                f"Answer for Question {i}:",
-                                key=f"q_{i}"
-                            )
-                    
-                    if st.button("Submit Quiz"):
-                        # Here you would implement quiz evaluation
-                        st.info("Quiz submitted! (Evaluation feature can be implemented)")
-                        
-                except Exception as e:
-                    st.error(f"Error generating quiz: {str(e)}")
+            quiz_generator = get_quiz_generator()
+            
+            def quiz_job(progress):
+                streamed = []
+                
+                def report_question(question):
+                    streamed.append(question)
+                    progress(streamed)
+                
+                return quiz_generator.generate_quiz(
+                    chapter, subject, class_level, num_questions, difficulty, question_type,
+                    on_question=report_question
+                )
+            
+            submit_job("quiz", "generate_quiz",
+                       {"chapter": chapter, "subject": subject, "class_level": class_level,
+                        "num_questions": num_questions, "difficulty": difficulty,
+                        "question_type": question_type},
+                       quiz_job)
         else:
             st.warning("Please enter a chapter or topic!")
+    
+    # Show each question as soon as it has streamed in
+    preview = st.empty()
+    job = await_job(
+        "quiz", "Generating quiz...",
+        on_progress=lambda streamed: preview.markdown("\n\n".join(
+            f"**Question {i}:** {q['question']}" for i, q in enumerate(streamed, 1)
+        ))
+    )
+    preview.empty()
+    if job and job['status'] == DONE and first_time_handled(job):
+        quiz_data = job['result']
+        if quiz_data.get('error'):
+            st.error(quiz_data['error'])
+        else:
+            st.success("Quiz generated!")
+            # Store the quiz with the session so it survives the submit rerun
+            session = get_session()
+            session['current_quiz'] = quiz_data
+            session['quiz_result'] = None
+    
+    session = get_session()
+    current_quiz = session['current_quiz']
+    if current_quiz and current_quiz.get('questions'):
+        st.markdown("### 📋 Quiz:")
+        quiz_type = current_quiz.get('question_type', question_type)
+        
+        with st.form("quiz_form"):
+            # Display quiz questions
+            for i, question in enumerate(current_quiz['questions'], 1):
+                st.markdown(f"**Question {i}:** {question['question']}")
+                
+                if quiz_type == "Multiple Choice":
+                    options = question.get('options', [])
+                    st.radio(
+                        f"Select answer for Question {i}:",
+                        options,
+                        index=None,
+                        key=f"q_{i}"
+                    )
+                elif quiz_type == "True/False":
+                    st.radio(
+                        f"Answer for Question {i}:",
+                        ["True", "False"],
+                        index=None,
+                        key=f"q_{i}"
+                    )
+                else:  # Short Answer
+                    st.text_input(
+                        f"Answer for Question {i}:",
+                        key=f"q_{i}"
+                    )
+            
+            submitted = st.form_submit_button("Submit Quiz")
+        
+        if submitted:
+            user_answers = [
+                st.session_state.get(f"q_{i}") or ""
+                for i in range(1, len(current_quiz['questions']) + 1)
+            ]
+            with st.spinner("Grading your answers..."):
+                quiz_result = get_quiz_generator().evaluate_quiz(current_quiz, user_answers)
+            # Fetched again, as the session may have been spilled during a long grading wait
+            session = get_session()
+            session['quiz_result'] = quiz_result
+            if not session['quiz_result'].get('error'):
+                quiz_subject = current_quiz.get('subject', subject)
+                quiz_class = current_quiz.get('class_level', class_level)
+                get_analytics().record_quiz(
+                    st.session_state.student_id, quiz_subject, quiz_class,
+                    st.session_state.knowledge_base.topic_name(current_quiz.get('chapter', ''), quiz_subject, quiz_class),
+                    session['quiz_result']['score'], session['quiz_result']['total']
+                )
+        
+        quiz_result = session['quiz_result']
+        if quiz_result:
+            if quiz_result.get('error'):
+                st.error(quiz_result['error'])
+            else:
+                st.metric("Score", f"{quiz_result['score']}/{quiz_result['total']}",
+                          f"{quiz_result['percentage']:.0f}%")
+                st.info(quiz_result['feedback'])
+                for i, result in enumerate(quiz_result['detailed_results'], 1):
+                    icon = "⚠️" if result.get('ungraded') else "✅" if result['is_correct'] else "❌"
+                    st.markdown(f"{icon} **Question {i}:** {result['question']}")
+                    if result.get('ungraded'):
+                        st.markdown(f"Your answer: {result['user_answer']}  \n"
+                                    f"Could not be checked right now; compare it with: {result['correct_answer']}")
+                    elif not result['is_correct']:
+                        st.markdown(f"Your answer: {result['user_answer'] or '—'}  \n"
+                                    f"Correct answer: {result['correct_answer']}")
 
-elif feature == "Homework Helper":
+@fragment
+@traced("mode:Homework Helper")
+def homework_helper_panel(subject, class_level):
     # Modern feature header
     st.markdown("""
     <div style="background: linear-gradient(135deg, #111111, #000000); padding: 2.5rem; border-radius: 20px; margin-bottom: 2rem; border: 1px solid #333; box-shadow: 0 8px 25px rgba(255, 107, 122, 0.1);">
@@ -468,45 +691,47 @@ elif feature == "Homework Helper":
     
     if st.button("Get Help", type="primary"):
         if problem:
-            with st.spinner("Generating help..."):
-                try:
-                    # Get relevant context
-                    context = st.session_state.knowledge_base.get_relevant_content(
-                        problem, subject, class_level
-                    )
-                    
-                    # Generate homework help
-                    help_response = st.session_state.gemini_client.provide_homework_help(
-                        problem, context, subject, class_level, help_type
-                    )
-                    
-                    st.success("Help generated!")
-                    st.markdown("### 🎯 Homework Help:")
-                    st.write(help_response)
-                    
-                except Exception as e:
-                    st.error(f"Error generating help: {str(e)}")
+            gemini_client = st.session_state.gemini_client
+            knowledge_base = st.session_state.knowledge_base
+            
+            def homework_job(progress):
+                # Get relevant context
+                context = knowledge_base.get_relevant_content(problem, subject, class_level)
+                # Generate homework help
+                return gemini_client.provide_homework_help(problem, context, subject, class_level, help_type)
+            
+            submit_job("homework", "provide_homework_help",
+                       {"problem": problem, "subject": subject, "class_level": class_level,
+                        "help_type": help_type},
+                       homework_job)
         else:
             st.warning("Please enter your homework problem!")
+    
+    job = await_job("homework", "Generating help...")
+    if job and job['status'] == DONE:
+        if first_time_handled(job):
+            get_analytics().record_activity(
+                st.session_state.student_id, HOMEWORK, job['params']['subject'], job['params']['class_level']
+            )
+        st.success("Help generated!")
+        st.markdown("### 🎯 Homework Help:")
+        show_answer(render_answer(job['result']))
+
+MODE_PANELS = {
+    "Ask Doubts": ask_doubts_panel,
+    "Explain Topic": explain_topic_panel,
+    "Generate Quiz": generate_quiz_panel,
+    "Homework Helper": homework_helper_panel,
+}
+
+MODE_PANELS[feature](subject, class_level)
 
 # Modern Footer
 st.markdown("---")
 
 with st.container():
     # Main footer
-    st.markdown("""
-    <div class="bt-footer">
-        <h3 class="bt-footer-title">Bharat Tutor</h3>
-        <p class="bt-footer-tagline">Empowering students with AI-driven learning solutions</p>
-        <div class="ai-badge">
-            <span class="ai-icon">🤖</span>
-            <div>
-                <div class="ai-powered">AI Powered</div>
-                <div class="ai-model">Gemini AI</div>
-            </div>
-        </div>
-    </div>
-    """, unsafe_allow_html=True)
+    st.markdown(load_asset('static/footer.html'), unsafe_allow_html=True)
     
     st.markdown("<div class='footer-spacer'></div>", unsafe_allow_html=True)
     
@@ -532,13 +757,4 @@ with st.container():
         """, unsafe_allow_html=True)
     
     # Final message with modern styling
-    st.markdown("""
-    <div style="background: linear-gradient(135deg, #111111, #000000); padding: 2rem; border-radius: 15px; margin-top: 2rem; border: 1px solid #333; text-align: center; box-shadow: 0 5px 15px rgba(0, 255, 136, 0.05);">
-        <p style="color: #bbbbbb; font-size: 1rem; margin: 0; margin-bottom: 0.5rem;">
-            <em>Making quality education accessible to all Indian students</em>
-        </p>
-        <p style="color: #888888; font-size: 0.9rem; margin: 0;">
-            Built with ❤️ for the future of education in India
-        </p>
-    </div>
-    """, unsafe_allow_html=True)
+    st.markdown(load_asset('static/footer_note.html'), unsafe_allow_html=True)
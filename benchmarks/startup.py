@@ -0,0 +1,89 @@
+"""Import-time benchmark for cold starts.
+
+Imports each entry-point module in a fresh interpreter, reports the median
+import time and fails when a module is over its budget or pulls in a heavy
+dependency that should only load on first use. Run it from the repository
+root, e.g. in CI:
+
+    python benchmarks/startup.py --runs 5 --budget-ms 250
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules imported when a worker starts, with their own budget in milliseconds
+# where it differs from the default
+MODULES = {
+    "modules.gemini_client": None,
+    "modules.key_pool": None,
+    "modules.quiz_generator": None,
+    "modules.knowledge_base": None,
+    "modules.conversation_memory": None,
+    "modules.job_queue": None,
+    "modules.cache": None,
+    "modules.snapshot": None,
+    "modules.profiling": None,
+    "modules.session_manager": None,
+    # Starlette and its dependencies dominate here
+    "api": 600,
+}
+
+# Heavy dependencies that must not be imported until they are needed
+DEFERRED_IMPORTS = ["google.generativeai", "google.ai.generativelanguage", "numpy"]
+
+MEASURE = """
+import sys, time, json
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+print(json.dumps({{"ms": elapsed * 1000, "loaded": [m for m in {deferred!r} if m in sys.modules]}}))
+"""
+
+
+def measure(module: str, runs: int) -> dict:
+    """Median import time of ``module`` over fresh interpreters, and any deferred imports it loaded."""
+    times, loaded = [], set()
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", MEASURE.format(module=module, deferred=DEFERRED_IMPORTS)],
+            cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        times.append(result["ms"])
+        loaded.update(result["loaded"])
+    return {"ms": statistics.median(times), "loaded": sorted(loaded)}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per module")
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv("STARTUP_BUDGET_MS", "250")),
+                        help="default import-time budget per module")
+    args = parser.parse_args()
+
+    failures = []
+    for module, budget in MODULES.items():
+        budget = budget or args.budget_ms
+        result = measure(module, args.runs)
+        status = "ok"
+        if result["ms"] > budget:
+            status = "OVER BUDGET"
+            failures.append(f"{module} took {result['ms']:.0f} ms (budget {budget:.0f} ms)")
+        if result["loaded"]:
+            status = "EAGER IMPORT"
+            failures.append(f"{module} imports {', '.join(result['loaded'])} at import time")
+        print(f"{module:<32} {result['ms']:8.1f} ms  / {budget:5.0f} ms  {status}")
+
+    if failures:
+        print("\n" + "\n".join(failures), file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
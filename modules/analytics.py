@@ -0,0 +1,369 @@
+import os
+import glob
+import time
+import uuid
+import logging
+import threading
+from typing import Dict, List, Any, Optional, Iterable, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    # NumPy is imported with the first store, so importing this module stays cheap
+    import numpy as np
+
+DEFAULT_ANALYTICS_DIR = os.path.join(os.getenv("BHARATTUTOR_DATA_DIR", "data"), "analytics")
+
+# Activity kinds
+ASK = 0
+EXPLAIN = 1
+HOMEWORK = 2
+QUIZ = 3
+KIND_NAMES = {ASK: "ask", EXPLAIN: "explain", HOMEWORK: "homework", QUIZ: "quiz"}
+
+PERIOD_SECONDS = {"day": 86400, "week": 7 * 86400, "month": 30 * 86400}
+
+# Column name -> dtype; string columns are dictionary encoded as int32 codes
+COLUMNS = {
+    "student": "int32",
+    "subject": "int32",
+    "class_level": "int32",
+    "topic": "int32",
+    "kind": "int8",
+    "timestamp": "float64",
+    "score": "float32",
+    "total": "int32",
+}
+STRING_COLUMNS = ("student", "subject", "class_level", "topic")
+
+
+class LearnerAnalytics:
+    def __init__(self, directory: Optional[str] = DEFAULT_ANALYTICS_DIR, autosave_every: int = 50):
+        """Columnar store of every learning event, one row per question asked or quiz taken.
+
+        Columns are NumPy arrays and strings are dictionary encoded, so queries
+        are vectorized scans instead of loops over dicts. Each process appends
+        to its own shard file in ``directory``, and the other shards are read
+        again before a query whenever they have changed, so several workers
+        can record at once. Pass ``directory=None`` to keep the store in
+        memory only.
+        """
+        import numpy as np
+
+        self.directory = directory
+        self.autosave_every = autosave_every
+        self._lock = threading.Lock()
+        self._size = 0
+        self._persisted = 0
+        self._loaded = 0
+        self._columns = {name: np.empty(1024, dtype=dtype) for name, dtype in COLUMNS.items()}
+        self._values: Dict[str, List[str]] = {name: [] for name in STRING_COLUMNS}
+        self._codes: Dict[str, Dict[str, int]] = {name: {} for name in STRING_COLUMNS}
+        self._shard = os.path.join(directory, f"{uuid.uuid4().hex}.npz") if directory else None
+        # Other processes' shards as (modification time, size) and their encoded rows
+        self._shard_stamps: Dict[str, Tuple[int, int]] = {}
+        self._shard_rows: Dict[str, Dict[str, "np.ndarray"]] = {}
+        self._refresh_shards()
+
+    def record_activity(self, student_id: str, kind: int, subject: str, class_level: str,
+                        topic: str = "", timestamp: Optional[float] = None):
+        """Record a question asked, topic explained or homework problem."""
+        self._append([{
+            "student": str(student_id), "subject": subject, "class_level": class_level, "topic": topic,
+            "kind": kind, "timestamp": timestamp or time.time(), "score": float("nan"), "total": 0,
+        }])
+
+    def record_quiz(self, student_id: str, subject: str, class_level: str, topic: str,
+                    score: int, total: int, timestamp: Optional[float] = None):
+        """Record one quiz attempt."""
+        self.record_quizzes([student_id], subject, class_level, topic, [score], total, timestamp)
+
+    def record_quizzes(self, student_ids: Iterable[str], subject: str, class_level: str, topic: str,
+                       scores: Iterable[int], total: int, timestamp: Optional[float] = None):
+        """Record a whole class taking the same quiz."""
+        timestamp = timestamp or time.time()
+        self._append([
+            {
+                "student": str(student_id), "subject": subject, "class_level": class_level, "topic": topic,
+                "kind": QUIZ, "timestamp": timestamp, "score": float(score), "total": total,
+            }
+            for student_id, score in zip(student_ids, scores)
+        ])
+
+    def student_summary(self, student_id: str) -> Dict[str, Any]:
+        """Activity counts, average quiz score and most active subject for one student."""
+        import numpy as np
+
+        self._refresh_shards()
+        with self._lock:
+            view = self._view()
+            rows = view["student"] == self._code("student", student_id)
+            if not rows.any():
+                return {"questions": 0, "quizzes": 0, "average_percentage": None, "top_subject": None}
+
+            kinds = view["kind"][rows]
+            quizzes = rows & (view["kind"] == QUIZ)
+            subjects = np.bincount(view["subject"][rows])
+            return {
+                "questions": int((kinds != QUIZ).sum()),
+                "quizzes": int(quizzes.sum()),
+                "average_percentage": self._percentage(view["score"][quizzes].sum(), view["total"][quizzes].sum()),
+                "top_subject": self._values["subject"][int(subjects.argmax())],
+            }
+
+    def weak_topics(self, student_id: str, subject: Optional[str] = None, limit: int = 5,
+                    min_quizzes: int = 1) -> List[Dict[str, Any]]:
+        """Topics with the lowest quiz mastery for a student, weakest first."""
+        import numpy as np
+
+        self._refresh_shards()
+        with self._lock:
+            view = self._view()
+            rows = (view["student"] == self._code("student", student_id)) & (view["kind"] == QUIZ)
+            if subject is not None:
+                rows &= view["subject"] == self._code("subject", subject)
+            if not rows.any():
+                return []
+
+            topics = view["topic"][rows]
+            size = len(self._values["topic"])
+            correct = np.bincount(topics, weights=view["score"][rows], minlength=size)
+            asked = np.bincount(topics, weights=view["total"][rows], minlength=size)
+            attempts = np.bincount(topics, minlength=size)
+
+            candidates = np.flatnonzero((attempts >= min_quizzes) & (asked > 0))
+            mastery = correct[candidates] / asked[candidates]
+            order = candidates[np.argsort(mastery, kind="stable")][:limit]
+            return [
+                {
+                    "topic": self._values["topic"][topic],
+                    "mastery": round(float(correct[topic] / asked[topic] * 100), 1),
+                    "quizzes": int(attempts[topic]),
+                }
+                for topic in order
+            ]
+
+    def mastery_over_time(self, student_id: str, subject: Optional[str] = None,
+                          period: str = "week") -> List[Dict[str, Any]]:
+        """Quiz mastery and activity per day, week or month for a student."""
+        import numpy as np
+
+        seconds = PERIOD_SECONDS[period]
+        self._refresh_shards()
+        with self._lock:
+            view = self._view()
+            rows = view["student"] == self._code("student", student_id)
+            if subject is not None:
+                rows &= view["subject"] == self._code("subject", subject)
+            if not rows.any():
+                return []
+
+            buckets = (view["timestamp"][rows] // seconds).astype(np.int64)
+            periods, index = np.unique(buckets, return_inverse=True)
+            index = index.reshape(-1)
+            is_quiz = view["kind"][rows] == QUIZ
+            scores = np.where(is_quiz, view["score"][rows], 0.0)
+            totals = np.where(is_quiz, view["total"][rows], 0)
+
+            correct = np.bincount(index, weights=scores, minlength=len(periods))
+            asked = np.bincount(index, weights=totals, minlength=len(periods))
+            quizzes = np.bincount(index, weights=is_quiz, minlength=len(periods))
+            questions = np.bincount(index, weights=~is_quiz, minlength=len(periods))
+            return [
+                {
+                    "period_start": float(periods[i] * seconds),
+                    "mastery": self._percentage(correct[i], asked[i]),
+                    "quizzes": int(quizzes[i]),
+                    "questions": int(questions[i]),
+                }
+                for i in range(len(periods))
+            ]
+
+    def class_aggregates(self, class_level: Optional[str] = None, subject: Optional[str] = None,
+                         limit: Optional[int] = None) -> Dict[str, Any]:
+        """Class-wide mastery per topic, averaged over students, weakest topics first."""
+        import numpy as np
+
+        self._refresh_shards()
+        with self._lock:
+            view = self._view()
+            rows = np.ones(self._size, dtype=bool)
+            if class_level is not None:
+                rows &= view["class_level"] == self._code("class_level", class_level)
+            if subject is not None:
+                rows &= view["subject"] == self._code("subject", subject)
+
+            quiz_rows = rows & (view["kind"] == QUIZ)
+            num_topics = max(len(self._values["topic"]), 1)
+            students, topics = view["student"][quiz_rows], view["topic"][quiz_rows]
+
+            # Mastery per (student, topic) first, so frequent quiz takers do not dominate
+            pairs, index = np.unique(students.astype(np.int64) * num_topics + topics, return_inverse=True)
+            index = index.reshape(-1)
+            correct = np.bincount(index, weights=view["score"][quiz_rows], minlength=len(pairs))
+            asked = np.bincount(index, weights=view["total"][quiz_rows], minlength=len(pairs))
+            pair_topics = pairs % num_topics
+            valid = asked > 0
+            mastery_sum = np.bincount(
+                pair_topics[valid], weights=correct[valid] / asked[valid], minlength=num_topics
+            )
+            student_count = np.bincount(pair_topics[valid], minlength=num_topics)
+            question_count = np.bincount(view["topic"][rows & (view["kind"] != QUIZ)], minlength=num_topics)
+
+            covered = np.flatnonzero(student_count > 0)
+            mastery = mastery_sum[covered] / student_count[covered]
+            order = covered[np.argsort(mastery, kind="stable")]
+            if limit:
+                order = order[:limit]
+
+            return {
+                "students": int(len(np.unique(view["student"][rows]))),
+                "quizzes": int(quiz_rows.sum()),
+                "questions": int((rows & (view["kind"] != QUIZ)).sum()),
+                "topics": [
+                    {
+                        "topic": self._values["topic"][topic] or "(general)",
+                        "mastery": round(float(mastery_sum[topic] / student_count[topic] * 100), 1),
+                        "students": int(student_count[topic]),
+                        "questions": int(question_count[topic]),
+                    }
+                    for topic in order
+                ],
+            }
+
+    def save(self):
+        """Write the rows recorded by this process to its shard."""
+        import numpy as np
+
+        if not self._shard:
+            return
+        with self._lock:
+            if self._size == self._persisted:
+                return
+            view = self._view()
+            arrays = {name: view[name][self._loaded:] for name in COLUMNS}
+            # Shards store strings, since codes differ between processes
+            for name in STRING_COLUMNS:
+                arrays[name] = np.array(self._values[name] or [""], dtype=str)[arrays[name]]
+            # Counted from this process's first row, as reloading other shards moves it
+            saved = self._size - self._loaded
+
+        os.makedirs(self.directory, exist_ok=True)
+        temp_path = self._shard + ".tmp"
+        with open(temp_path, "wb") as f:
+            np.savez_compressed(f, **arrays)
+        os.replace(temp_path, self._shard)
+        with self._lock:
+            self._persisted = max(self._persisted, self._loaded + saved)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _append(self, rows: List[Dict[str, Any]]):
+        """Append rows given as dicts."""
+        if rows:
+            self._append_columns({name: [row[name] for row in rows] for name in COLUMNS})
+
+    def _append_columns(self, columns: Dict[str, Any]):
+        """Append whole columns at once, growing the arrays geometrically."""
+        import numpy as np
+
+        count = len(columns["kind"])
+        if not count:
+            return
+        with self._lock:
+            needed = self._size + count
+            capacity = len(self._columns["kind"])
+            if needed > capacity:
+                capacity = max(needed, capacity * 2)
+                for name, column in self._columns.items():
+                    grown = np.empty(capacity, dtype=column.dtype)
+                    grown[:self._size] = column[:self._size]
+                    self._columns[name] = grown
+
+            for name, values in self._encode(columns).items():
+                self._columns[name][self._size:needed] = values
+            self._size = needed
+            unsaved = self._size - self._persisted
+
+        if self.autosave_every and unsaved >= self.autosave_every:
+            try:
+                self.save()
+            except OSError as e:
+                logging.error(f"Could not save learner analytics: {e}")
+
+    def _refresh_shards(self):
+        """Read other processes' shards again if any was written, added or removed since the last read."""
+        import numpy as np
+
+        if not self.directory or not os.path.isdir(self.directory):
+            return
+        stamps: Dict[str, Tuple[int, int]] = {}
+        for path in glob.glob(os.path.join(self.directory, "*.npz")):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if path != self._shard:
+                stamps[path] = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            if stamps == self._shard_stamps:
+                return
+            changed = [path for path, stamp in stamps.items() if self._shard_stamps.get(path) != stamp]
+
+        loaded: Dict[str, Dict[str, "np.ndarray"]] = {}
+        for path in changed:
+            try:
+                with np.load(path, allow_pickle=False) as shard:
+                    loaded[path] = {name: shard[name] for name in COLUMNS}
+            except Exception as e:
+                # Kept with its stamp, so it is not read again until it changes
+                logging.error(f"Skipping unreadable analytics shard {path}: {e}")
+                loaded[path] = {name: np.empty(0, dtype=dtype) for name, dtype in COLUMNS.items()}
+
+        with self._lock:
+            for path, columns in loaded.items():
+                self._shard_rows[path] = self._encode(columns)
+            for path in set(self._shard_rows) - set(stamps):
+                del self._shard_rows[path]
+            self._shard_stamps = stamps
+
+            # Rebuild as the other shards' rows followed by this process's own
+            own = {name: column[self._loaded:self._size] for name, column in self._columns.items()}
+            parts = [self._shard_rows[path] for path in sorted(self._shard_rows)] + [own]
+            others = sum(len(part["kind"]) for part in parts[:-1])
+            self._columns = {
+                name: np.concatenate([part[name] for part in parts]).astype(dtype, copy=False)
+                for name, dtype in COLUMNS.items()
+            }
+            self._persisted = others + self._persisted - self._loaded
+            self._size = others + len(own["kind"])
+            self._loaded = others
+
+    def _encode(self, columns: Dict[str, Any]) -> Dict[str, Any]:
+        """Columns with strings replaced by their codes; call with the lock held."""
+        import numpy as np
+
+        encoded = dict(columns)
+        for name in STRING_COLUMNS:
+            # Intern each distinct string once, then map the whole column
+            unique, inverse = np.unique(np.asarray(columns[name], dtype=str), return_inverse=True)
+            codes = np.array([self._intern(name, value) for value in unique.tolist()], dtype=np.int32)
+            encoded[name] = codes[inverse.reshape(-1)]
+        return encoded
+
+    def _view(self) -> Dict[str, "np.ndarray"]:
+        """Filled part of every column; call with the lock held."""
+        return {name: column[:self._size] for name, column in self._columns.items()}
+
+    def _intern(self, column: str, value: str) -> int:
+        code = self._codes[column].get(value)
+        if code is None:
+            code = self._codes[column][value] = len(self._values[column])
+            self._values[column].append(value)
+        return code
+
+    def _code(self, column: str, value: str) -> int:
+        """Code of a string value, or -1 when it has never been seen."""
+        return self._codes[column].get(str(value), -1)
+
+    def _percentage(self, correct: float, asked: float) -> Optional[float]:
+        return round(float(correct) / float(asked) * 100, 1) if asked else None
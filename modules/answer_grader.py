@@ -0,0 +1,218 @@
+import logging
+import re
+from concurrent.futures import ThreadPoolExecutor
+from difflib import SequenceMatcher
+from typing import Dict, List, Any, Optional, Tuple
+
+# Words that carry no meaning when comparing short answers
+FILLER_WORDS = {
+    "a", "an", "the", "is", "are", "was", "were", "it", "its", "of", "to", "in",
+    "on", "and", "or", "by", "for", "with", "as", "be", "called", "known", "answer"
+}
+
+NUMBER_PATTERN = re.compile(r"-?\d+(?:\.\d+)?(?:/\d+)?")
+# Thousands and lakh separators, e.g. "1,000" and "1,00,000"; "3,4" is left as a list
+DIGIT_GROUP_SEPARATOR = re.compile(r"(?<=\d),(?=\d{2,3}(?!\d))")
+# A unit written right after a number, e.g. "100 km", "25°c", "5 kg"
+UNIT_PATTERN = re.compile(r"\d(?:\s*)([a-zµ°%][a-zµ°%/²³0-9]*)")
+
+# Words that can turn a matching answer into its opposite; apostrophes are already stripped
+NEGATION_WORDS = {
+    "not", "no", "never", "none", "neither", "nor", "without", "cannot",
+    "isnt", "arent", "wasnt", "werent", "doesnt", "dont", "didnt", "cant", "wont"
+}
+
+# Words that join alternatives, as in "3 or 4 or 5" or "photosynthesis and respiration"
+ALTERNATIVE_WORDS = {"or", "and", "either", "maybe", "perhaps"}
+
+# Keys shorter than this must match exactly or by keywords; a typo in "mitosis" may be "meiosis"
+MIN_TYPO_KEY_CHARS = 8
+
+NUMBER_WORDS = {
+    "zero": 0, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6,
+    "seven": 7, "eight": 8, "nine": 9, "ten": 10, "eleven": 11, "twelve": 12,
+    "hundred": 100, "thousand": 1000, "half": 0.5
+}
+
+
+class ShortAnswerGrader:
+    def __init__(self, gemini_client=None, batch_size: int = 25, max_workers: int = 4,
+                 accept_ratio: float = 0.9, reject_ratio: float = 0.35,
+                 numeric_tolerance: float = 0.01):
+        """Initialize the grader; ``gemini_client`` is only used for ambiguous answers."""
+        self.gemini_client = gemini_client
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.accept_ratio = accept_ratio
+        self.reject_ratio = reject_ratio
+        self.numeric_tolerance = numeric_tolerance
+
+    def grade(self, items: List[Dict[str, Any]], subject: str = "", class_level: str = "") -> List[Dict[str, Any]]:
+        """Grade short answers, sending only the ambiguous ones to Gemini.
+
+        Each item needs ``question``, ``correct_answer`` and ``answer``. Returns one
+        result per item with ``is_correct`` and the ``method`` that decided it.
+        """
+        results: List[Optional[Dict[str, Any]]] = [None] * len(items)
+        # Identical (question, key, answer) triples are graded once
+        pending: Dict[Tuple[str, str, str], List[int]] = {}
+
+        for i, item in enumerate(items):
+            verdict, method, similarity = self._local_verdict(item.get("answer", ""), item.get("correct_answer", ""))
+            if verdict is None:
+                key = (
+                    item.get("question", ""),
+                    self._normalize(item.get("correct_answer", "")),
+                    self._normalize(item.get("answer", ""))
+                )
+                pending.setdefault(key, []).append(i)
+            results[i] = {"is_correct": bool(verdict), "method": method, "similarity": similarity}
+
+        if pending:
+            verdicts = self._grade_with_llm(list(pending.keys()), items, pending, subject, class_level)
+            for key, indices in pending.items():
+                verdict = verdicts.get(key)
+                for i in indices:
+                    if verdict is None:
+                        # Gemini unavailable: no credit, but flagged so the answer can be checked by hand
+                        results[i]["is_correct"] = False
+                        results[i]["method"] = "ungraded"
+                    else:
+                        results[i]["is_correct"] = verdict
+                        results[i]["method"] = "llm"
+
+        return results
+
+    def _local_verdict(self, answer: str, correct_answer: str) -> Tuple[Optional[bool], str, float]:
+        """Cheap checks; returns (verdict or None when ambiguous, method, similarity)."""
+        answer_norm = self._normalize(answer)
+        key_norm = self._normalize(correct_answer)
+
+        if not answer_norm:
+            return False, "blank", 0.0
+        if not key_norm:
+            return False, "no_key", 0.0
+        if answer_norm.replace(" ", "") == key_norm.replace(" ", ""):
+            return True, "exact", 1.0
+
+        key_words = self._content_words(key_norm)
+        answer_words = self._content_words(answer_norm)
+        answer_tokens, key_tokens = set(answer_norm.split()), set(key_norm.split())
+        key_numbers = self._numbers(key_norm)
+        similarity = SequenceMatcher(None, answer_norm, key_norm).ratio()
+
+        # "not oxygen" contains the key "oxygen", "3 or 4 or 5" contains "5" and "100 km" is
+        # one letter from "100 m", so such answers are never accepted locally
+        risky = (answer_tokens & NEGATION_WORDS) != (key_tokens & NEGATION_WORDS) or \
+            bool((answer_tokens & ALTERNATIVE_WORDS) - key_tokens) or \
+            (bool(key_numbers) and set(UNIT_PATTERN.findall(answer_norm)) != set(UNIT_PATTERN.findall(key_norm)))
+
+        if key_numbers:
+            answer_numbers = self._numbers(answer_norm, include_words=True)
+            # Every number must match, so listing several does not earn credit for one of them
+            numbers_match = len(answer_numbers) == len(key_numbers) and all(
+                self._close(expected, given) for expected, given in zip(sorted(key_numbers), sorted(answer_numbers))
+            )
+            if not numbers_match:
+                if NUMBER_PATTERN.fullmatch(key_norm) and NUMBER_PATTERN.fullmatch(answer_norm):
+                    # Two bare numbers that differ; nothing for Gemini to weigh
+                    return False, "numeric", 0.0
+                return None, "ambiguous", similarity
+            if NUMBER_PATTERN.fullmatch(key_norm.replace(" ", "")):
+                # Purely numeric key: the number decides, unless the answer hedges or negates it
+                return (True, "numeric", 1.0) if not risky else (None, "ambiguous", similarity)
+
+        # The same words in another order; extra words may change the meaning, so Gemini decides those
+        if key_words and answer_words == key_words and not risky:
+            return True, "keywords", max(similarity, self.accept_ratio)
+        if self._is_typo(answer_norm, key_norm) and not risky:
+            return True, "fuzzy", similarity
+        if similarity < self.reject_ratio and not (key_words & answer_words):
+            return False, "fuzzy", similarity
+        return None, "ambiguous", similarity
+
+    def _grade_with_llm(self, keys: List[Tuple[str, str, str]], items: List[Dict[str, Any]],
+                        pending: Dict[Tuple[str, str, str], List[int]],
+                        subject: str, class_level: str) -> Dict[Tuple[str, str, str], Optional[bool]]:
+        """Grade distinct ambiguous answers in batched, concurrent Gemini calls."""
+        verdicts: Dict[Tuple[str, str, str], Optional[bool]] = {}
+        if self.gemini_client is None:
+            return verdicts
+
+        batches = []
+        for start in range(0, len(keys), self.batch_size):
+            batch_keys = keys[start:start + self.batch_size]
+            batch_items = []
+            for key in batch_keys:
+                item = items[pending[key][0]]
+                batch_items.append({
+                    "question": item.get("question", ""),
+                    "correct_answer": item.get("correct_answer", ""),
+                    "answer": item.get("answer", "")
+                })
+            batches.append((batch_keys, batch_items))
+
+        def run(batch):
+            batch_keys, batch_items = batch
+            return batch_keys, self.gemini_client.grade_short_answers(batch_items, subject, class_level)
+
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(batches))) as executor:
+            for batch_keys, batch_verdicts in executor.map(run, batches):
+                for key, verdict in zip(batch_keys, batch_verdicts):
+                    verdicts[key] = verdict
+
+        return verdicts
+
+    def _is_typo(self, answer: str, key: str) -> bool:
+        """Whether the answer is the key with a spelling slip: one edit, or two on keys of 16+ characters."""
+        if len(key) < MIN_TYPO_KEY_CHARS:
+            return False
+        max_edits = 2 if len(key) >= 16 else 1
+        if abs(len(answer) - len(key)) > max_edits:
+            return False
+        # Edit distance counting an adjacent swap as one edit
+        two_back, previous = None, list(range(len(key) + 1))
+        for i in range(1, len(answer) + 1):
+            row = [i] + [0] * len(key)
+            for j in range(1, len(key) + 1):
+                row[j] = min(previous[j] + 1, row[j - 1] + 1, previous[j - 1] + (answer[i - 1] != key[j - 1]))
+                if i > 1 and j > 1 and answer[i - 1] == key[j - 2] and answer[i - 2] == key[j - 1]:
+                    row[j] = min(row[j], two_back[j - 2] + 1)
+            if min(row) > max_edits:
+                return False
+            two_back, previous = previous, row
+        return previous[-1] <= max_edits
+
+    def _normalize(self, text) -> str:
+        """Lowercase and strip punctuation/markdown, keeping numbers intact."""
+        if text is None:
+            return ""
+        text = str(text).lower()
+        text = re.sub(r"[*_`\"']", "", text)
+        text = DIGIT_GROUP_SEPARATOR.sub("", text)
+        text = re.sub(r"(?<!\d)[.,](?!\d)|[;:!?()\[\]{}]", " ", text)
+        return re.sub(r"\s+", " ", text).strip()
+
+    def _content_words(self, text: str) -> set:
+        """Meaningful words of a normalized answer."""
+        return {word for word in text.split() if word not in FILLER_WORDS}
+
+    def _numbers(self, text: str, include_words: bool = False) -> List[float]:
+        """Extract numeric values, including simple fractions and optionally number words."""
+        values = []
+        for token in NUMBER_PATTERN.findall(text):
+            try:
+                if "/" in token:
+                    numerator, denominator = token.split("/")
+                    values.append(float(numerator) / float(denominator))
+                else:
+                    values.append(float(token))
+            except (ValueError, ZeroDivisionError):
+                logging.debug(f"Skipping unparseable number: {token}")
+        if include_words:
+            values.extend(NUMBER_WORDS[word] for word in text.split() if word in NUMBER_WORDS)
+        return values
+
+    def _close(self, expected: float, given: float) -> bool:
+        """Compare numbers with a relative tolerance."""
+        return abs(expected - given) <= self.numeric_tolerance * max(1.0, abs(expected))
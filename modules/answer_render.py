@@ -0,0 +1,138 @@
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Any
+
+# Bump when the normalization changes, so stored renderings are redone
+RENDER_VERSION = 1
+MARKDOWN = "markdown"
+LATEX = "latex"
+
+# Display math at least this long is shown with st.latex rather than inside markdown
+LARGE_MATH_CHARS = 80
+MAX_MEMO_ENTRIES = 256
+
+FENCE = re.compile(r"^(```|~~~)")
+# \[ ... \] and \( ... \) as Gemini often writes them; Streamlit's markdown expects $$ and $
+DISPLAY_BRACKETS = re.compile(r"\\\[(.+?)\\\]", re.S)
+INLINE_PARENS = re.compile(r"\\\((.+?)\\\)", re.S)
+DISPLAY_DOLLARS = re.compile(r"\$\$(.+?)\$\$", re.S)
+# A single unescaped dollar sign, i.e. not part of $$
+SINGLE_DOLLAR = re.compile(r"(?<![\\$])\$(?!\$)")
+BLANK_LINES = re.compile(r"\n{3,}")
+
+_memo: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_memo_lock = threading.Lock()
+
+
+def render_answer(text: str) -> Dict[str, Any]:
+    """Normalize a generated answer once and split it into markdown and display-math blocks.
+
+    The result is plain data, so it can be stored with a conversation and
+    shown again without reprocessing the text. Repeated calls with the same
+    text are served from a small in-process memo.
+    """
+    with _memo_lock:
+        rendered = _memo.get(text)
+        if rendered is not None:
+            _memo.move_to_end(text)
+            return rendered
+
+    rendered = {"version": RENDER_VERSION, "blocks": _split_blocks(_normalize(text or ""))}
+    rendered["math_blocks"] = sum(1 for kind, _ in rendered["blocks"] if kind == LATEX)
+
+    with _memo_lock:
+        _memo[text] = rendered
+        if len(_memo) > MAX_MEMO_ENTRIES:
+            _memo.popitem(last=False)
+    return rendered
+
+
+def rendered_for(conversation: Dict[str, Any]) -> Dict[str, Any]:
+    """The rendering stored with a conversation record, redone if missing or outdated."""
+    rendered = (conversation.get("metadata") or {}).get("rendered")
+    if not rendered or rendered.get("version") != RENDER_VERSION:
+        rendered = render_answer(conversation.get("answer", ""))
+    return rendered
+
+
+def _normalize(text: str) -> str:
+    """Consistent line endings, spacing and math delimiters; code blocks are left as they are."""
+    text = text.replace("\r\n", "\n").replace("\r", "\n").strip()
+    parts: List[str] = []
+    prose: List[str] = []
+    in_code = False
+    for line in text.split("\n"):
+        if FENCE.match(line.lstrip()):
+            if not in_code:
+                parts.append(_normalize_prose("\n".join(prose)))
+                prose = []
+            in_code = not in_code
+            parts.append(line)
+        elif in_code:
+            parts.append(line)
+        else:
+            prose.append(line.rstrip())
+    parts.append(_normalize_prose("\n".join(prose)))
+    return "\n".join(part for part in parts if part != "")
+
+
+def _normalize_prose(text: str) -> str:
+    text = DISPLAY_BRACKETS.sub(lambda m: f"\n$$\n{m.group(1).strip()}\n$$\n", text)
+    text = INLINE_PARENS.sub(lambda m: f"${m.group(1).strip()}$", text)
+    text = "\n".join(_escape_currency(line) for line in text.split("\n"))
+    return BLANK_LINES.sub("\n\n", text)
+
+
+def _escape_currency(line: str) -> str:
+    """Escape dollar signs before amounts that do not pair up as inline math, e.g. "$5 and $10".
+
+    As in pandoc, an opening $ is followed by a non-space and a closing $ is
+    preceded by a non-space and not followed by a digit.
+    """
+    if "$" not in line:
+        return line
+    positions = [match.start() for match in SINGLE_DOLLAR.finditer(line)]
+    escape = []
+    i = 0
+    while i < len(positions):
+        start = positions[i]
+        after = line[start + 1:start + 2]
+        closer = None
+        if after and not after.isspace():
+            for j in range(i + 1, len(positions)):
+                end = positions[j]
+                if not line[end - 1].isspace() and not line[end + 1:end + 2].isdigit():
+                    closer = j
+                    break
+        if closer is not None:
+            i = closer + 1
+            continue
+        if after.isdigit():
+            escape.append(start)
+        i += 1
+    for position in reversed(escape):
+        line = line[:position] + "\\" + line[position:]
+    return line
+
+
+def _split_blocks(text: str) -> List[List[str]]:
+    """Markdown blocks with large display-math blocks between them, as [kind, text] pairs."""
+    blocks: List[List[str]] = []
+    position = 0
+    if "```" in text or "~~~" in text:
+        # Dollar signs inside code are not math; leave such answers to the markdown renderer
+        return [[MARKDOWN, text]] if text else []
+    for match in DISPLAY_DOLLARS.finditer(text):
+        expression = match.group(1).strip()
+        if len(expression) < LARGE_MATH_CHARS and "\n" not in expression:
+            continue
+        before = text[position:match.start()].strip()
+        if before:
+            blocks.append([MARKDOWN, before])
+        blocks.append([LATEX, expression])
+        position = match.end()
+    rest = text[position:].strip()
+    if rest:
+        blocks.append([MARKDOWN, rest])
+    return blocks
@@ -0,0 +1,394 @@
+import os
+import json
+import time
+import zlib
+import uuid
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Any, Callable, Iterable, Tuple
+
+try:
+    import msgpack
+    import zstandard
+except ImportError:
+    msgpack = zstandard = None
+
+DEFAULT_CACHE_URL = "sqlite:///" + os.path.join(os.getenv("BHARATTUTOR_DATA_DIR", "data"), "cache.db")
+CACHE_URL = os.getenv("BHARATTUTOR_CACHE_URL", DEFAULT_CACHE_URL)
+
+EXPLANATION_FRESH_SECONDS = float(os.getenv("BHARATTUTOR_EXPLANATION_TTL", str(7 * 24 * 3600)))
+PREWARM_TOPICS = int(os.getenv("BHARATTUTOR_PREWARM_TOPICS", "3"))
+
+# explain_topic reports failures as text; these must never be cached
+EXPLANATION_ERROR_PREFIXES = ("Error generating explanation", "I'm sorry, I couldn't generate")
+
+# First byte of a stored value names its encoding, so workers with and
+# without the optional packages can share a cache
+MSGPACK_ZSTD = b"m"
+JSON_ZLIB = b"j"
+
+
+def serialize(value: Any) -> bytes:
+    """Compact encoding: msgpack + zstd when installed, JSON + zlib otherwise."""
+    if msgpack is not None:
+        return MSGPACK_ZSTD + zstandard.ZstdCompressor(level=3).compress(msgpack.packb(value, use_bin_type=True))
+    return JSON_ZLIB + zlib.compress(json.dumps(value, ensure_ascii=False).encode("utf-8"))
+
+
+def deserialize(data: bytes) -> Any:
+    """Decode a value written by ``serialize``."""
+    encoding, payload = data[:1], data[1:]
+    if encoding == MSGPACK_ZSTD:
+        if msgpack is None:
+            raise ValueError("Cached value needs msgpack and zstandard to decode")
+        return msgpack.unpackb(zstandard.ZstdDecompressor().decompress(payload), raw=False)
+    return json.loads(zlib.decompress(payload).decode("utf-8"))
+
+
+class MemoryBackend:
+    def __init__(self, max_entries: int = 1024):
+        """Process-local backend, for a single worker or tests."""
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[bytes, Optional[float]]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] is not None and entry[1] <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None):
+        with self._lock:
+            self._entries[key] = (value, time.time() + ttl if ttl else None)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def add(self, key: str, value: bytes, ttl: Optional[float] = None) -> bool:
+        """Set ``key`` only if it is absent; returns whether it was set."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (entry[1] is None or entry[1] > time.time()):
+                return False
+            self._entries[key] = (value, time.time() + ttl if ttl else None)
+            return True
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+class SQLiteBackend:
+    def __init__(self, path: str):
+        """Backend shared by every worker on one host, in a WAL-mode SQLite file."""
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        self.path = path
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=10)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL)"
+            )
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM cache WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+                (key, time.time())
+            ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, time.time() + ttl if ttl else None)
+            )
+            self._writes += 1
+            if self._writes % 500 == 0:
+                self._conn.execute("DELETE FROM cache WHERE expires_at <= ?", (time.time(),))
+
+    def add(self, key: str, value: bytes, ttl: Optional[float] = None) -> bool:
+        """Set ``key`` only if it is absent; returns whether it was set."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("DELETE FROM cache WHERE key = ? AND expires_at <= ?", (key, now))
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, now + ttl if ttl else None)
+            )
+        return cursor.rowcount == 1
+
+    def delete(self, key: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+
+
+class RedisBackend:
+    def __init__(self, url: Optional[str] = None, client=None):
+        """Backend on any Redis-protocol server; pass ``client`` to use a stand-in such as fakeredis."""
+        if client is None:
+            try:
+                import redis
+            except ImportError:
+                raise RuntimeError("The redis package is required for a redis:// cache URL")
+            client = redis.Redis.from_url(url)
+        self._client = client
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self._client.get(key)
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None):
+        self._client.set(key, value, px=int(ttl * 1000) if ttl else None)
+
+    def add(self, key: str, value: bytes, ttl: Optional[float] = None) -> bool:
+        """Set ``key`` only if it is absent; returns whether it was set."""
+        return bool(self._client.set(key, value, nx=True, px=int(ttl * 1000) if ttl else None))
+
+    def delete(self, key: str):
+        self._client.delete(key)
+
+
+class SharedCache:
+    def __init__(self, backend, namespace: str = "bt", lock_timeout: float = 60.0):
+        """Serialized key/value cache over a memory, SQLite or Redis backend.
+
+        Keys may be any JSON-serializable value; they are hashed under
+        ``namespace``. ``lock_timeout`` bounds how long a worker holds the
+        lock that stops others recomputing a missing key.
+        """
+        self.backend = backend
+        self.namespace = namespace
+        self.lock_timeout = lock_timeout
+
+    def child(self, namespace: str) -> "SharedCache":
+        """Cache on the same backend under a sub-namespace."""
+        return SharedCache(self.backend, f"{self.namespace}:{namespace}", self.lock_timeout)
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        data = self._backend_call("get", self._key(key))
+        if data is None:
+            return default
+        try:
+            return deserialize(data)
+        except Exception as e:
+            logging.warning(f"Ignoring unreadable cache entry in {self.namespace}: {e}")
+            return default
+
+    def set(self, key: Any, value: Any, ttl: Optional[float] = None):
+        self._backend_call("set", self._key(key), serialize(value), ttl)
+
+    def delete(self, key: Any):
+        self._backend_call("delete", self._key(key))
+
+    def get_or_compute(self, key: Any, compute: Callable[[], Any], ttl: Optional[float] = None,
+                       cacheable: Callable[[Any], bool] = lambda value: True) -> Any:
+        """Cached value, or compute it with only one worker doing so at a time.
+
+        Workers that find another one computing the same key wait for its
+        result instead of repeating the work, up to ``lock_timeout``.
+        """
+        missing = object()
+        value = self.get(key, missing)
+        if value is not missing:
+            return value
+
+        if not self.acquire(key):
+            deadline = time.monotonic() + self.lock_timeout
+            delay = 0.05
+            while time.monotonic() < deadline:
+                time.sleep(delay)
+                delay = min(delay * 2, 1.0)
+                value = self.get(key, missing)
+                if value is not missing:
+                    return value
+                if self._backend_call("get", self._lock_key(key)) is None:
+                    break
+            # The other worker failed or gave up; compute without the lock
+            value = compute()
+            if cacheable(value):
+                self.set(key, value, ttl)
+            return value
+
+        try:
+            value = compute()
+            if cacheable(value):
+                self.set(key, value, ttl)
+            return value
+        finally:
+            self.release(key)
+
+    def acquire(self, key: Any) -> bool:
+        """Take the short-lived lock for recomputing ``key``."""
+        result = self._backend_call("add", self._lock_key(key), uuid.uuid4().bytes, self.lock_timeout)
+        # An unreachable backend must not stop the work from being done
+        return True if result is None else result
+
+    def release(self, key: Any):
+        self._backend_call("delete", self._lock_key(key))
+
+    def _key(self, key: Any) -> str:
+        digest = hashlib.sha256(json.dumps(key, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+        return f"{self.namespace}:{digest[:32]}"
+
+    def _lock_key(self, key: Any) -> str:
+        return self._key(key) + ":lock"
+
+    def _backend_call(self, method: str, *args):
+        """A cache outage degrades to cache misses instead of failing requests."""
+        try:
+            return getattr(self.backend, method)(*args)
+        except Exception as e:
+            logging.warning(f"Cache backend {type(self.backend).__name__}.{method} failed: {e}")
+            return None
+
+
+def cache_from_url(url: str = CACHE_URL) -> SharedCache:
+    """Build a cache from ``memory://``, ``sqlite:///path`` or ``redis://host:port/db``."""
+    if url.startswith("memory://"):
+        return SharedCache(MemoryBackend())
+    if url.startswith("sqlite:///"):
+        return SharedCache(SQLiteBackend(url[len("sqlite:///"):]))
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return SharedCache(RedisBackend(url))
+    raise ValueError(f"Unsupported cache URL: {url}")
+
+
+_shared_cache: Optional[SharedCache] = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_shared_cache() -> SharedCache:
+    """Process-wide cache configured by BHARATTUTOR_CACHE_URL."""
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            _shared_cache = cache_from_url()
+        return _shared_cache
+
+
+class StaleWhileRevalidateCache:
+    def __init__(self, fresh_seconds: float, store: Optional[SharedCache] = None, max_workers: int = 2):
+        """Cache that answers immediately and refreshes old entries in the background.
+
+        An entry older than ``fresh_seconds`` is still served, and a refresh is
+        started so the next caller gets a new value. Only a missing entry makes
+        the caller wait for ``compute``.
+        """
+        self.fresh_seconds = fresh_seconds
+        self.store = store or SharedCache(MemoryBackend())
+        self._lock = threading.Lock()
+        self._refreshing: set = set()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="bt-refresh")
+
+    def get(self, key: Any, compute: Callable[[], Any],
+            cacheable: Callable[[Any], bool] = lambda value: True) -> Any:
+        """Cached value for ``key``, computing it now only if there is none."""
+        entry = self.store.get(key)
+        if entry is None:
+            entry = self.store.get_or_compute(
+                key, lambda: {"value": compute(), "stored_at": time.time()},
+                cacheable=lambda entry: cacheable(entry["value"])
+            )
+            return entry["value"]
+
+        if time.time() - entry["stored_at"] > self.fresh_seconds:
+            self.refresh(key, compute, cacheable)
+        return entry["value"]
+
+    def refresh(self, key: Any, compute: Callable[[], Any], cacheable: Callable[[Any], bool] = lambda value: True):
+        """Recompute an entry in the background unless a refresh is already running."""
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+        self._executor.submit(self._refresh, key, compute, cacheable)
+
+    def contains(self, key: Any) -> bool:
+        return self.store.get(key) is not None
+
+    def _refresh(self, key: Any, compute: Callable[[], Any], cacheable: Callable[[Any], bool]):
+        # The shared lock keeps other workers from refreshing the same entry
+        if not self.store.acquire(key):
+            with self._lock:
+                self._refreshing.discard(key)
+            return
+        try:
+            value = compute()
+            if cacheable(value):
+                self.store.set(key, {"value": value, "stored_at": time.time()})
+        except Exception as e:
+            # The old value keeps being served
+            logging.warning(f"Background refresh of {key} failed: {e}")
+        finally:
+            self.store.release(key)
+            with self._lock:
+                self._refreshing.discard(key)
+
+
+class ExplanationCache:
+    def __init__(self, fresh_seconds: float = EXPLANATION_FRESH_SECONDS, store: Optional[SharedCache] = None):
+        """Topic explanations served stale-while-revalidate, shared by every session."""
+        self._cache = StaleWhileRevalidateCache(fresh_seconds, store)
+        self._prewarmed: set = set()
+        self._lock = threading.Lock()
+
+    def explain(self, gemini_client, knowledge_base, topic: str, subject: str, class_level: str,
+                explanation_type: str) -> str:
+        """Explanation for a topic, from the cache when possible."""
+        def compute():
+            context = knowledge_base.get_relevant_content(topic, subject, class_level)
+            return gemini_client.explain_topic(topic, context, subject, class_level, explanation_type)
+
+        return self._cache.get(
+            self._key(knowledge_base, topic, subject, class_level, explanation_type), compute,
+            cacheable=self._cacheable
+        )
+
+    def prewarm(self, gemini_client, knowledge_base, subject: str, class_level: str,
+                explanation_type: str = "Summary", limit: int = PREWARM_TOPICS):
+        """Generate the first ``limit`` curriculum topics of a class in the background, once per process."""
+        with self._lock:
+            if limit <= 0 or (subject, class_level, explanation_type) in self._prewarmed:
+                return
+            self._prewarmed.add((subject, class_level, explanation_type))
+
+        for topic in knowledge_base.get_topics_for_subject_class(subject, class_level)[:limit]:
+            key = self._key(knowledge_base, topic, subject, class_level, explanation_type)
+            if self._cache.contains(key):
+                continue
+
+            def compute(topic=topic):
+                context = knowledge_base.get_relevant_content(topic, subject, class_level)
+                return gemini_client.explain_topic(topic, context, subject, class_level, explanation_type)
+
+            self._cache.refresh(key, compute, cacheable=self._cacheable)
+
+    def prewarm_all(self, gemini_client, knowledge_base, subjects_and_classes: Iterable[Tuple[str, str]], **kwargs):
+        """Pre-warm several subject/class combinations."""
+        for subject, class_level in subjects_and_classes:
+            self.prewarm(gemini_client, knowledge_base, subject, class_level, **kwargs)
+
+    def _key(self, knowledge_base, topic: str, subject: str, class_level: str,
+             explanation_type: str) -> Tuple[str, ...]:
+        """Cache key by topic, so "Acids, Bases and Salts" and "acids bases & salts" share an entry."""
+        return (knowledge_base.topic_key(topic, subject, class_level), subject, class_level, explanation_type)
+
+    def _cacheable(self, explanation: Any) -> bool:
+        return isinstance(explanation, str) and bool(explanation.strip()) and \
+            not explanation.startswith(EXPLANATION_ERROR_PREFIXES)
@@ -7,6 +7,17 @@ class ConversationMemory:
         self.conversations = []
         self.max_conversations = max_conversations
     
+    def to_dict(self) -> Dict[str, Any]:
+        """Plain-data form of the memory, for snapshots."""
+        return {"max_conversations": self.max_conversations, "conversations": self.conversations}
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ConversationMemory":
+        """Restore a memory saved with ``to_dict``."""
+        memory = cls(data.get("max_conversations", 50))
+        memory.conversations = list(data.get("conversations", []))
+        return memory
+    
     def add_conversation(self, question: str, answer: str, subject: Optional[str] = None, 
                         class_level: Optional[str] = None, metadata: Optional[Dict[str, Any]] = None):
         """Add a new conversation to memory."""
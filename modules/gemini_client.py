@@ -1,186 +1,487 @@
 import os
+import re
+import json
 import logging
 import time
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Iterator, Callable
 
-# Load environment variables
-from dotenv import load_dotenv
-load_dotenv()
+from modules.prompts import PROMPTS, EXPLANATION_INSTRUCTIONS, HOMEWORK_INSTRUCTIONS
+from modules.token_budget import TokenBudget, PromptTooLargeError, TOKEN_USAGE, estimate_tokens, truncate_to_tokens
+from modules.profiling import span
+from modules.resilience import (
+    CircuitBreaker, CircuitOpenError, LatencyTracker, StaleCache, CachedResponse, hedged_call
+)
 
-import google.generativeai as genai
-from google.generativeai.types import GenerationConfig, HarmCategory, HarmBlockThreshold
+RATE_LIMIT_PATTERN = re.compile(r"\b429\b|quota|rate limit|resource.?exhausted", re.IGNORECASE)
+# Errors that say Gemini itself is unhealthy, as opposed to a bad request or key
+UPSTREAM_ERROR_PATTERN = re.compile(
+    r"\b50[0234]\b|deadline|timed? ?out|timeout|unavailable|internal ?server|connection", re.IGNORECASE
+)
+
+# Per-call deadlines in seconds; a stream's deadline covers the whole response
+REQUEST_TIMEOUT = float(os.getenv("GEMINI_TIMEOUT", "30"))
+STREAM_TIMEOUT = float(os.getenv("GEMINI_STREAM_TIMEOUT", "90"))
+# A client without a key pool waits and retries a rate-limited call this many times
+QUOTA_RETRIES = 2
+# Send a second, hedged request when a call runs past the p95 latency of its type
+HEDGE_REQUESTS = os.getenv("GEMINI_HEDGE_REQUESTS", "false").lower() in ("1", "true", "yes")
+
+# Shared by every client in the process, since an outage affects all keys
+BREAKER = CircuitBreaker(
+    failure_threshold=int(os.getenv("GEMINI_BREAKER_FAILURES", "5")),
+    reset_timeout=float(os.getenv("GEMINI_BREAKER_RESET", "30")),
+)
+LATENCY = LatencyTracker()
+STALE_RESPONSES = StaleCache(max_entries=int(os.getenv("GEMINI_STALE_CACHE_SIZE", "512")))
+
+# Model per tier, cheapest first; override with GEMINI_MODEL_FAST/STANDARD/ADVANCED
+MODEL_TIERS = {
+    "fast": os.getenv("GEMINI_MODEL_FAST", "gemini-1.5-flash-8b"),
+    "standard": os.getenv("GEMINI_MODEL_STANDARD", "gemini-1.5-flash"),
+    "advanced": os.getenv("GEMINI_MODEL_ADVANCED", "gemini-1.5-pro"),
+}
+TIER_ORDER = ["fast", "standard", "advanced"]
+MAX_OUTPUT_TOKENS_LIMIT = 8192
+# Openings of an answer that admits it is unsure or refuses; worth asking a larger model
+LOW_CONFIDENCE_PATTERN = re.compile(
+    r"\b(?:i(?:'| a)m not (?:sure|certain)|i (?:don'?t|do not) know|i (?:cannot|can'?t) (?:answer|determine|be certain)"
+    r"|i(?:'| a)m unable to|i am not able to|(?:there is )?not enough information)\b",
+    re.IGNORECASE
+)
+# Only the start of an answer is checked, as a long one may quote such phrases
+LOW_CONFIDENCE_CHARS = 300
+# Longest student answer sent for grading; anything past this cannot change the verdict
+MAX_GRADED_ANSWER_TOKENS = 200
+
+# Generation settings per request type, refined by help/explanation type
+ROUTES = {
+    "default": {"tier": "standard", "max_output_tokens": 2048, "temperature": 0.7},
+    "answer": {"tier": "standard", "max_output_tokens": 1024, "temperature": 0.7},
+    "explain": {
+        "Summary": {"tier": "fast", "max_output_tokens": 768, "temperature": 0.5},
+        "Detailed": {"tier": "standard", "max_output_tokens": 2048, "temperature": 0.7},
+        "Step-by-step": {"tier": "standard", "max_output_tokens": 2048, "temperature": 0.5},
+    },
+    "homework": {
+        "Hint only": {"tier": "fast", "max_output_tokens": 256, "temperature": 0.4},
+        "Concept explanation": {"tier": "standard", "max_output_tokens": 1536, "temperature": 0.6},
+        "Step-by-step solution": {"tier": "standard", "max_output_tokens": 2048, "temperature": 0.3},
+        "Similar examples": {"tier": "standard", "max_output_tokens": 1536, "temperature": 0.7},
+    },
+    # Token caps for per-item requests scale with the number of items
+    "quiz": {"tier": "standard", "max_output_tokens": 256, "tokens_per_item": 160, "temperature": 0.6},
+    "grading": {"tier": "fast", "max_output_tokens": 64, "tokens_per_item": 16, "temperature": 0.0},
+}
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """Whether an API error means the key is rate limited or out of quota."""
+    return RATE_LIMIT_PATTERN.search(f"{type(error).__name__} {error}") is not None
+
+def is_upstream_error(error: Exception) -> bool:
+    """Whether an API error means Gemini is failing or too slow to answer."""
+    return isinstance(error, (TimeoutError, ConnectionError)) or \
+        UPSTREAM_ERROR_PATTERN.search(f"{type(error).__name__} {error}") is not None
 
 class GeminiClient:
-    def __init__(self, api_key: str):
-        """Initialize Gemini client with API key."""
+    def __init__(self, api_key: str, on_rate_limit: Optional[Callable[[Exception], None]] = None):
+        """Initialize Gemini client with API key.
+        
+        Each client owns its transport, so clients with different keys can be
+        used side by side; ``on_rate_limit`` is called when a request hits a 429.
+        """
+        # The Gemini SDK takes seconds to import, so it is loaded with the first client
+        import google.generativeai as genai
+        from google.ai import generativelanguage as glm
+        
         try:
-            # Configure the Gemini API with retry logic
-            genai.configure(api_key=api_key)
+            self.on_rate_limit = on_rate_limit
+            self.token_budget = TokenBudget()
+            client_options = {"api_key": api_key}
+            self._generative_client = glm.GenerativeServiceClient(client_options=client_options)
             
             # List available models
             print("Listing available models...")
-            for model in genai.list_models():
+            for model in genai.list_models(client=glm.ModelServiceClient(client_options=client_options)):
                 if 'generateContent' in model.supported_generation_methods:
                     print(f"Model: {model.name}, Supports generateContent: {model.supported_generation_methods}")
             
-            # Try to use the most capable available model
-            model_name = 'gemini-1.5-flash'  # Try the latest model first
-            
-            # Initialize the model
-            self.model = genai.GenerativeModel(
-                model_name=model_name,
-                generation_config=GenerationConfig(
-                    temperature=0.7,
-                    top_p=0.95,
-                    top_k=40,
-                    max_output_tokens=2048,
-                ),
-                safety_settings={
-                    HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
-                    HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_NONE,
-                    HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_NONE,
-                    HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
-                }
-            )
-            self.chat = self.model.start_chat(history=[])
+            # Models are created per tier and system instruction on first use; "standard" is the default
+            self._models: Dict[tuple, Any] = {}
+            model_name = MODEL_TIERS["standard"]
+            self.model = self._model_for("standard")
             logging.info(f"Gemini client initialized with model: {model_name}")
         except Exception as e:
             logging.error(f"Failed to initialize Gemini client: {str(e)}")
             raise
         
-    def answer_question(self, question: str, context: str, subject: str, class_level: str, max_retries: int = 3) -> str:
+    def answer_question(self, question: str, context: str, subject: str, class_level: str) -> str:
         """Generate answer for student question with NCERT context."""
         if not question.strip():
             return "Please enter a valid question."
-        for attempt in range(max_retries):
-            try:
-                prompt = f"""
-                You are an AI tutor for Indian students following the NCERT curriculum. 
-                
-                Student Details:
-                - Class: {class_level}
-                - Subject: {subject}
-                
-                Question: {question}
-                
-                Relevant NCERT Context: {context}
-                
-                Instructions:
-                1. Provide a clear, age-appropriate answer based on NCERT curriculum
-                2. Use simple language suitable for the student's class level
-                3. Include examples where helpful
-                4. If the question is beyond the curriculum, gently guide to appropriate level
-                5. Always be encouraging and supportive
-                
-                Answer in markdown format with proper formatting:
-                """
-                
-                response = self.model.generate_content(prompt)
-                
-                # Handle different response formats
-                if hasattr(response, 'text'):
-                    return response.text
-                elif hasattr(response, 'parts'):
-                    return ' '.join(part.text for part in response.parts if hasattr(part, 'text'))
-                elif hasattr(response, 'candidates') and response.candidates:
-                    return response.candidates[0].content.parts[0].text
-                else:
-                    return "I'm sorry, I couldn't generate an answer. Please try rephrasing your question."
-                    
-            except Exception as e:
-                if "quota" in str(e).lower() and attempt < max_retries - 1:
-                    # Wait before retrying
-                    wait_time = 2 ** attempt  # Exponential backoff
-                    logging.warning(f"Rate limit hit, retrying in {wait_time} seconds...")
-                    time.sleep(wait_time)
-                    continue
-                
-                error_msg = f"Error generating answer: {str(e)}"
-                logging.error(error_msg)
-                return f"I encountered an error: {error_msg}"
+        try:
+            prompt = self._answer_prompt(question, context, subject, class_level)
+            
+            response = self._generate(prompt, "answer")
             
-            except Exception as e:
-                error_msg = f"Error in answer_question: {str(e)}"
-                logging.error(error_msg)
-                return f"Error: {error_msg}"
+            # Handle different response formats
+            if hasattr(response, 'text'):
+                return response.text
+            elif hasattr(response, 'parts'):
+                return ' '.join(part.text for part in response.parts if hasattr(part, 'text'))
+            elif hasattr(response, 'candidates') and response.candidates:
+                return response.candidates[0].content.parts[0].text
+            else:
+                return "I'm sorry, I couldn't generate an answer. Please try rephrasing your question."
+                
+        except (CircuitOpenError, PromptTooLargeError):
+            # Callers report an outage (503) or an oversized request (413) as such, never as an answer
+            raise
+        except Exception as e:
+            if is_rate_limit_error(e) and self.on_rate_limit:
+                # Retrying on this key would only hit its limit again; the key pool retries on another
+                raise
+            error_msg = f"Error generating answer: {str(e)}"
+            logging.error(error_msg)
+            return f"I encountered an error: {error_msg}"
     
     def explain_topic(self, topic: str, context: str, subject: str, class_level: str, explanation_type: str) -> str:
         """Generate topic explanation based on NCERT curriculum."""
         try:
-            type_instructions = {
-                "Summary": "Provide a concise overview of the topic covering main points",
-                "Detailed": "Give a comprehensive explanation with examples and applications",
-                "Step-by-step": "Break down the topic into easy-to-follow steps"
-            }
-            
-            prompt = f"""
-            You are an AI tutor for Indian students following the NCERT curriculum.
-            
-            Student Details:
-            - Class: {class_level}
-            - Subject: {subject}
-            
-            Topic to Explain: {topic}
+            prompt = self._explanation_prompt(topic, context, subject, class_level, explanation_type)
             
-            Relevant NCERT Context: {context}
-            
-            Explanation Type: {explanation_type}
-            Instructions: {type_instructions.get(explanation_type, 'Provide a clear explanation')}
-            
-            Additional Guidelines:
-            1. Use language appropriate for {class_level} students
-            2. Include relevant examples and analogies
-            3. Structure the explanation clearly
-            4. Connect to real-world applications where possible
-            5. Ensure accuracy according to NCERT standards
-            
-            Explanation:
-            """
-            
-            response = self.model.generate_content(prompt)
+            response = self._generate(prompt, "explain", explanation_type)
             return response.text or "I'm sorry, I couldn't generate an explanation. Please try again."
             
+        except (CircuitOpenError, PromptTooLargeError):
+            raise
         except Exception as e:
+            if is_rate_limit_error(e) and self.on_rate_limit:
+                raise
             logging.error(f"Error in explain_topic: {e}")
             return f"Error generating explanation: {str(e)}"
     
     def provide_homework_help(self, problem: str, context: str, subject: str, class_level: str, help_type: str) -> str:
         """Provide homework assistance based on the type of help requested."""
         try:
-            help_instructions = {
-                "Step-by-step solution": "Provide a complete step-by-step solution with explanations",
-                "Concept explanation": "Explain the underlying concepts needed to solve this problem",
-                "Hint only": "Give helpful hints to guide the student without giving away the answer",
-                "Similar examples": "Provide similar examples to help understand the pattern"
-            }
+            prompt = self._homework_prompt(problem, context, subject, class_level, help_type)
             
-            prompt = f"""
-            You are an AI tutor helping Indian students with their homework based on NCERT curriculum.
+            response = self._generate(prompt, "homework", help_type)
+            return response.text or "I'm sorry, I couldn't generate help. Please try rephrasing your problem."
+            
+        except (CircuitOpenError, PromptTooLargeError):
+            raise
+        except Exception as e:
+            if is_rate_limit_error(e) and self.on_rate_limit:
+                raise
+            logging.error(f"Error in provide_homework_help: {e}")
+            return f"Error generating help: {str(e)}"
+    
+    def generate_stream(self, prompt: str, request_type: str = "default", variant: Optional[str] = None,
+                        num_items: Optional[int] = None) -> Iterator[str]:
+        """Stream the response text for a prompt chunk by chunk."""
+        response = self._generate(prompt, request_type, variant, num_items, stream=True)
+        parts = []
+        with span("gemini.stream", request_type=request_type):
+            for chunk in response:
+                try:
+                    text = chunk.text
+                except ValueError:
+                    # Chunks without text parts (e.g. a final safety verdict)
+                    continue
+                if text:
+                    parts.append(text)
+                    yield text
+        if not isinstance(response, CachedResponse):
+            STALE_RESPONSES.put((request_type, variant, prompt), "".join(parts))
+        # Usage is only known once the stream has been consumed
+        TOKEN_USAGE.record(request_type, getattr(response, "usage_metadata", None))
+    
+    def grade_short_answers(self, items: List[Dict[str, Any]], subject: str, class_level: str) -> List[Optional[bool]]:
+        """Grade short answers in as few calls as the token budget allows; None marks an item that could not be graded."""
+        template = PROMPTS["grading"]
+        blocks = [
+            f"Question: {item['question']}\n"
+            f"Expected answer: {item['correct_answer']}\n"
+            f"Student answer: {truncate_to_tokens(str(item['answer']), MAX_GRADED_ANSWER_TOKENS)}"
+            for item in items
+        ]
+        overhead = self.token_budget.prompt_tokens(
+            template, template.render(items="", subject=subject, class_level=class_level)
+        )
+        
+        # Split into batches that each fit the prompt budget, so one long item does not fail the rest
+        verdicts: List[Optional[bool]] = []
+        batch: List[str] = []
+        batch_tokens = overhead
+        for block in blocks:
+            # The "[n] " label and blank line between items
+            tokens = estimate_tokens(block) + 4
+            if batch and batch_tokens + tokens > self.token_budget.max_input_tokens:
+                verdicts.extend(self._grade_batch(batch, subject, class_level))
+                batch, batch_tokens = [], overhead
+            batch.append(block)
+            batch_tokens += tokens
+        if batch:
+            verdicts.extend(self._grade_batch(batch, subject, class_level))
+        return verdicts
+    
+    def _grade_batch(self, blocks: List[str], subject: str, class_level: str) -> List[Optional[bool]]:
+        """Grade formatted items in one call."""
+        try:
+            numbered_items = "\n\n".join(f"[{i}] {block}" for i, block in enumerate(blocks, 1))
             
-            Student Details:
-            - Class: {class_level}
-            - Subject: {subject}
+            prompt = self.token_budget.render(
+                PROMPTS["grading"], {"items": numbered_items, "subject": subject, "class_level": class_level},
+                truncatable=()
+            )
             
-            Homework Problem: {problem}
+            response = self._generate(prompt, "grading", num_items=len(blocks))
+            text = response.text or ""
+            start, end = text.find("["), text.rfind("]")
+            graded = json.loads(text[start:end + 1]) if start != -1 and end > start else []
             
-            Relevant NCERT Context: {context}
+            verdicts: List[Optional[bool]] = [None] * len(blocks)
+            for entry in graded:
+                index = int(entry.get("id", 0)) - 1
+                if 0 <= index < len(blocks) and isinstance(entry.get("correct"), bool):
+                    verdicts[index] = entry["correct"]
+            return verdicts
             
-            Help Type Requested: {help_type}
-            Instructions: {help_instructions.get(help_type, 'Provide appropriate help')}
+        except Exception as e:
+            logging.error(f"Error in grade_short_answers: {e}")
+            return [None] * len(blocks)
+    
+    def _route(self, request_type: str, variant: Optional[str] = None, num_items: Optional[int] = None) -> Dict[str, Any]:
+        """Pick model tier, output-token cap and temperature for a request."""
+        route = ROUTES.get(request_type, ROUTES["default"])
+        if "tier" not in route:
+            route = route.get(variant, ROUTES["default"])
+        route = dict(route)
+        
+        tokens_per_item = route.pop("tokens_per_item", 0)
+        if num_items:
+            route["max_output_tokens"] += tokens_per_item * num_items
+        route["max_output_tokens"] = min(route["max_output_tokens"], MAX_OUTPUT_TOKENS_LIMIT)
+        return route
+    
+    def _generate(self, prompt: str, request_type: str = "default", variant: Optional[str] = None,
+                  num_items: Optional[int] = None, stream: bool = False, max_escalations: int = 1):
+        """Single entry point for model calls.
+        
+        Routes the request to a model tier, escalates once to a larger tier and
+        token cap when the answer comes back truncated, empty or unsure, and reports
+        rate limiting to the owner; a client without one waits and retries.
+        Streams cannot be escalated. The static instructions of a registered
+        prompt go out as the system instruction.
+        While Gemini is failing, the last good answer to the same prompt is
+        served instead if there is one.
+        """
+        route = self._route(request_type, variant, num_items)
+        template = PROMPTS.get(request_type)
+        system_instruction = template.system_instruction if template else None
+        estimated_input_tokens = estimate_tokens(prompt) + estimate_tokens(system_instruction or "")
+        
+        stale_key = (request_type, variant, prompt)
+        
+        for escalation in range(max_escalations + 1):
+            model = self._model_for(route["tier"], system_instruction)
+            generation_config = {
+                "max_output_tokens": route["max_output_tokens"],
+                "temperature": route["temperature"],
+            }
             
-            Guidelines:
-            1. Help the student learn, don't just give answers
-            2. Use teaching methods appropriate for {class_level}
-            3. Encourage independent thinking
-            4. Relate to NCERT curriculum standards
-            5. Be patient and supportive
+            def call():
+                return model.generate_content(
+                    prompt,
+                    generation_config=generation_config,
+                    stream=stream,
+                    request_options={"timeout": STREAM_TIMEOUT if stream else REQUEST_TIMEOUT}
+                )
             
-            Help Response:
-            """
+            for attempt in range(QUOTA_RETRIES + 1):
+                try:
+                    # For streams this covers the wait for the first chunk; the rest is "gemini.stream"
+                    with span("gemini.request", request_type=request_type, tier=route["tier"], stream=stream):
+                        response = self._call(call, request_type, stale_key, stream)
+                    break
+                except Exception as e:
+                    # With a key pool (on_rate_limit) the call moves to another key instead of waiting
+                    if self.on_rate_limit or not is_rate_limit_error(e) or attempt == QUOTA_RETRIES:
+                        raise
+                    wait_time = 2 ** attempt
+                    logging.warning(f"Rate limit hit, retrying in {wait_time} seconds...")
+                    time.sleep(wait_time)
+            if stream or isinstance(response, CachedResponse):
+                return response
+            TOKEN_USAGE.record(request_type, getattr(response, "usage_metadata", None), estimated_input_tokens)
+            if escalation == max_escalations:
+                self._remember(stale_key, response)
+                return response
             
-            response = self.model.generate_content(prompt)
-            return response.text or "I'm sorry, I couldn't generate help. Please try rephrasing your problem."
+            reason = self._escalation_reason(response)
+            if reason is None:
+                self._remember(stale_key, response)
+                return response
             
+            next_route = self._escalate(route, reason)
+            if next_route == route:
+                return response
+            logging.info(f"Escalating {request_type} request ({reason}): {route} -> {next_route}")
+            route = next_route
+        
+        return response
+    
+    def _call(self, call: Callable[[], Any], request_type: str, stale_key: tuple, stream: bool):
+        """Make one model call through the circuit breaker, hedging slow calls if enabled."""
+        if not BREAKER.allow():
+            stale = STALE_RESPONSES.get(stale_key)
+            if stale is not None:
+                logging.warning(f"Gemini circuit is open, serving a stale {request_type} response")
+                return stale
+            raise CircuitOpenError(
+                f"The AI service is having trouble right now. Please try again in {BREAKER.retry_after():.0f} seconds."
+            )
+        
+        hedge_delay = LATENCY.percentile(request_type, 95) if HEDGE_REQUESTS and not stream else None
+        started = time.monotonic()
+        try:
+            response = hedged_call(call, hedge_delay) if hedge_delay else call()
         except Exception as e:
-            logging.error(f"Error in provide_homework_help: {e}")
-            return f"Error generating help: {str(e)}"
+            if is_rate_limit_error(e):
+                BREAKER.release()
+                if self.on_rate_limit:
+                    self.on_rate_limit(e)
+                raise
+            if not is_upstream_error(e):
+                BREAKER.release()
+                raise
+            
+            BREAKER.record_failure()
+            stale = STALE_RESPONSES.get(stale_key)
+            if stale is not None:
+                logging.warning(f"Gemini call failed ({e}), serving a stale {request_type} response")
+                return stale
+            raise
+        
+        BREAKER.record_success()
+        if not stream:
+            LATENCY.record(request_type, time.monotonic() - started)
+        return response
+    
+    def _remember(self, stale_key: tuple, response):
+        """Keep a good response to serve while Gemini is down."""
+        try:
+            STALE_RESPONSES.put(stale_key, response.text)
+        except (AttributeError, ValueError):
+            pass
+    
+    def _escalation_reason(self, response) -> Optional[str]:
+        """Why a response is worth retrying on a larger tier, if at all."""
+        try:
+            finish_reason = response.candidates[0].finish_reason
+            finish_reason = getattr(finish_reason, "name", str(finish_reason))
+        except (AttributeError, IndexError):
+            return "no_candidates"
+        
+        if finish_reason == "MAX_TOKENS":
+            return "truncated"
+        try:
+            text = response.text.strip()
+        except ValueError:
+            return "empty"
+        if not text:
+            return "empty"
+        if LOW_CONFIDENCE_PATTERN.search(text[:LOW_CONFIDENCE_CHARS]):
+            return "low_confidence"
+        return None
+    
+    def _escalate(self, route: Dict[str, Any], reason: str) -> Dict[str, Any]:
+        """Next route after a poor response: more tokens if truncated, a bigger model otherwise."""
+        route = dict(route)
+        if reason == "truncated" and route["max_output_tokens"] < MAX_OUTPUT_TOKENS_LIMIT:
+            route["max_output_tokens"] = min(route["max_output_tokens"] * 2, MAX_OUTPUT_TOKENS_LIMIT)
+        tier_index = TIER_ORDER.index(route["tier"])
+        if reason != "truncated" or route["tier"] == "fast":
+            route["tier"] = TIER_ORDER[min(tier_index + 1, len(TIER_ORDER) - 1)]
+        return route
+    
+    def _model_for(self, tier: str, system_instruction: Optional[str] = None):
+        """Model for a tier and system instruction, bound to this client's key."""
+        key = (tier, system_instruction)
+        model = self._models.get(key)
+        if model is None:
+            import google.generativeai as genai
+            from google.generativeai.types import GenerationConfig, HarmCategory, HarmBlockThreshold
+            
+            model = genai.GenerativeModel(
+                model_name=MODEL_TIERS[tier],
+                system_instruction=system_instruction,
+                generation_config=GenerationConfig(
+                    temperature=0.7,
+                    top_p=0.95,
+                    top_k=40,
+                    max_output_tokens=2048,
+                ),
+                safety_settings={
+                    HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
+                    HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_NONE,
+                    HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_NONE,
+                    HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
+                }
+            )
+            # Bind the model to this key instead of genai.configure(), which is process-global
+            model._client = self._generative_client
+            self._models[key] = model
+        return model
+    
+    def stream_answer(self, question: str, context: str, subject: str, class_level: str) -> Iterator[str]:
+        """Stream an answer to a student question chunk by chunk."""
+        return self.generate_stream(self._answer_prompt(question, context, subject, class_level), "answer")
+    
+    def stream_explanation(self, topic: str, context: str, subject: str, class_level: str,
+                           explanation_type: str) -> Iterator[str]:
+        """Stream a topic explanation chunk by chunk."""
+        return self.generate_stream(
+            self._explanation_prompt(topic, context, subject, class_level, explanation_type), "explain", explanation_type
+        )
+    
+    def stream_homework_help(self, problem: str, context: str, subject: str, class_level: str,
+                             help_type: str) -> Iterator[str]:
+        """Stream homework help chunk by chunk."""
+        return self.generate_stream(
+            self._homework_prompt(problem, context, subject, class_level, help_type), "homework", help_type
+        )
+    
+    def _answer_prompt(self, question: str, context: str, subject: str, class_level: str) -> str:
+        """Build the prompt for answering a student question."""
+        return self.token_budget.render(
+            PROMPTS["answer"],
+            {"question": question, "context": context, "subject": subject, "class_level": class_level},
+            checked=("question",)
+        )
+    
+    def _explanation_prompt(self, topic: str, context: str, subject: str, class_level: str,
+                            explanation_type: str) -> str:
+        """Build the prompt for explaining a topic."""
+        return self.token_budget.render(
+            PROMPTS["explain"],
+            {
+                "topic": topic, "context": context, "subject": subject, "class_level": class_level,
+                "explanation_type": explanation_type,
+                "instructions": EXPLANATION_INSTRUCTIONS.get(explanation_type, "Provide a clear explanation"),
+            },
+            checked=("topic",)
+        )
+    
+    def _homework_prompt(self, problem: str, context: str, subject: str, class_level: str,
+                         help_type: str) -> str:
+        """Build the prompt for homework help."""
+        return self.token_budget.render(
+            PROMPTS["homework"],
+            {
+                "problem": problem, "context": context, "subject": subject, "class_level": class_level,
+                "help_type": help_type,
+                "instructions": HOMEWORK_INSTRUCTIONS.get(help_type, "Provide appropriate help"),
+            },
+            checked=("problem",)
+        )
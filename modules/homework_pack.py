@@ -0,0 +1,266 @@
+"""Solve a whole worksheet offline.
+
+Reads problems from JSONL or CSV (fields ``problem`` and optionally ``id``,
+``subject``, ``class_level``, ``help_type``), solves them with retrieval and
+Gemini a few at a time, and appends each result to a JSONL file as it
+finishes. Running the same command again resumes: problems already solved in
+the output are skipped and failed ones are retried.
+
+    python -m modules.homework_pack worksheet.csv -o solutions.jsonl --markdown solutions.md \\
+        --subject Mathematics --class-level "Class 7" --concurrency 4
+"""
+import os
+import csv
+import sys
+import json
+import time
+import logging
+import argparse
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Dict, List, Any, Optional, Iterator, Set
+from dotenv import load_dotenv
+
+# Load environment variables before the modules that read them at import time
+load_dotenv()
+
+from modules.token_budget import TokenBudget, PromptTooLargeError, TOKEN_USAGE
+from modules.profiling import trace
+
+DEFAULT_HELP_TYPE = "Step-by-step solution"
+
+OK = "ok"
+FAILED = "failed"
+REJECTED = "rejected"
+
+# provide_homework_help reports failures as text
+HOMEWORK_ERROR_PREFIXES = ("Error generating help", "I'm sorry, I couldn't generate help")
+
+
+def read_problems(path: str, subject: str = "", class_level: str = "",
+                  help_type: str = DEFAULT_HELP_TYPE) -> Iterator[Dict[str, str]]:
+    """Problems from a JSONL or CSV file, with defaults filled in; IDs default to the row number."""
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        if path.lower().endswith(".csv"):
+            rows = csv.DictReader(f)
+        else:
+            rows = (json.loads(line) for line in f if line.strip())
+        for number, row in enumerate(rows, 1):
+            problem = str(row.get("problem") or "").strip()
+            if not problem:
+                logging.warning(f"Skipping row {number} of {path}: no problem")
+                continue
+            yield {
+                "id": str(row.get("id") or number),
+                "problem": problem,
+                "subject": row.get("subject") or subject,
+                "class_level": row.get("class_level") or class_level,
+                "help_type": row.get("help_type") or help_type,
+            }
+
+
+def load_checkpoint(output_path: str) -> Set[str]:
+    """IDs already solved in an earlier run; a line cut short by a crash is ignored."""
+    solved = set()
+    if not os.path.exists(output_path):
+        return solved
+    with open(output_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except ValueError:
+                continue
+            if result.get("status") == OK:
+                solved.add(str(result["id"]))
+    return solved
+
+
+def solve(problem: Dict[str, str], client, knowledge_base, token_budget: TokenBudget,
+          retries: int = 2) -> Dict[str, Any]:
+    """Solve one problem, retrying failed attempts with back-off."""
+    started = time.monotonic()
+    result = dict(problem, attempts=0)
+    try:
+        token_budget.check(problem=problem["problem"])
+    except PromptTooLargeError as e:
+        return dict(result, status=REJECTED, error=str(e), seconds=0.0)
+
+    with trace("homework_pack", id=problem["id"]):
+        for attempt in range(retries + 1):
+            result["attempts"] = attempt + 1
+            try:
+                context = knowledge_base.get_relevant_content(
+                    problem["problem"], problem["subject"], problem["class_level"]
+                )
+                solution = client.provide_homework_help(
+                    problem["problem"], context, problem["subject"], problem["class_level"], problem["help_type"]
+                )
+                if solution and not solution.startswith(HOMEWORK_ERROR_PREFIXES):
+                    return dict(result, status=OK, solution=solution,
+                                seconds=round(time.monotonic() - started, 2))
+                error = solution or "Empty response"
+            except PromptTooLargeError as e:
+                # The same prompt would be rejected again
+                return dict(result, status=REJECTED, error=str(e), seconds=round(time.monotonic() - started, 2))
+            except Exception as e:
+                # e.g. every key rate limited or the circuit open; worth waiting for
+                error = str(e)
+            logging.warning(f"Problem {problem['id']} attempt {attempt + 1} failed: {error}")
+            if attempt < retries:
+                time.sleep(2 ** attempt)
+
+    return dict(result, status=FAILED, error=error, seconds=round(time.monotonic() - started, 2))
+
+
+def markdown_section(result: Dict[str, Any]) -> str:
+    heading = f"## Problem {result['id']}\n\n{result['problem']}\n\n"
+    if result["status"] == OK:
+        return heading + f"### {result['help_type']}\n\n{result['solution'].strip()}\n\n---\n\n"
+    return heading + f"> Not solved: {result.get('error', 'unknown error')}\n\n---\n\n"
+
+
+def write_markdown(output_path: str, markdown_path: str, order: List[str], title: str):
+    """Rewrite the Markdown worksheet in input order from every result in the JSONL output."""
+    latest: Dict[str, Dict[str, Any]] = {}
+    with open(output_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except ValueError:
+                continue
+            # A solved result is never replaced by a later failure
+            if latest.get(str(result["id"]), {}).get("status") != OK:
+                latest[str(result["id"])] = result
+
+    temp_path = markdown_path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        f.write(f"# {title}\n\n")
+        for problem_id in order:
+            if problem_id in latest:
+                f.write(markdown_section(latest[problem_id]))
+    os.replace(temp_path, markdown_path)
+
+
+def run_pack(problems: List[Dict[str, str]], client, knowledge_base, output_path: str,
+             markdown_path: Optional[str] = None, concurrency: int = 4, retries: int = 2,
+             title: str = "Homework Pack") -> Dict[str, Any]:
+    """Solve every problem not already solved in ``output_path``, appending results as they finish."""
+    solved = load_checkpoint(output_path)
+    pending = [problem for problem in problems if problem["id"] not in solved]
+    token_budget = TokenBudget()
+    stats: Dict[str, Any] = {"problems": len(problems), "skipped": len(problems) - len(pending),
+                             OK: 0, FAILED: 0, REJECTED: 0}
+    latencies: List[float] = []
+    started = time.monotonic()
+
+    if os.path.dirname(output_path):
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    # A line cut short by a crash must not swallow the next result
+    if os.path.exists(output_path) and os.path.getsize(output_path):
+        with open(output_path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            needs_newline = f.read(1) != b"\n"
+    else:
+        needs_newline = False
+
+    with open(output_path, "a", encoding="utf-8") as output, \
+            open(markdown_path, "a", encoding="utf-8") if markdown_path else open(os.devnull, "w") as markdown, \
+            ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="bt-pack") as executor:
+        if needs_newline:
+            output.write("\n")
+        queue = iter(pending)
+        in_flight = set()
+        done_count = 0
+        while True:
+            # At most ``concurrency`` problems are in flight, plus one queued per worker
+            while len(in_flight) < concurrency * 2:
+                problem = next(queue, None)
+                if problem is None:
+                    break
+                in_flight.add(executor.submit(solve, problem, client, knowledge_base, token_budget, retries))
+            if not in_flight:
+                break
+
+            finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                result = future.result()
+                output.write(json.dumps(result, ensure_ascii=False) + "\n")
+                output.flush()
+                markdown.write(markdown_section(result))
+                markdown.flush()
+
+                done_count += 1
+                stats[result["status"]] += 1
+                if result["status"] == OK:
+                    latencies.append(result["seconds"])
+                print(f"[{done_count}/{len(pending)}] {result['status']:<8} {result['id']} "
+                      f"({result['seconds']:.1f}s, {result['attempts']} attempt(s))", file=sys.stderr)
+
+    if markdown_path:
+        write_markdown(output_path, markdown_path, [problem["id"] for problem in problems], title)
+
+    elapsed = time.monotonic() - started
+    latencies.sort()
+    stats.update({
+        "seconds": round(elapsed, 1),
+        "problems_per_minute": round(stats[OK] * 60 / elapsed, 1) if elapsed > 0 else 0.0,
+        "median_seconds": latencies[len(latencies) // 2] if latencies else None,
+        "p95_seconds": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] if latencies else None,
+        "tokens": TOKEN_USAGE.stats(),
+    })
+    return stats
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="problems as .jsonl or .csv")
+    parser.add_argument("-o", "--output", required=True, help="results JSONL, also the resume checkpoint")
+    parser.add_argument("--markdown", help="also write a Markdown worksheet with the solutions")
+    parser.add_argument("--subject", default="", help="subject for rows that do not name one")
+    parser.add_argument("--class-level", default="", help='class for rows that do not name one, e.g. "Class 7"')
+    parser.add_argument("--help-type", default=DEFAULT_HELP_TYPE, help="help type for rows that do not name one")
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv("HOMEWORK_PACK_CONCURRENCY", "4")))
+    parser.add_argument("--retries", type=int, default=2, help="extra attempts for a failed problem")
+    parser.add_argument("--restart", action="store_true", help="ignore earlier results and solve everything again")
+    args = parser.parse_args()
+
+    # Deferred so --help and input errors do not pay for loading the knowledge base
+    from modules.key_pool import GeminiKeyPool
+    from modules.knowledge_base import NCERTKnowledgeBase
+    from modules.cache import get_shared_cache
+    from modules.snapshot import get_snapshot
+
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "WARNING"), format="%(levelname)s %(message)s")
+    if not (os.getenv("GEMINI_API_KEYS") or os.getenv("GEMINI_API_KEY")):
+        print("GEMINI_API_KEYS or GEMINI_API_KEY must be set", file=sys.stderr)
+        return 2
+
+    problems = list(read_problems(args.input, args.subject, args.class_level, args.help_type))
+    missing = [problem["id"] for problem in problems if not (problem["subject"] and problem["class_level"])]
+    if missing:
+        print(f"Problems {', '.join(missing[:10])} have no subject or class; pass --subject and --class-level",
+              file=sys.stderr)
+        return 2
+    if args.restart:
+        for path in (args.output, args.markdown):
+            if path and os.path.exists(path):
+                os.remove(path)
+
+    stats = run_pack(
+        problems, GeminiKeyPool.from_env(),
+        NCERTKnowledgeBase(cache=get_shared_cache().child("retrieval"), snapshot=get_snapshot()),
+        args.output, args.markdown, concurrency=max(1, args.concurrency), retries=max(0, args.retries),
+        title=os.path.splitext(os.path.basename(args.input))[0]
+    )
+    print(
+        f"\n{stats['problems']} problems: {stats[OK]} solved, {stats[FAILED]} failed, "
+        f"{stats[REJECTED]} rejected as too long, {stats['skipped']} already solved\n"
+        f"{stats['seconds']}s, {stats['problems_per_minute']} problems/min, "
+        f"median {stats['median_seconds']}s, p95 {stats['p95_seconds']}s per problem",
+        file=sys.stderr
+    )
+    print(json.dumps(stats, ensure_ascii=False))
+    return 1 if stats[FAILED] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,268 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, Callable
+
+from modules.profiling import traced
+
+DEFAULT_DB_PATH = os.path.join(os.getenv("BHARATTUTOR_DATA_DIR", "data"), "jobs.db")
+
+# Every queue records a heartbeat; active jobs of a queue whose heartbeat is older
+# than HEARTBEAT_TIMEOUT have lost their worker (PIDs repeat across container restarts)
+HEARTBEAT_INTERVAL = 5.0
+HEARTBEAT_TIMEOUT = 30.0
+# Finished jobs are deleted after this many seconds, checked every PURGE_INTERVAL
+JOB_RETENTION = float(os.getenv("BHARATTUTOR_JOB_RETENTION", str(24 * 3600)))
+PURGE_INTERVAL = 3600.0
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+ACTIVE_STATUSES = (PENDING, RUNNING)
+
+# A job function receives a callback for reporting partial results
+JobFunction = Callable[[Callable[[Any], None]], Any]
+
+
+class JobQueue:
+    def __init__(self, db_path: str = DEFAULT_DB_PATH, max_workers: int = 4, max_attempts: int = 1):
+        """Initialize the job table and worker pool.
+
+        Jobs are LLM calls that spend their time waiting on the network, so a
+        thread pool is used; job functions close over live clients and could
+        not be shipped to another process anyway.
+        """
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+
+        self.db_path = db_path
+        self.max_attempts = max_attempts
+        # Identifies this queue's jobs; unlike a PID it is never reused
+        self.owner = uuid.uuid4().hex
+        self._lock = threading.Lock()
+        self._changed = threading.Condition()
+        self._functions: Dict[str, JobFunction] = {}
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="bt-job")
+
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    dedup_key TEXT NOT NULL,
+                    params TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    progress TEXT,
+                    result TEXT,
+                    error TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    owner TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+            if "owner" not in columns:
+                # Tables from before heartbeats; their active jobs have no owner and are reaped below
+                self._conn.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_dedup ON jobs (dedup_key, status)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS heartbeats (owner TEXT PRIMARY KEY, beat_at REAL NOT NULL)"
+            )
+        self._beat()
+        self._reap_orphans()
+
+        self._stopped = threading.Event()
+        self._heartbeat = threading.Thread(target=self._heartbeat_loop, name="bt-job-heartbeat", daemon=True)
+        self._heartbeat.start()
+
+    def submit(self, kind: str, params: Dict[str, Any], function: JobFunction, scope: str = "") -> str:
+        """Queue a job and return its ID; an identical active job of the same ``scope`` is reused instead.
+
+        ``function`` may close over state that ``params`` do not show, such as
+        a session's client or history, so jobs are only shared within a scope,
+        e.g. one session.
+        """
+        dedup_key = self._dedup_key(kind, params, scope)
+
+        with self._lock:
+            now = time.time()
+            # Only jobs whose queue is still beating will ever finish
+            row = self._conn.execute(
+                "SELECT jobs.id FROM jobs JOIN heartbeats ON heartbeats.owner = jobs.owner "
+                "WHERE jobs.dedup_key = ? AND jobs.status IN (?, ?) AND heartbeats.beat_at >= ? "
+                "ORDER BY jobs.created_at DESC LIMIT 1",
+                (dedup_key, *ACTIVE_STATUSES, now - HEARTBEAT_TIMEOUT)
+            ).fetchone()
+            if row:
+                return row["id"]
+
+            job_id = uuid.uuid4().hex
+            self._conn.execute(
+                "INSERT INTO jobs (id, kind, dedup_key, params, status, owner, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, kind, dedup_key, json.dumps(params, default=str), PENDING, self.owner, now, now)
+            )
+            # Each job is its own trace when profiling is on
+            self._functions[job_id] = traced(f"job:{kind}")(function)
+
+        self._executor.submit(self._run, job_id)
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Return a job record, or None if the ID is unknown."""
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+
+        job = dict(row)
+        for field in ("params", "progress", "result"):
+            job[field] = json.loads(job[field]) if job[field] is not None else None
+        job["retryable"] = job["status"] == FAILED and job_id in self._functions
+        return job
+
+    def wait(self, job_id: str, timeout: Optional[float] = None,
+             on_progress: Optional[Callable[[Any], None]] = None) -> Optional[Dict[str, Any]]:
+        """Block until the job finishes or ``timeout`` expires; returns the latest record."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        last_progress = None
+
+        while True:
+            job = self.get(job_id)
+            if job is None or job["status"] not in ACTIVE_STATUSES:
+                return job
+
+            if on_progress and job["progress"] is not None and job["progress"] != last_progress:
+                last_progress = job["progress"]
+                on_progress(last_progress)
+
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return job
+            with self._changed:
+                # Jobs from this process notify; the timeout covers other processes
+                self._changed.wait(timeout=0.5 if remaining is None else min(0.5, remaining))
+
+    def retry(self, job_id: str) -> bool:
+        """Requeue a failed job; returns False if it cannot be retried."""
+        with self._lock:
+            row = self._conn.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None or row["status"] != FAILED or job_id not in self._functions:
+                return False
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, error = NULL, owner = ?, updated_at = ? WHERE id = ?",
+                (PENDING, self.owner, time.time(), job_id)
+            )
+
+        self._executor.submit(self._run, job_id)
+        return True
+
+    def purge(self, older_than: float = 24 * 3600) -> int:
+        """Delete finished jobs older than ``older_than`` seconds."""
+        cutoff = time.time() - older_than
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id FROM jobs WHERE status IN (?, ?) AND updated_at < ?", (DONE, FAILED, cutoff)
+            ).fetchall()
+            self._conn.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?) AND updated_at < ?", (DONE, FAILED, cutoff)
+            )
+            for row in rows:
+                self._functions.pop(row["id"], None)
+        return len(rows)
+
+    def shutdown(self, wait: bool = True):
+        """Stop the worker pool and heartbeat and close the database."""
+        self._stopped.set()
+        self._executor.shutdown(wait=wait)
+        self._heartbeat.join()
+        with self._lock:
+            self._conn.execute("DELETE FROM heartbeats WHERE owner = ?", (self.owner,))
+            self._conn.close()
+
+    def _run(self, job_id: str):
+        """Execute a job on a worker thread, retrying up to ``max_attempts``."""
+        function = self._functions.get(job_id)
+        if function is None:
+            return
+
+        def report_progress(progress: Any):
+            self._update(job_id, progress=json.dumps(progress, default=str))
+
+        attempts = 0
+        while True:
+            attempts += 1
+            self._update(job_id, status=RUNNING, attempts=attempts)
+            try:
+                result = function(report_progress)
+                self._update(job_id, status=DONE, result=json.dumps(result, default=str), error=None)
+                # Finished jobs never run again, so drop the closure and its clients
+                self._functions.pop(job_id, None)
+                return
+            except Exception as e:
+                logging.error(f"Job {job_id} failed (attempt {attempts}): {e}")
+                if attempts >= self.max_attempts:
+                    self._update(job_id, status=FAILED, error=str(e))
+                    return
+                time.sleep(2 ** (attempts - 1))
+
+    def _update(self, job_id: str, **fields):
+        """Write job fields and wake up waiters."""
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+        with self._changed:
+            self._changed.notify_all()
+
+    def _beat(self):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO heartbeats (owner, beat_at) VALUES (?, ?)", (self.owner, time.time())
+            )
+
+    def _reap_orphans(self) -> int:
+        """Fail active jobs whose queue stopped beating, e.g. one killed by a restart."""
+        cutoff = time.time() - HEARTBEAT_TIMEOUT
+        with self._lock:
+            live = "SELECT owner FROM heartbeats WHERE beat_at >= ?"
+            reaped = self._conn.execute(
+                f"UPDATE jobs SET status = ?, error = ?, updated_at = ? "
+                f"WHERE status IN (?, ?) AND (owner IS NULL OR owner NOT IN ({live}))",
+                (FAILED, "Interrupted by a server restart", time.time(), *ACTIVE_STATUSES, cutoff)
+            ).rowcount
+            self._conn.execute("DELETE FROM heartbeats WHERE beat_at < ?", (cutoff,))
+        if reaped:
+            logging.warning(f"Marked {reaped} jobs of stopped workers as failed")
+            with self._changed:
+                self._changed.notify_all()
+        return reaped
+
+    def _heartbeat_loop(self):
+        """Beat, reap other queues' orphaned jobs and purge old ones until shutdown."""
+        purged_at = 0.0
+        while not self._stopped.wait(HEARTBEAT_INTERVAL):
+            try:
+                self._beat()
+                self._reap_orphans()
+                if time.monotonic() - purged_at > PURGE_INTERVAL:
+                    purged_at = time.monotonic()
+                    self.purge(JOB_RETENTION)
+            except sqlite3.Error as e:
+                logging.error(f"Job queue housekeeping failed: {e}")
+
+    def _dedup_key(self, kind: str, params: Dict[str, Any], scope: str = "") -> str:
+        """Stable hash of a job's scope, kind and parameters."""
+        payload = json.dumps({"scope": scope, "kind": kind, "params": params}, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
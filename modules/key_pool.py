@@ -0,0 +1,183 @@
+import os
+import time
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Optional, Dict, Any, List, Callable, Iterator
+
+from modules.gemini_client import GeminiClient, is_rate_limit_error
+
+
+class NoAvailableKeyError(RuntimeError):
+    """Raised when every key in the pool is cooling down after rate limiting."""
+
+
+class KeyState:
+    def __init__(self, api_key: str):
+        """Health and load bookkeeping for one API key."""
+        self.api_key = api_key
+        self.client: Optional[GeminiClient] = None
+        self.client_lock = threading.Lock()
+        self.in_flight = 0
+        self.recent_requests: deque = deque()
+        self.cooldown_until = 0.0
+        self.consecutive_rate_limits = 0
+        self.total_requests = 0
+        self.total_rate_limits = 0
+
+    @property
+    def label(self) -> str:
+        """Key identifier that is safe to log."""
+        return f"...{self.api_key[-4:]}"
+
+
+class GeminiKeyPool:
+    def __init__(self, api_keys: List[str], requests_per_minute: int = 15,
+                 cooldown_seconds: float = 30.0, max_cooldown_seconds: float = 600.0,
+                 max_attempts: int = 3, client_factory: Callable[..., GeminiClient] = GeminiClient):
+        """Initialize a pool of isolated Gemini clients, one per API key.
+
+        Calls go to the healthy key with the fewest requests in flight and the
+        most quota left in the current minute. A key that returns 429 cools
+        down, with the cool-down doubling on consecutive rate limits, and the
+        call is retried on another key up to ``max_attempts`` times in all.
+        """
+        keys = list(dict.fromkeys(key.strip() for key in api_keys if key and key.strip()))
+        if not keys:
+            raise ValueError("At least one Gemini API key is required")
+
+        self.requests_per_minute = requests_per_minute
+        self.cooldown_seconds = cooldown_seconds
+        self.max_cooldown_seconds = max_cooldown_seconds
+        self.max_attempts = max_attempts
+        self.client_factory = client_factory
+        self._keys = [KeyState(key) for key in keys]
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "GeminiKeyPool":
+        """Build a pool from GEMINI_API_KEYS (comma separated) or GEMINI_API_KEY."""
+        keys = os.getenv("GEMINI_API_KEYS", "") or os.getenv("GEMINI_API_KEY", "")
+        return cls(
+            keys.split(","),
+            requests_per_minute=int(os.getenv("GEMINI_KEY_RPM", "15")),
+            cooldown_seconds=float(os.getenv("GEMINI_KEY_COOLDOWN", "30")),
+        )
+
+    @contextmanager
+    def acquire(self) -> Iterator[GeminiClient]:
+        """Lease the best available client for the duration of a call."""
+        state = self._select()
+        rate_limits_before = state.total_rate_limits
+        try:
+            yield self._client_for(state)
+        finally:
+            with self._lock:
+                state.in_flight -= 1
+                if state.total_rate_limits == rate_limits_before:
+                    state.consecutive_rate_limits = 0
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """Per-key load and health, with keys masked."""
+        now = time.monotonic()
+        with self._lock:
+            return [
+                {
+                    "key": state.label,
+                    "in_flight": state.in_flight,
+                    "remaining_quota": self._remaining_quota(state, now),
+                    "cooling_down_for": max(0.0, round(state.cooldown_until - now, 1)),
+                    "total_requests": state.total_requests,
+                    "total_rate_limits": state.total_rate_limits,
+                }
+                for state in self._keys
+            ]
+
+    def __getattr__(self, name: str):
+        """Expose GeminiClient's public methods, each call running on a leased key."""
+        if name.startswith("_") or not callable(getattr(GeminiClient, name, None)):
+            raise AttributeError(name)
+
+        def call(*args, **kwargs):
+            if name.startswith(("stream_", "generate_stream")):
+                return self._stream(name, *args, **kwargs)
+            for attempt in range(1, self.max_attempts + 1):
+                # Raises NoAvailableKeyError once every key is cooling down
+                with self.acquire() as client:
+                    try:
+                        return getattr(client, name)(*args, **kwargs)
+                    except Exception as e:
+                        if not is_rate_limit_error(e) or attempt == self.max_attempts:
+                            raise
+                logging.warning(f"{name} was rate limited, retrying on another key")
+
+        return call
+
+    def _stream(self, name: str, *args, **kwargs) -> Iterator[str]:
+        """Hold the lease until a streamed response is fully consumed.
+
+        A stream rate limited before its first chunk is retried on another
+        key; once text has been yielded it cannot be taken back.
+        """
+        for attempt in range(1, self.max_attempts + 1):
+            started = False
+            with self.acquire() as client:
+                try:
+                    for chunk in getattr(client, name)(*args, **kwargs):
+                        started = True
+                        yield chunk
+                    return
+                except Exception as e:
+                    if started or not is_rate_limit_error(e) or attempt == self.max_attempts:
+                        raise
+            logging.warning(f"{name} was rate limited, retrying on another key")
+
+    def _select(self) -> KeyState:
+        """Pick the least-loaded healthy key and count the request against it."""
+        now = time.monotonic()
+        with self._lock:
+            healthy = [state for state in self._keys if state.cooldown_until <= now]
+            if not healthy:
+                wait = min(state.cooldown_until for state in self._keys) - now
+                raise NoAvailableKeyError(
+                    f"All Gemini API keys are rate limited. Please try again in {wait:.0f} seconds."
+                )
+
+            # Prefer keys with quota left this minute, then the fewest calls in flight
+            state = min(
+                healthy,
+                key=lambda s: (self._remaining_quota(s, now) <= 0, s.in_flight, -self._remaining_quota(s, now))
+            )
+            state.in_flight += 1
+            state.total_requests += 1
+            state.recent_requests.append(now)
+            return state
+
+    def _client_for(self, state: KeyState) -> GeminiClient:
+        """Create a key's client on first use."""
+        if state.client is None:
+            # Per-key lock: building a client is slow and must not block the pool
+            with state.client_lock:
+                if state.client is None:
+                    state.client = self.client_factory(
+                        state.api_key, on_rate_limit=lambda error, state=state: self._cool_down(state, error)
+                    )
+        return state.client
+
+    def _cool_down(self, state: KeyState, error: Exception):
+        """Take a rate-limited key out of rotation with exponential back-off."""
+        with self._lock:
+            state.consecutive_rate_limits += 1
+            state.total_rate_limits += 1
+            cooldown = min(
+                self.cooldown_seconds * 2 ** (state.consecutive_rate_limits - 1), self.max_cooldown_seconds
+            )
+            state.cooldown_until = time.monotonic() + cooldown
+        logging.warning(f"Gemini key {state.label} rate limited, cooling down for {cooldown:.0f}s: {error}")
+
+    def _remaining_quota(self, state: KeyState, now: float) -> int:
+        """Requests left in the sliding one-minute window."""
+        while state.recent_requests and now - state.recent_requests[0] > 60:
+            state.recent_requests.popleft()
+        return self.requests_per_minute - len(state.recent_requests)
@@ -1,7 +1,31 @@
+import os
+import json
+import hashlib
+from typing import Optional
+
+from modules.topic_graph import get_topic_graph, normalize, signature
+from modules.snapshot import section_name
+from modules.profiling import span
+
+# Retrieval results are cached for a day; a content change moves to new keys
+RETRIEVAL_CACHE_TTL = float(os.getenv("BHARATTUTOR_RETRIEVAL_CACHE_TTL", str(24 * 3600)))
+
 class NCERTKnowledgeBase:
-    def __init__(self):
-        """Initialize NCERT knowledge base with sample content."""
+    def __init__(self, cache=None, snapshot=None):
+        """Initialize NCERT knowledge base with sample content.
+        
+        ``cache`` is an optional SharedCache for retrieval results. With a
+        ``snapshot``, content added by earlier runs is restored and the topic
+        graph is loaded from it instead of being rebuilt.
+        """
         self.knowledge_base = self._create_sample_knowledge_base()
+        self.cache = cache
+        self.snapshot = snapshot
+        if snapshot is not None:
+            for _, added in snapshot.items("content:"):
+                self._insert_content(added["subject"], added["class_level"], added["topic"], added["content"])
+        self._fingerprint = self._content_fingerprint()
+        self.topic_graph = get_topic_graph(self.knowledge_base, self._fingerprint, snapshot)
     
     def _create_sample_knowledge_base(self) -> dict:
         """Create a sample knowledge base with NCERT content structure."""
@@ -101,6 +125,25 @@ class NCERTKnowledgeBase:
     
     def get_relevant_content(self, query: str, subject: str, class_level: str) -> str:
         """Get relevant content from knowledge base based on query, subject, and class."""
+        with span("retrieval", subject=subject, class_level=class_level):
+            return self._get_relevant_content(query, subject, class_level)
+    
+    def _get_relevant_content(self, query: str, subject: str, class_level: str) -> str:
+        topic = self.topic_graph.get(self.topic_graph.resolve(query, subject, class_level, exact=False))
+        if topic is None or topic.class_level != class_level or not topic.content_keys:
+            topic = None
+        if self.cache is None:
+            return self._search_content(query, subject, class_level, topic)
+        
+        # Queries about the same topic share one cache entry
+        key = [self._fingerprint, topic.id if topic else normalize(query), subject, class_level]
+        return self.cache.get_or_compute(
+            key, lambda: self._search_content(query, subject, class_level, topic), ttl=RETRIEVAL_CACHE_TTL,
+            cacheable=lambda content: not content.startswith("Error retrieving content")
+        )
+    
+    def _search_content(self, query: str, subject: str, class_level: str, topic=None) -> str:
+        """Content of the topic the query names, else a keyword search over the knowledge base."""
         try:
             # Get subject content for the specified class
             subject_content = self.knowledge_base.get(subject, {})
@@ -108,6 +151,10 @@ class NCERTKnowledgeBase:
             content_dict = class_content.get("content", {})
             topics_list = class_content.get("topics", [])
             
+            if topic is not None:
+                return "\n\n".join(f"Topic: {key}\nContent: {content_dict[key]}"
+                                    for key in topic.content_keys if key in content_dict)
+            
             # Simple keyword matching for relevant content
             query_lower = query.lower()
             relevant_content = []
@@ -135,21 +182,65 @@ class NCERTKnowledgeBase:
         except Exception:
             return []
     
+    def resolve_topic(self, text: str, subject: str, class_level: str, any_class: bool = False) -> Optional[str]:
+        """Canonical topic ID for a topic or chapter name of the class, or None if it is not in its curriculum.
+
+        With ``any_class`` a topic of another class is returned when the class has none.
+        """
+        return self.topic_graph.resolve(text, subject, class_level, any_class=any_class)
+    
+    def topic_key(self, text: str, subject: str, class_level: str) -> str:
+        """Cache key part for generated content about a topic.
+
+        Only spellings of the topic's own name collapse to its canonical ID.
+        A sub-topic alias such as "respiration" for Life Processes keeps its
+        text next to the ID, since the prompt asks about that text and the
+        answer differs from one sub-topic to the next.
+        """
+        normalized = normalize(text)
+        topic = self.topic_graph.get(self.resolve_topic(text, subject, class_level))
+        if topic is None:
+            return normalized
+        if signature(normalized) == signature(normalize(topic.name)):
+            return topic.id
+        return f"{topic.id}#{normalized}"
+    
+    def topic_name(self, text: str, subject: str, class_level: str) -> str:
+        """Curriculum name of a topic, so differently worded requests are counted together."""
+        topic = self.topic_graph.get(self.resolve_topic(text, subject, class_level))
+        return topic.name if topic else text.strip()
+    
     def add_content(self, subject: str, class_level: str, topic: str, content: str):
         """Add new content to the knowledge base."""
         try:
-            if subject not in self.knowledge_base:
-                self.knowledge_base[subject] = {}
-            
-            if class_level not in self.knowledge_base[subject]:
-                self.knowledge_base[subject][class_level] = {"topics": [], "content": {}}
-            
-            # Add topic to topics list if not already present
-            if topic not in self.knowledge_base[subject][class_level]["topics"]:
-                self.knowledge_base[subject][class_level]["topics"].append(topic)
+            self._insert_content(subject, class_level, topic, content)
+            self._fingerprint = self._content_fingerprint()
+            self.topic_graph = get_topic_graph(self.knowledge_base, self._fingerprint, self.snapshot)
             
-            # Add content
-            self.knowledge_base[subject][class_level]["content"][topic] = content
+            # Saved so the addition survives a restart
+            if self.snapshot is not None:
+                self.snapshot.put(section_name("content", [subject, class_level, topic]), {
+                    "subject": subject, "class_level": class_level, "topic": topic, "content": content
+                })
             
         except Exception as e:
             print(f"Error adding content: {e}")
+    
+    def _insert_content(self, subject: str, class_level: str, topic: str, content: str):
+        if subject not in self.knowledge_base:
+            self.knowledge_base[subject] = {}
+        
+        if class_level not in self.knowledge_base[subject]:
+            self.knowledge_base[subject][class_level] = {"topics": [], "content": {}}
+        
+        # Add topic to topics list if not already present
+        if topic not in self.knowledge_base[subject][class_level]["topics"]:
+            self.knowledge_base[subject][class_level]["topics"].append(topic)
+        
+        # Add content
+        self.knowledge_base[subject][class_level]["content"][topic] = content
+    
+    def _content_fingerprint(self) -> str:
+        """Hash of the content, so cached retrievals never outlive the content they came from."""
+        payload = json.dumps(self.knowledge_base, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
@@ -0,0 +1,288 @@
+import os
+import re
+import sys
+import glob
+import json
+import time
+import uuid
+import logging
+import functools
+import threading
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import Optional, Any, Dict, List, Tuple, Callable
+
+# "spans" (or "1") records timing spans, "sample" also samples call stacks;
+# unset or empty turns profiling off at no cost
+PROFILE_MODE = os.getenv("BHARATTUTOR_PROFILE", "").strip().lower()
+ENABLED = PROFILE_MODE in ("1", "true", "spans", "sample")
+SAMPLING = PROFILE_MODE == "sample"
+DEFAULT_PROFILE_DIR = os.path.join(os.getenv("BHARATTUTOR_DATA_DIR", "data"), "profiles")
+PROFILE_DIR = os.getenv("BHARATTUTOR_PROFILE_DIR", DEFAULT_PROFILE_DIR)
+SAMPLE_INTERVAL = float(os.getenv("BHARATTUTOR_PROFILE_INTERVAL_MS", "5")) / 1000
+MAX_STACK_DEPTH = 64
+
+_NULL = nullcontext()
+_current: ContextVar[Optional["Trace"]] = ContextVar("bharattutor_trace", default=None)
+
+
+class Trace:
+    def __init__(self, name: str, args: Optional[Dict[str, Any]] = None):
+        """Spans and stack samples recorded for one request, e.g. one rerun of an app mode."""
+        self.name = name
+        self.args = args or {}
+        self.id = uuid.uuid4().hex[:12]
+        self.started_at = time.time()
+        self.started_ns = time.perf_counter_ns()
+        self._lock = threading.Lock()
+        # (name, start ns, duration ns, thread ID, args)
+        self.spans: List[Tuple[str, int, int, int, Dict[str, Any]]] = []
+        # (time ns, thread ID, stack from the root as (function, file, line))
+        self.samples: List[Tuple[int, int, Tuple[Tuple[str, str, int], ...]]] = []
+        self.threads: Dict[int, str] = {}
+
+    def add_span(self, name: str, start_ns: int, duration_ns: int, args: Dict[str, Any]):
+        thread = threading.current_thread()
+        with self._lock:
+            self.threads[thread.ident] = thread.name
+            self.spans.append((name, start_ns - self.started_ns, duration_ns, thread.ident, args))
+
+    def add_sample(self, at_ns: int, thread_id: int, stack: Tuple[Tuple[str, str, int], ...]):
+        with self._lock:
+            self.samples.append((at_ns - self.started_ns, thread_id, stack))
+
+    def chrome_trace(self) -> Dict[str, Any]:
+        """Chrome trace event format, for chrome://tracing or Perfetto."""
+        pid = os.getpid()
+        events = [{"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+                  for tid, name in self.threads.items()]
+        events += [{"name": name, "ph": "X", "ts": start / 1000, "dur": duration / 1000,
+                    "pid": pid, "tid": tid, "args": args}
+                   for name, start, duration, tid, args in self.spans]
+        return {"traceEvents": events, "displayTimeUnit": "ms",
+                "otherData": {"trace": self.name, "id": self.id, "started_at": self.started_at, **self.args}}
+
+    def speedscope(self) -> Dict[str, Any]:
+        """Speedscope file with a flame graph of the spans per thread, plus the stack samples if any."""
+        frames: List[Dict[str, Any]] = []
+        frame_index: Dict[Tuple[str, str, int], int] = {}
+
+        def frame(key: Tuple[str, str, int]) -> int:
+            if key not in frame_index:
+                frame_index[key] = len(frames)
+                frames.append({"name": key[0], "file": key[1], "line": key[2]} if key[1] else {"name": key[0]})
+            return frame_index[key]
+
+        end = max([start + duration for _, start, duration, _, _ in self.spans] or [0]) / 1e6
+        profiles = []
+        for tid, thread_name in self.threads.items():
+            # Spans of one thread nest, so they form a valid open/close sequence
+            spans = sorted((s for s in self.spans if s[3] == tid), key=lambda s: (s[1], -s[2]))
+            events, open_ends = [], []
+            for name, start, duration, _, _ in spans:
+                while open_ends and open_ends[-1][1] <= start:
+                    key, closed_at = open_ends.pop()
+                    events.append({"type": "C", "frame": frame(key), "at": closed_at / 1e6})
+                finish = min(start + duration, open_ends[-1][1]) if open_ends else start + duration
+                events.append({"type": "O", "frame": frame((name, "", 0)), "at": start / 1e6})
+                open_ends.append(((name, "", 0), finish))
+            while open_ends:
+                key, closed_at = open_ends.pop()
+                events.append({"type": "C", "frame": frame(key), "at": closed_at / 1e6})
+            profiles.append({
+                "type": "evented", "name": f"{self.name} spans ({thread_name})",
+                "unit": "milliseconds", "startValue": 0, "endValue": end, "events": events,
+            })
+
+        for tid in sorted({tid for _, tid, _ in self.samples}):
+            samples = [(at, stack) for at, sample_tid, stack in self.samples if sample_tid == tid]
+            weights = [(next_at - at) / 1e6 for (at, _), (next_at, _) in zip(samples, samples[1:])]
+            weights.append(SAMPLE_INTERVAL * 1000)
+            profiles.append({
+                "type": "sampled", "name": f"{self.name} samples ({self.threads.get(tid, tid)})",
+                "unit": "milliseconds", "startValue": 0, "endValue": end,
+                "samples": [[frame(key) for key in stack] for _, stack in samples], "weights": weights,
+            })
+
+        return {"$schema": "https://www.speedscope.app/file-format-schema.json", "name": self.name,
+                "exporter": "bharattutor", "shared": {"frames": frames}, "profiles": profiles}
+
+    def save(self, directory: str = PROFILE_DIR) -> List[str]:
+        """Write the Chrome trace and speedscope files; returns their paths."""
+        os.makedirs(directory, exist_ok=True)
+        slug = re.sub(r"[^\w.-]+", "-", self.name).strip("-").lower() or "trace"
+        started = time.strftime("%Y%m%d-%H%M%S", time.localtime(self.started_at))
+        stem = os.path.join(directory, f"{started}-{slug}-{self.id}")
+        paths = []
+        for suffix, data in ((".trace.json", self.chrome_trace()), (".speedscope.json", self.speedscope())):
+            with open(stem + suffix, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, default=str)
+            paths.append(stem + suffix)
+        return paths
+
+
+class StackSampler:
+    def __init__(self, interval: float = SAMPLE_INTERVAL):
+        """Background thread that samples the call stacks of threads inside a trace."""
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._active: Dict[int, List[Trace]] = {}
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def register(self, thread_id: int, trace: Trace):
+        with self._lock:
+            self._active.setdefault(thread_id, []).append(trace)
+            self._wake.set()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="bt-profiler", daemon=True)
+                self._thread.start()
+
+    def unregister(self, thread_id: int, trace: Trace):
+        with self._lock:
+            traces = self._active.get(thread_id, [])
+            if trace in traces:
+                traces.remove(trace)
+            if not traces:
+                self._active.pop(thread_id, None)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                active = {tid: traces[-1] for tid, traces in self._active.items()}
+                if not active:
+                    self._wake.clear()
+            if not active:
+                # Sleep until a trace starts
+                self._wake.wait()
+                continue
+            time.sleep(self.interval)
+            now = time.perf_counter_ns()
+            frames = sys._current_frames()
+            for tid, trace in active.items():
+                frame = frames.get(tid)
+                stack = []
+                while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                    code = frame.f_code
+                    stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+                    frame = frame.f_back
+                if stack:
+                    trace.add_sample(now, tid, tuple(reversed(stack)))
+
+
+_sampler = StackSampler() if SAMPLING else None
+
+
+def span(name: str, **args):
+    """Time a block within the current trace; outside a trace the span becomes a trace of its own.
+
+    Returns a shared no-op context manager when profiling is off.
+    """
+    if not ENABLED:
+        return _NULL
+    if _current.get() is None:
+        return _trace(name, args)
+    return _span(name, args)
+
+
+def trace(name: str, **args):
+    """Record everything inside the block as one trace, written to PROFILE_DIR when it ends."""
+    if not ENABLED:
+        return _NULL
+    if _current.get() is not None:
+        return _span(name, args)
+    return _trace(name, args)
+
+
+def traced(name: str) -> Callable[[Callable], Callable]:
+    """Decorator form of ``trace``; functions are returned unchanged when profiling is off."""
+    def decorator(function: Callable) -> Callable:
+        if not ENABLED:
+            return function
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with trace(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def _span(name: str, args: Dict[str, Any]):
+    current = _current.get()
+    started = time.perf_counter_ns()
+    try:
+        yield
+    except BaseException as e:
+        args = {**args, "error": type(e).__name__}
+        raise
+    finally:
+        current.add_span(name, started, time.perf_counter_ns() - started, args)
+
+
+@contextmanager
+def _trace(name: str, args: Dict[str, Any]):
+    current = Trace(name, args)
+    previous = _current.get()
+    _current.set(current)
+    thread_id = threading.get_ident()
+    if _sampler is not None:
+        _sampler.register(thread_id, current)
+    try:
+        with _span(name, args):
+            yield current
+    finally:
+        if _sampler is not None:
+            _sampler.unregister(thread_id, current)
+        # Not Token.reset: a generator holding this block can be resumed in another
+        # context (Starlette iterates streams on threadpool threads), where reset raises
+        _current.set(previous)
+        try:
+            current.save()
+        except OSError as e:
+            logging.error(f"Could not write profile for {name}: {e}")
+
+
+def summarize(directory: str = PROFILE_DIR) -> Dict[str, Dict[str, Any]]:
+    """Mean time per span name for each kind of trace found in ``directory``."""
+    summary: Dict[str, Dict[str, Any]] = {}
+    for path in glob.glob(os.path.join(directory, "*.trace.json")):
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logging.warning(f"Skipping unreadable trace {path}: {e}")
+            continue
+        entry = summary.setdefault(data["otherData"]["trace"], {"traces": 0, "spans": {}})
+        entry["traces"] += 1
+        for event in data["traceEvents"]:
+            if event["ph"] == "X":
+                totals = entry["spans"].setdefault(event["name"], [0, 0.0])
+                totals[0] += 1
+                totals[1] += event["dur"] / 1000
+
+    for entry in summary.values():
+        entry["spans"] = {
+            name: {"calls": calls, "total_ms": round(total, 2), "ms_per_trace": round(total / entry["traces"], 2)}
+            for name, (calls, total) in sorted(entry["spans"].items(), key=lambda item: -item[1][1])
+        }
+    return summary
+
+
+def main() -> int:
+    """Print where the time goes: ``python -m modules.profiling [directory]``."""
+    directory = sys.argv[1] if len(sys.argv) > 1 else PROFILE_DIR
+    summary = summarize(directory)
+    if not summary:
+        print(f"No traces in {directory}; run with BHARATTUTOR_PROFILE=spans or sample")
+        return 1
+    for name, entry in sorted(summary.items()):
+        print(f"\n{name} ({entry['traces']} traces)")
+        for span_name, stats in entry["spans"].items():
+            print(f"  {span_name:<40} {stats['ms_per_trace']:10.2f} ms/trace  {stats['calls']:6d} calls")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,188 @@
+import re
+import string
+import textwrap
+from typing import Dict, Any
+
+
+def compact(text: str) -> str:
+    """Strip indentation and trailing spaces and collapse runs of blank lines."""
+    lines = [line.strip() for line in textwrap.dedent(text).strip().splitlines()]
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(lines))
+
+
+class PromptTemplate:
+    def __init__(self, name: str, system_instruction: str, template: str):
+        """Compile a prompt template once.
+
+        ``system_instruction`` is the static part shared by every request and is
+        sent as the model's system instruction; ``template`` holds only the
+        per-request fields.
+        """
+        self.name = name
+        self.system_instruction = compact(system_instruction)
+        self.template = compact(template)
+        self.fields = {field for _, field, _, _ in string.Formatter().parse(self.template) if field}
+
+    def render(self, **fields: Any) -> str:
+        """Fill in the per-request fields."""
+        missing = self.fields - fields.keys()
+        if missing:
+            raise KeyError(f"Prompt '{self.name}' is missing field(s): {', '.join(sorted(missing))}")
+        return self.template.format(**fields)
+
+
+EXPLANATION_INSTRUCTIONS = {
+    "Summary": "Provide a concise overview of the topic covering main points",
+    "Detailed": "Give a comprehensive explanation with examples and applications",
+    "Step-by-step": "Break down the topic into easy-to-follow steps"
+}
+
+HOMEWORK_INSTRUCTIONS = {
+    "Step-by-step solution": "Provide a complete step-by-step solution with explanations",
+    "Concept explanation": "Explain the underlying concepts needed to solve this problem",
+    "Hint only": "Give helpful hints to guide the student without giving away the answer",
+    "Similar examples": "Provide similar examples to help understand the pattern"
+}
+
+QUESTION_FORMATS = {
+    "Multiple Choice": "Provide 4 options (A, B, C, D) with one correct answer",
+    "True/False": "Create statements that can be answered with True or False",
+    "Short Answer": "Create questions requiring brief written answers"
+}
+
+ANSWER_FORMATS = {
+    "Multiple Choice": "A) [Option A]\nB) [Option B]\nC) [Option C]\nD) [Option D]",
+    "True/False": "Options: True / False",
+    "Short Answer": "Answer: [Brief answer expected]"
+}
+
+# Keys match the request types used for model routing in GeminiClient
+PROMPTS: Dict[str, PromptTemplate] = {
+    "answer": PromptTemplate(
+        "answer",
+        system_instruction="""
+            You are an AI tutor for Indian students following the NCERT curriculum.
+
+            Instructions:
+            1. Provide a clear, age-appropriate answer based on NCERT curriculum
+            2. Use simple language suitable for the student's class level
+            3. Include examples where helpful
+            4. If the question is beyond the curriculum, gently guide to appropriate level
+            5. Always be encouraging and supportive
+
+            Answer in markdown format with proper formatting.
+        """,
+        template="""
+            Student Details:
+            - Class: {class_level}
+            - Subject: {subject}
+
+            Question: {question}
+
+            Relevant NCERT Context: {context}
+        """
+    ),
+    "explain": PromptTemplate(
+        "explain",
+        system_instruction="""
+            You are an AI tutor for Indian students following the NCERT curriculum.
+
+            Guidelines:
+            1. Use language appropriate for the student's class level
+            2. Include relevant examples and analogies
+            3. Structure the explanation clearly
+            4. Connect to real-world applications where possible
+            5. Ensure accuracy according to NCERT standards
+        """,
+        template="""
+            Student Details:
+            - Class: {class_level}
+            - Subject: {subject}
+
+            Topic to Explain: {topic}
+
+            Relevant NCERT Context: {context}
+
+            Explanation Type: {explanation_type}
+            Instructions: {instructions}
+        """
+    ),
+    "homework": PromptTemplate(
+        "homework",
+        system_instruction="""
+            You are an AI tutor helping Indian students with their homework based on NCERT curriculum.
+
+            Guidelines:
+            1. Help the student learn, don't just give answers
+            2. Use teaching methods appropriate for the student's class level
+            3. Encourage independent thinking
+            4. Relate to NCERT curriculum standards
+            5. Be patient and supportive
+        """,
+        template="""
+            Student Details:
+            - Class: {class_level}
+            - Subject: {subject}
+
+            Homework Problem: {problem}
+
+            Relevant NCERT Context: {context}
+
+            Help Type Requested: {help_type}
+            Instructions: {instructions}
+        """
+    ),
+    "quiz": PromptTemplate(
+        "quiz",
+        system_instruction="""
+            You are an AI tutor creating quizzes for Indian students following NCERT curriculum.
+
+            Instructions:
+            1. Base every question on the requested chapter of the NCERT curriculum
+            2. Ensure questions are age-appropriate for the student's class
+            3. Match the requested difficulty level
+            4. Include clear, unambiguous questions
+            5. For multiple choice, ensure only one option is clearly correct
+            6. Follow the requested response format exactly
+        """,
+        template="""
+            Quiz Parameters:
+            - Subject: {subject}
+            - Class: {class_level}
+            - Chapter/Topic: {chapter}
+            - Number of Questions: {num_questions}
+            - Difficulty: {difficulty}
+            - Question Type: {question_type}
+            - {question_format}
+
+            Format your response as follows:
+
+            Question 1: [Question text]
+            {answer_format}
+            Correct Answer: [Answer]
+
+            Question 2: [Question text]
+            {answer_format}
+            Correct Answer: [Answer]
+
+            Continue for all {num_questions} questions.
+        """
+    ),
+    "grading": PromptTemplate(
+        "grading",
+        system_instruction="""
+            You are grading short answers written by students following the NCERT curriculum.
+
+            Mark an answer correct if it means the same as the expected answer, even with different
+            wording or minor spelling mistakes. Mark it incorrect if it is wrong, incomplete or off-topic.
+
+            Respond with only a JSON array, one object per item, like:
+            [{"id": 1, "correct": true}, {"id": 2, "correct": false}]
+        """,
+        template="""
+            Students: {class_level} {subject}
+
+            {items}
+        """
+    ),
+}
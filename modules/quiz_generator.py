@@ -1,164 +1,192 @@
+import os
 import json
 import logging
-from typing import Dict, List, Any
+import random
+import re
+import time
+from typing import Dict, List, Any, Optional, Callable, Iterator, TYPE_CHECKING
+
 from modules.gemini_client import GeminiClient
+from modules.answer_grader import ShortAnswerGrader
+from modules.quiz_parser import QuizStreamParser
+from modules.prompts import PROMPTS, QUESTION_FORMATS, ANSWER_FORMATS
+from modules.token_budget import TokenBudget
+from modules.snapshot import section_name
+
+if TYPE_CHECKING:
+    # NumPy is imported where it is used, so importing this module stays cheap
+    import numpy as np
+
+# Answer codes used by the vectorized grader
+BLANK_ANSWER = -1
+UNKNOWN_ANSWER = -2
+
+TRUE_ANSWERS = {"true", "t", "yes", "y", "correct", "right", "सही", "सत्य"}
+FALSE_ANSWERS = {"false", "f", "no", "n", "incorrect", "wrong", "गलत", "असत्य"}
+
+# Generated quizzes kept per set of quiz parameters; once the bank is full,
+# requests are served from it
+QUIZ_BANK_SIZE = int(os.getenv("BHARATTUTOR_QUIZ_BANK_SIZE", "3"))
+QUIZ_BANK_TTL = float(os.getenv("BHARATTUTOR_QUIZ_BANK_TTL", str(7 * 24 * 3600)))
 
 class QuizGenerator:
-    def __init__(self, gemini_client: GeminiClient):
-        """Initialize quiz generator with Gemini client."""
+    def __init__(self, gemini_client: GeminiClient, quiz_bank=None, knowledge_base=None, snapshot=None):
+        """Initialize quiz generator with Gemini client.
+        
+        ``quiz_bank`` is an optional SharedCache of generated quizzes, keyed by
+        the canonical chapter from ``knowledge_base`` when one is given. Banks
+        are also saved to ``snapshot``, so they outlive the cache.
+        """
         self.gemini_client = gemini_client
+        self.quiz_bank = quiz_bank
+        self.knowledge_base = knowledge_base
+        self.snapshot = snapshot
+        self.answer_grader = ShortAnswerGrader(gemini_client)
+        self.token_budget = TokenBudget()
     
     def generate_quiz(self, chapter: str, subject: str, class_level: str, 
-                     num_questions: int, difficulty: str, question_type: str) -> dict:
-        """Generate a quiz based on the specified parameters."""
+                     num_questions: int, difficulty: str, question_type: str,
+                     on_question: Optional[Callable[[Dict[str, Any]], None]] = None) -> dict:
+        """Generate a quiz based on the specified parameters.
+        
+        ``on_question`` is called with each question as soon as it has streamed in.
+        """
         try:
-            prompt = self._create_quiz_prompt(
+            questions = []
+            for question in self.generate_quiz_stream(
                 chapter, subject, class_level, num_questions, difficulty, question_type
-            )
+            ):
+                questions.append(question)
+                if on_question:
+                    on_question(question)
             
-            response = self.gemini_client.client.models.generate_content(
-                model=self.gemini_client.model,
-                contents=prompt
-            )
+            if not questions:
+                return {"error": "Failed to generate quiz. Please try again."}
             
-            if response.text:
-                # Parse the response to extract quiz data
-                quiz_data = self._parse_quiz_response(response.text, question_type)
-                return quiz_data
-            else:
-                return {"error": "Failed to generate quiz"}
+            return {
+                "questions": questions,
+                "total_questions": len(questions),
+                "question_type": question_type,
+                "chapter": chapter,
+                "subject": subject,
+                "class_level": class_level
+            }
                 
         except Exception as e:
             logging.error(f"Error generating quiz: {e}")
             return {"error": f"Error generating quiz: {str(e)}"}
     
-    def _create_quiz_prompt(self, chapter: str, subject: str, class_level: str,
-                           num_questions: int, difficulty: str, question_type: str) -> str:
-        """Create prompt for quiz generation."""
-        
-        question_format = {
-            "Multiple Choice": "Provide 4 options (A, B, C, D) with one correct answer",
-            "True/False": "Create statements that can be answered with True or False",
-            "Short Answer": "Create questions requiring brief written answers"
-        }
-        
-        prompt = f"""
-        You are an AI tutor creating a quiz for Indian students following NCERT curriculum.
-        
-        Quiz Parameters:
-        - Subject: {subject}
-        - Class: {class_level}
-        - Chapter/Topic: {chapter}
-        - Number of Questions: {num_questions}
-        - Difficulty: {difficulty}
-        - Question Type: {question_type}
+    def generate_quiz_stream(self, chapter: str, subject: str, class_level: str,
+                             num_questions: int, difficulty: str, question_type: str) -> Iterator[Dict[str, Any]]:
+        """Yield quiz questions one by one while the response is still streaming."""
+        chapter_key = self.knowledge_base.topic_key(chapter, subject, class_level) \
+            if self.knowledge_base is not None else chapter.strip().lower()
+        bank_key = [chapter_key, subject, class_level, num_questions, difficulty, question_type]
+        bank = self.quiz_bank.get(bank_key, []) if self.quiz_bank is not None and QUIZ_BANK_SIZE > 0 else []
+        if not bank and self.quiz_bank is not None and QUIZ_BANK_SIZE > 0 and self.snapshot is not None:
+            bank = self._restore_bank(bank_key)
+        if len(bank) >= QUIZ_BANK_SIZE > 0:
+            yield from random.choice(bank)
+            return
         
-        Instructions:
-        1. Create {num_questions} questions based on {chapter} from {subject} {class_level} NCERT curriculum
-        2. {question_format.get(question_type, 'Create appropriate questions')}
-        3. Ensure questions are age-appropriate for {class_level} students
-        4. Make difficulty level {difficulty}
-        5. Include clear, unambiguous questions
-        6. For multiple choice, ensure only one option is clearly correct
+        prompt = self._create_quiz_prompt(
+            chapter, subject, class_level, num_questions, difficulty, question_type
+        )
+        parser = QuizStreamParser(question_type)
         
-        Format your response as follows:
+        for chunk in self.gemini_client.generate_stream(prompt, "quiz", num_items=num_questions):
+            yield from parser.feed(chunk)
+        yield from parser.close()
         
-        Question 1: [Question text]
-        {self._get_answer_format(question_type)}
-        Correct Answer: [Answer]
+        if parser.skipped:
+            logging.warning(f"Skipped {parser.skipped} malformed quiz question(s)")
         
-        Question 2: [Question text]
-        {self._get_answer_format(question_type)}
-        Correct Answer: [Answer]
-        
-        Continue for all {num_questions} questions.
-        
-        Generate Quiz:
-        """
-        
-        return prompt
+        # Only complete quizzes go into the bank
+        if self.quiz_bank is not None and QUIZ_BANK_SIZE > 0 and len(parser.questions) >= num_questions:
+            bank = (self.quiz_bank.get(bank_key, []) + [parser.questions])[-QUIZ_BANK_SIZE:]
+            self.quiz_bank.set(bank_key, bank, ttl=QUIZ_BANK_TTL)
+            if self.snapshot is not None:
+                self.snapshot.put(section_name("quiz_bank", bank_key), {"stored_at": time.time(), "quizzes": bank})
     
-    def _get_answer_format(self, question_type: str) -> str:
-        """Get the answer format based on question type."""
-        if question_type == "Multiple Choice":
-            return "A) [Option A]\nB) [Option B]\nC) [Option C]\nD) [Option D]"
-        elif question_type == "True/False":
-            return "Options: True / False"
-        else:  # Short Answer
-            return "Answer: [Brief answer expected]"
+    def _restore_bank(self, bank_key: List[Any]) -> List[List[Dict[str, Any]]]:
+        """A quiz bank saved to the snapshot, for the rest of its QUIZ_BANK_TTL; an expired one is deleted."""
+        name = section_name("quiz_bank", bank_key)
+        record = self.snapshot.get(name)
+        if not record:
+            return []
+        # Banks saved before stored_at was recorded are treated as expired
+        remaining = QUIZ_BANK_TTL - (time.time() - record["stored_at"]) if isinstance(record, dict) else 0
+        if remaining <= 0:
+            self.snapshot.delete(name)
+            return []
+        self.quiz_bank.set(bank_key, record["quizzes"], ttl=remaining)
+        return record["quizzes"]
+    
+    def _create_quiz_prompt(self, chapter: str, subject: str, class_level: str,
+                           num_questions: int, difficulty: str, question_type: str) -> str:
+        """Create prompt for quiz generation."""
+        return self.token_budget.render(
+            PROMPTS["quiz"],
+            {
+                "chapter": chapter, "subject": subject, "class_level": class_level,
+                "num_questions": num_questions, "difficulty": difficulty, "question_type": question_type,
+                "question_format": QUESTION_FORMATS.get(question_type, "Create appropriate questions"),
+                "answer_format": ANSWER_FORMATS.get(question_type, ANSWER_FORMATS["Short Answer"]),
+            },
+            truncatable=(), checked=("chapter",)
+        )
     
     def _parse_quiz_response(self, response_text: str, question_type: str) -> Dict[str, Any]:
-        """Parse the AI response to extract quiz questions and answers."""
-        try:
-            questions: List[Dict[str, Any]] = []
-            lines = response_text.split('\n')
-            current_question: Dict[str, Any] = {}
-            
-            for line in lines:
-                line = line.strip()
-                
-                if line.startswith('Question '):
-                    # Save previous question if exists
-                    if current_question:
-                        questions.append(current_question)
-                    
-                    # Start new question
-                    question_text = line.split(':', 1)[1].strip() if ':' in line else line
-                    current_question = {"question": question_text}
-                    
-                    if question_type == "Multiple Choice":
-                        current_question["options"] = []
-                
-                elif question_type == "Multiple Choice" and line.startswith(('A)', 'B)', 'C)', 'D)')):
-                    option_text = line[2:].strip()  # Remove "A)" prefix
-                    if "options" not in current_question:
-                        current_question["options"] = []
-                    current_question["options"].append(option_text)
-                
-                elif line.startswith('Correct Answer:'):
-                    answer = line.replace('Correct Answer:', '').strip()
-                    current_question["correct_answer"] = answer
-            
-            # Add the last question
-            if current_question:
-                questions.append(current_question)
-            
-            quiz_data = {
-                "questions": questions,
-                "total_questions": len(questions),
-                "question_type": question_type
-            }
-            
-            return quiz_data
-            
-        except Exception as e:
-            logging.error(f"Error parsing quiz response: {e}")
-            # Return a fallback quiz structure
-            return {
-                "questions": [
-                    {
-                        "question": "Sample question about the topic",
-                        "options": ["Option A", "Option B", "Option C", "Option D"] if question_type == "Multiple Choice" else None,
-                        "correct_answer": "Option A" if question_type == "Multiple Choice" else "True"
-                    }
-                ],
-                "total_questions": 1,
-                "question_type": question_type,
-                "error": "Quiz parsing failed, showing sample question"
-            }
+        """Parse a complete AI response to extract quiz questions and answers."""
+        parser = QuizStreamParser(question_type)
+        questions = parser.feed(response_text) + parser.close()
+        
+        quiz_data: Dict[str, Any] = {
+            "questions": questions,
+            "total_questions": len(questions),
+            "question_type": question_type
+        }
+        if not questions:
+            quiz_data["error"] = "Quiz parsing failed, no questions could be read from the response"
+        
+        return quiz_data
     
     def evaluate_quiz(self, quiz_data: dict, user_answers: list) -> dict:
         """Evaluate user's quiz answers and provide feedback."""
         try:
             correct_count = 0
             total_questions = len(quiz_data["questions"])
+            question_type = quiz_data.get("question_type", "")
             detailed_results = []
             
+            user_answers = [
+                (user_answers[i] if i < len(user_answers) else "") or ""
+                for i in range(total_questions)
+            ]
+            
+            if question_type == "Short Answer":
+                gradings = self.answer_grader.grade(
+                    [
+                        {"question": q["question"], "correct_answer": q.get("correct_answer", ""), "answer": a}
+                        for q, a in zip(quiz_data["questions"], user_answers)
+                    ],
+                    quiz_data.get("subject", ""),
+                    quiz_data.get("class_level", "")
+                )
+            
             for i, question in enumerate(quiz_data["questions"]):
-                user_answer = user_answers[i] if i < len(user_answers) else ""
+                user_answer = user_answers[i]
                 correct_answer = question.get("correct_answer", "")
                 
-                is_correct = user_answer.lower().strip() == correct_answer.lower().strip()
+                ungraded = False
+                if question_type == "Short Answer":
+                    is_correct = gradings[i]["is_correct"]
+                    ungraded = gradings[i]["method"] == "ungraded"
+                else:
+                    vocabulary: Dict[str, int] = {}
+                    correct_code = self._answer_code(correct_answer, question, question_type, vocabulary)
+                    user_code = self._answer_code(user_answer, question, question_type, vocabulary)
+                    is_correct = user_code >= 0 and user_code == correct_code
                 if is_correct:
                     correct_count += 1
                 
@@ -166,7 +194,9 @@ class QuizGenerator:
                     "question": question["question"],
                     "user_answer": user_answer,
                     "correct_answer": correct_answer,
-                    "is_correct": is_correct
+                    "is_correct": is_correct,
+                    # Could not be checked automatically; counted as wrong for now
+                    "ungraded": ungraded
                 })
             
             score_percentage = (correct_count / total_questions) * 100 if total_questions > 0 else 0
@@ -183,6 +213,220 @@ class QuizGenerator:
             logging.error(f"Error evaluating quiz: {e}")
             return {"error": f"Error evaluating quiz: {str(e)}"}
     
+    def evaluate_quiz_batch(self, quiz_data: dict, answer_matrix, 
+                            student_ids: Optional[list] = None) -> dict:
+        """Grade a whole class in one vectorized pass.
+        
+        ``answer_matrix`` is a students x questions grid of raw answers. Returns
+        per-student scores plus per-question difficulty (share of students
+        answering correctly) and discrimination (corrected item-total
+        point-biserial correlation).
+        """
+        import numpy as np
+        
+        try:
+            questions = quiz_data["questions"]
+            question_type = quiz_data.get("question_type", "")
+            num_questions = len(questions)
+            
+            answers = self._to_answer_grid(answer_matrix, num_questions)
+            num_students = answers.shape[0]
+            if student_ids is None:
+                student_ids = list(range(1, num_students + 1))
+            elif len(student_ids) != num_students:
+                return {"error": "Number of student IDs does not match the answer matrix"}
+            
+            if num_students == 0 or num_questions == 0:
+                # Nothing to grade; the statistics below would divide by zero
+                return {
+                    "students": [
+                        {
+                            "student_id": student_id,
+                            "score": 0,
+                            "total": 0,
+                            "percentage": 0.0,
+                            "feedback": self._generate_feedback(0.0)
+                        }
+                        for student_id in student_ids
+                    ],
+                    "question_stats": [
+                        {
+                            "question": question["question"],
+                            "correct_answer": question.get("correct_answer", ""),
+                            "difficulty": 0.0,
+                            "discrimination": 0.0,
+                            "omitted": 0.0
+                        }
+                        for question in questions
+                    ],
+                    "total_students": num_students,
+                    "total_questions": num_questions,
+                    "mean_percentage": 0.0,
+                    "correct_matrix": [[] for _ in range(num_students)]
+                }
+            
+            codes, key = self._encode_answers(answers, questions, question_type)
+            
+            if question_type == "Short Answer":
+                correct = self._grade_short_answer_matrix(answers, questions, quiz_data)
+            else:
+                # A question without a recognisable key can never be answered correctly
+                correct = (codes == key) & (key >= 0)
+            scores = correct.sum(axis=1)
+            percentages = scores * 100.0 / num_questions
+            
+            students = [
+                {
+                    "student_id": student_id,
+                    "score": int(score),
+                    "total": num_questions,
+                    "percentage": float(percentage),
+                    "feedback": self._generate_feedback(float(percentage))
+                }
+                for student_id, score, percentage in zip(student_ids, scores, percentages)
+            ]
+            
+            difficulty = correct.mean(axis=0)
+            discrimination = self._item_discrimination(correct)
+            omitted = (codes == BLANK_ANSWER).mean(axis=0)
+            
+            question_stats = [
+                {
+                    "question": question["question"],
+                    "correct_answer": question.get("correct_answer", ""),
+                    "difficulty": float(difficulty[i]),
+                    "discrimination": float(discrimination[i]),
+                    "omitted": float(omitted[i])
+                }
+                for i, question in enumerate(questions)
+            ]
+            
+            return {
+                "students": students,
+                "question_stats": question_stats,
+                "total_students": num_students,
+                "total_questions": num_questions,
+                "mean_percentage": float(percentages.mean()) if num_students else 0.0,
+                "correct_matrix": correct.tolist()
+            }
+            
+        except Exception as e:
+            logging.error(f"Error evaluating quiz batch: {e}")
+            return {"error": f"Error evaluating quiz batch: {str(e)}"}
+    
+    def _grade_short_answer_matrix(self, answers: "np.ndarray", questions: List[Dict[str, Any]],
+                                   quiz_data: dict) -> "np.ndarray":
+        """Grade every short answer in the class with one batched grader run."""
+        import numpy as np
+        
+        items = [
+            {"question": question["question"], "correct_answer": question.get("correct_answer", ""),
+             "answer": answers[row, col]}
+            for row in range(answers.shape[0])
+            for col, question in enumerate(questions)
+        ]
+        gradings = self.answer_grader.grade(
+            items, quiz_data.get("subject", ""), quiz_data.get("class_level", "")
+        )
+        return np.array([g["is_correct"] for g in gradings], dtype=bool).reshape(answers.shape)
+    
+    def _to_answer_grid(self, answer_matrix, num_questions: int) -> "np.ndarray":
+        """Pad or trim raw answers into a students x questions string array."""
+        import numpy as np
+        
+        grid = np.full((len(answer_matrix), num_questions), "", dtype=object)
+        for row, student_answers in enumerate(answer_matrix):
+            student_answers = list(student_answers)[:num_questions]
+            grid[row, :len(student_answers)] = [
+                "" if answer is None else str(answer) for answer in student_answers
+            ]
+        return grid
+    
+    def _encode_answers(self, answers: "np.ndarray", questions: List[Dict[str, Any]],
+                        question_type: str) -> tuple:
+        """Convert raw answers and the answer key to integer codes.
+        
+        Each distinct answer in a column is normalized only once.
+        """
+        import numpy as np
+        
+        codes = np.empty(answers.shape, dtype=np.int32)
+        key = np.empty(len(questions), dtype=np.int32)
+        for col, question in enumerate(questions):
+            vocabulary: Dict[str, int] = {}
+            key[col] = self._answer_code(
+                question.get("correct_answer", ""), question, question_type, vocabulary
+            )
+            # A class usually gives only a handful of distinct answers per question
+            unique_answers, inverse = np.unique(answers[:, col].astype(str), return_inverse=True)
+            unique_codes = np.array([
+                self._answer_code(answer, question, question_type, vocabulary)
+                for answer in unique_answers
+            ], dtype=np.int32)
+            codes[:, col] = unique_codes[inverse.reshape(-1)]
+        return codes, key
+    
+    def _item_discrimination(self, correct: "np.ndarray") -> "np.ndarray":
+        """Correlation of each item with the total score on the remaining items."""
+        import numpy as np
+        
+        items = correct.astype(np.float64)
+        rest = items.sum(axis=1, keepdims=True) - items
+        items_centered = items - items.mean(axis=0)
+        rest_centered = rest - rest.mean(axis=0)
+        covariance = (items_centered * rest_centered).sum(axis=0)
+        spread = np.sqrt((items_centered ** 2).sum(axis=0) * (rest_centered ** 2).sum(axis=0))
+        return np.divide(covariance, spread, out=np.zeros_like(covariance), where=spread > 0)
+    
+    def _answer_code(self, answer: str, question: Dict[str, Any], question_type: str,
+                     vocabulary: Optional[Dict[str, int]] = None) -> int:
+        """Map an answer to a comparable integer code for its question.
+        
+        Multiple choice answers map to the option index whether given as a letter
+        ("b", "B)", "(b)", "Option B") or as the option text; True/False answers
+        map to 1/0. Anything else is interned into ``vocabulary`` by its
+        normalized text, so codes are only comparable within one vocabulary.
+        """
+        text = self._normalize_text(answer)
+        if not text:
+            return BLANK_ANSWER
+        
+        if question_type == "Multiple Choice":
+            options = question.get("options") or []
+            normalized_options = [self._normalize_text(option) for option in options]
+            if text in normalized_options:
+                return normalized_options.index(text)
+            
+            match = re.match(r"^(?:option\s*)?\(?([a-z])\)?(?:[.):]\s*|\s+|$)(.*)$", text)
+            if match:
+                letter, rest = match.groups()
+                index = ord(letter) - ord("a")
+                if index < len(options) and (not rest or rest == normalized_options[index]):
+                    return index
+                if rest in normalized_options:
+                    return normalized_options.index(rest)
+            return UNKNOWN_ANSWER
+        
+        if question_type == "True/False":
+            first_word = text.split()[0]
+            if text in TRUE_ANSWERS or first_word in TRUE_ANSWERS:
+                return 1
+            if text in FALSE_ANSWERS or first_word in FALSE_ANSWERS:
+                return 0
+            return UNKNOWN_ANSWER
+        
+        if vocabulary is None:
+            vocabulary = {}
+        return vocabulary.setdefault(text, len(vocabulary))
+    
+    def _normalize_text(self, text) -> str:
+        """Lowercase, trim and collapse whitespace/trailing punctuation."""
+        if text is None:
+            return ""
+        text = re.sub(r"[*_`]", "", str(text)).lower()
+        text = re.sub(r"\s+", " ", text).strip()
+        return text.rstrip(".!").strip()
+    
     def _generate_feedback(self, percentage: float) -> str:
         """Generate encouraging feedback based on quiz performance."""
         if percentage >= 90:
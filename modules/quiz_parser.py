@@ -0,0 +1,118 @@
+import logging
+import re
+from typing import Dict, List, Any, Optional
+
+# "Question 1:", "**Question 1:**", "Q1.", "Q.1)", "1." or "1)"
+QUESTION_PATTERN = re.compile(r"^(?:(?:question|ques|q)\s*\.?\s*(\d+)|(\d+)(?=\s*[.)]))\s*[:.)\-]?\s*(.*)$", re.IGNORECASE)
+# "A) text", "A. text", "(a) text", "a: text", "[A] text"
+OPTION_PATTERN = re.compile(r"^[(\[]?([a-d])\s*[).:\]]\s*(.+)$", re.IGNORECASE)
+CORRECT_ANSWER_PATTERN = re.compile(r"^(?:correct\s+answer|correct\s+option|right\s+answer)\s*[:\-]\s*(.*)$", re.IGNORECASE)
+ANSWER_PATTERN = re.compile(r"^(?:answer|ans)\s*[:\-]\s*(.*)$", re.IGNORECASE)
+OPTIONS_HINT_PATTERN = re.compile(r"^options?\s*[:\-]", re.IGNORECASE)
+
+
+class QuizStreamParser:
+    def __init__(self, question_type: str):
+        """Initialize an incremental parser for one quiz response."""
+        self.question_type = question_type
+        self.questions: List[Dict[str, Any]] = []
+        self.skipped = 0
+        self._buffer = ""
+        self._current: Optional[Dict[str, Any]] = None
+        self._last_number = 0
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        """Consume a chunk of streamed text and return questions completed by it."""
+        self._buffer += chunk
+        completed: List[Dict[str, Any]] = []
+
+        # Only whole lines are parsed; the tail waits for the next chunk
+        *lines, self._buffer = self._buffer.split("\n")
+        for line in lines:
+            completed.extend(self._parse_line(line))
+        return completed
+
+    def close(self) -> List[Dict[str, Any]]:
+        """Flush the remaining text at the end of the stream."""
+        completed = self._parse_line(self._buffer)
+        self._buffer = ""
+        completed.extend(self._finish_current())
+        return completed
+
+    def _parse_line(self, raw_line: str) -> List[Dict[str, Any]]:
+        """Update parser state with one line; returns any question it completes."""
+        line = self._clean(raw_line)
+        if not line:
+            return []
+
+        question_match = QUESTION_PATTERN.match(line)
+        if question_match and self._starts_question(question_match):
+            completed = self._finish_current()
+            self._last_number = int(question_match.group(1) or question_match.group(2))
+            self._current = {"question": question_match.group(3).strip()}
+            if self.question_type == "Multiple Choice":
+                self._current["options"] = []
+            return completed
+
+        if self._current is None:
+            return []
+
+        correct_match = CORRECT_ANSWER_PATTERN.match(line)
+        if correct_match:
+            # The correct answer is the last field of a question
+            self._current["correct_answer"] = self._clean(correct_match.group(1))
+            return self._finish_current()
+
+        answer_match = ANSWER_PATTERN.match(line)
+        if answer_match:
+            # "Answer:" may be followed by a "Correct Answer:" line, so wait
+            answer = self._clean(answer_match.group(1))
+            if not re.fullmatch(r"\[.*\]", answer):
+                self._current["correct_answer"] = answer
+            return []
+
+        if self.question_type == "Multiple Choice":
+            option_match = OPTION_PATTERN.match(line)
+            if option_match and len(self._current["options"]) < 4:
+                self._current["options"].append(option_match.group(2).strip())
+                return []
+
+        if OPTIONS_HINT_PATTERN.match(line):
+            return []
+
+        # Continuation of a question that spans several lines
+        if not self._current.get("options") and "correct_answer" not in self._current:
+            separator = " " if self._current["question"] else ""
+            self._current["question"] += separator + line
+        return []
+
+    def _starts_question(self, match: re.Match) -> bool:
+        """A bare "3." only starts a question when it continues the numbering."""
+        if match.group(1) or self._current is None:
+            return True
+        return int(match.group(2)) > self._last_number
+
+    def _finish_current(self) -> List[Dict[str, Any]]:
+        """Emit the question in progress if it is complete enough to use."""
+        question, self._current = self._current, None
+        if question is None:
+            return []
+
+        valid = bool(question.get("question")) and bool(question.get("correct_answer"))
+        if self.question_type == "Multiple Choice":
+            valid = valid and len(question.get("options", [])) >= 2
+
+        if not valid:
+            self.skipped += 1
+            logging.warning(f"Skipping incomplete quiz question: {question}")
+            return []
+
+        self.questions.append(question)
+        return [question]
+
+    def _clean(self, text: str) -> str:
+        """Strip markdown emphasis, headings and list bullets."""
+        text = re.sub(r"(\*\*|__|`)", "", text).strip()
+        text = re.sub(r"^#+\s*", "", text)
+        text = re.sub(r"^[-•*]\s+", "", text)
+        return text.strip()
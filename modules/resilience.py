@@ -0,0 +1,175 @@
+import time
+import logging
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Optional, Dict, Any, Callable, Iterator
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling an upstream that is failing."""
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        """Fail fast after ``failure_threshold`` consecutive upstream failures.
+
+        After ``reset_timeout`` seconds one trial call is let through; its
+        outcome closes the circuit again or restarts the wait.
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_running = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def allow(self) -> bool:
+        """Whether a call may go out now; a half-open circuit admits a single trial."""
+        with self._lock:
+            state = self._current_state()
+            if state == CLOSED:
+                return True
+            if state == HALF_OPEN and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def retry_after(self) -> float:
+        """Seconds until the next trial call, 0 if the circuit is closed."""
+        with self._lock:
+            if self._state == CLOSED:
+                return 0.0
+            return max(0.0, self._opened_at + self.reset_timeout - time.monotonic())
+
+    def record_success(self):
+        with self._lock:
+            if self._state != CLOSED:
+                logging.info("Circuit closed, upstream has recovered")
+            self._state = CLOSED
+            self._failures = 0
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_running = False
+            if self._state != CLOSED or self._failures >= self.failure_threshold:
+                if self._state == CLOSED:
+                    logging.warning(f"Circuit opened after {self._failures} consecutive failures")
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+
+    def release(self):
+        """End a trial call whose outcome says nothing about upstream health."""
+        with self._lock:
+            self._trial_running = False
+
+    def _current_state(self) -> str:
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._state = HALF_OPEN
+        return self._state
+
+
+class LatencyTracker:
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        """Recent call latencies per request type."""
+        self.window = window
+        self.min_samples = min_samples
+        self._lock = threading.Lock()
+        self._samples: Dict[str, deque] = {}
+
+    def record(self, name: str, seconds: float):
+        with self._lock:
+            self._samples.setdefault(name, deque(maxlen=self.window)).append(seconds)
+
+    def percentile(self, name: str, percent: float) -> Optional[float]:
+        """Latency percentile, or None until enough calls have been seen."""
+        with self._lock:
+            samples = sorted(self._samples.get(name, ()))
+        if len(samples) < self.min_samples:
+            return None
+        index = min(len(samples) - 1, int(len(samples) * percent / 100))
+        return samples[index]
+
+
+class CachedResponse:
+    def __init__(self, text: str):
+        """Stand-in for a model response served from the stale cache.
+
+        Iterating it yields itself, so streaming callers get a single chunk.
+        """
+        self.text = text
+        self.candidates = []
+        self.usage_metadata = None
+
+    def __iter__(self) -> Iterator["CachedResponse"]:
+        return iter([self])
+
+
+class StaleCache:
+    def __init__(self, max_entries: int = 512):
+        """Last good response text per prompt, least recently used evicted first."""
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Any, str]" = OrderedDict()
+
+    def get(self, key: Any) -> Optional[CachedResponse]:
+        with self._lock:
+            text = self._entries.get(key)
+            if text is None:
+                return None
+            self._entries.move_to_end(key)
+        return CachedResponse(text)
+
+    def put(self, key: Any, text: str):
+        if not text:
+            return
+        with self._lock:
+            self._entries[key] = text
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+_hedge_executor: Optional[ThreadPoolExecutor] = None
+_hedge_lock = threading.Lock()
+
+
+def hedged_call(function: Callable[[], Any], hedge_delay: float) -> Any:
+    """Run ``function`` and start a second attempt if it is still running after ``hedge_delay``.
+
+    The first attempt to succeed wins; the loser is left to finish in the
+    background and its result is discarded.
+    """
+    global _hedge_executor
+    with _hedge_lock:
+        if _hedge_executor is None:
+            _hedge_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="bt-hedge")
+
+    pending = {_hedge_executor.submit(function)}
+    done, pending = wait(pending, timeout=hedge_delay)
+    if not done:
+        logging.info(f"No response after {hedge_delay:.2f}s, sending a hedged request")
+        pending.add(_hedge_executor.submit(function))
+
+    error: Optional[BaseException] = None
+    while done or pending:
+        for future in done:
+            if future.exception() is None:
+                return future.result()
+            error = future.exception()
+        if not pending:
+            break
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+    raise error
@@ -0,0 +1,216 @@
+import os
+import sys
+import time
+import logging
+import threading
+from types import ModuleType, FunctionType
+from typing import Optional, Any, Dict, List
+
+from modules.conversation_memory import ConversationMemory
+from modules.snapshot import Snapshot, section_name
+
+# A session without a rerun for this long has its state written to the snapshot and dropped
+SESSION_IDLE_SECONDS = float(os.getenv("BHARATTUTOR_SESSION_IDLE_SECONDS", "1800"))
+# Per-session state resident across all sessions; beyond it the least recently used are spilled early
+SESSION_MEMORY_MB = float(os.getenv("BHARATTUTOR_SESSION_MEMORY_MB", "256"))
+# Spilled state not restored within this many seconds belongs to a closed tab and is deleted
+SESSION_TTL_SECONDS = float(os.getenv("BHARATTUTOR_SESSION_TTL_SECONDS", str(7 * 24 * 3600)))
+# Sessions used this recently are never spilled, so a running script does not lose its state
+MIN_IDLE_SECONDS = 60.0
+SWEEP_INTERVAL = 30.0
+PURGE_INTERVAL = 3600.0
+
+# Objects that are not per-session state and are not counted by deep_size
+_NOT_MEASURED = (type, ModuleType, FunctionType)
+
+
+def new_session_state() -> Dict[str, Any]:
+    return {"conversation_memory": ConversationMemory(), "current_quiz": None, "quiz_result": None}
+
+
+def deep_size(value: Any) -> int:
+    """Approximate bytes held by ``value`` and everything it references, counting shared objects once."""
+    seen = set()
+    stack = [value]
+    total = 0
+    while stack:
+        item = stack.pop()
+        if id(item) in seen or isinstance(item, _NOT_MEASURED):
+            continue
+        seen.add(id(item))
+        total += sys.getsizeof(item)
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset)):
+            stack.extend(item)
+        elif hasattr(item, "__dict__"):
+            stack.append(vars(item))
+    return total
+
+
+class SessionManager:
+    def __init__(self, snapshot: Optional[Snapshot] = None, idle_seconds: float = SESSION_IDLE_SECONDS,
+                 max_bytes: int = int(SESSION_MEMORY_MB * 1024 * 1024), ttl_seconds: float = SESSION_TTL_SECONDS):
+        """Owns each app session's conversation history and quiz state.
+
+        Clients, the knowledge base and the quiz generator are shared by all
+        sessions and are not kept here. The state of a session that has been
+        idle for ``idle_seconds`` is written to the snapshot and released,
+        and restored on the session's next rerun. The least recently used
+        sessions are spilled early once the total passes ``max_bytes``.
+        Spilled state not restored within ``ttl_seconds`` is deleted.
+        Without a snapshot, spilled state is discarded.
+        """
+        self.snapshot = snapshot
+        self.idle_seconds = idle_seconds
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._sessions: Dict[str, Dict[str, Any]] = {}
+        # Sessions dropped from memory whose record is still being written
+        self._spilling: Dict[str, Dict[str, Any]] = {}
+        # Held while a session is read back, so concurrent reruns restore it once
+        self._restore_locks: Dict[str, threading.Lock] = {}
+        self._last_seen: Dict[str, float] = {}
+        self._sizes: Dict[str, int] = {}
+        self._swept_at = time.monotonic()
+        self._purged_at = 0.0
+        self._spilled = 0
+        self._restored = 0
+
+    def session(self, session_id: str) -> Dict[str, Any]:
+        """The state of ``session_id``, restored from the snapshot if it was spilled."""
+        with self._lock:
+            state = self._sessions.get(session_id)
+            if state is None:
+                state = self._spilling.pop(session_id, None)
+                if state is not None:
+                    self._sessions[session_id] = state
+                    self._last_seen[session_id] = time.monotonic()
+            if state is None:
+                restore_lock = self._restore_locks.setdefault(session_id, threading.Lock())
+        if state is None:
+            # Read under the session's own lock, as snapshot I/O under the manager lock would stall every session
+            with restore_lock:
+                with self._lock:
+                    state = self._sessions.get(session_id)
+                if state is None:
+                    state = self._restore(session_id)
+                    with self._lock:
+                        self._sessions[session_id] = state
+                        self._last_seen[session_id] = time.monotonic()
+                        self._restore_locks.pop(session_id, None)
+        with self._lock:
+            self._last_seen[session_id] = time.monotonic()
+            sweep = time.monotonic() - self._swept_at > SWEEP_INTERVAL
+        if sweep:
+            self.sweep()
+        return state
+
+    def measure(self, session_id: str) -> int:
+        """Approximate bytes held by one resident session's state; 0 if it is not resident."""
+        with self._lock:
+            state = self._sessions.get(session_id)
+        return deep_size(state) if state is not None else 0
+
+    def sweep(self) -> int:
+        """Spill idle sessions, then the least recently used until under the memory limit."""
+        now = time.monotonic()
+        with self._lock:
+            self._swept_at = now
+            idle = [session_id for session_id, seen in self._last_seen.items()
+                    if now - seen > self.idle_seconds]
+        spilled = sum(self._spill(session_id, self.idle_seconds) for session_id in idle)
+
+        with self._lock:
+            resident = sorted(self._sessions, key=lambda session_id: self._last_seen[session_id])
+        sizes = {session_id: self.measure(session_id) for session_id in resident}
+        total = sum(sizes.values())
+        for session_id in resident:
+            if total <= self.max_bytes:
+                break
+            # Sessions are in LRU order, so once one is active every later one is too
+            if not self._spill(session_id, MIN_IDLE_SECONDS):
+                break
+            total -= sizes.pop(session_id)
+            spilled += 1
+
+        with self._lock:
+            self._sizes = sizes
+        if spilled:
+            logging.info(f"Spilled {spilled} sessions; {len(sizes)} resident, {total / 1e6:.1f} MB")
+        if self.snapshot is not None and now - self._purged_at > PURGE_INTERVAL:
+            self._purged_at = now
+            self.purge_expired()
+        return spilled
+
+    def purge_expired(self) -> int:
+        """Delete spilled state older than ``ttl_seconds``, e.g. from tabs that were closed."""
+        if self.snapshot is None:
+            return 0
+        cutoff = time.time() - self.ttl_seconds
+        expired = [name for name, record in self.snapshot.items("session:")
+                   if record.get("spilled_at", 0.0) < cutoff]
+        for name in expired:
+            self.snapshot.delete(name)
+        if expired:
+            logging.info(f"Deleted {len(expired)} expired spilled sessions")
+        return len(expired)
+
+    def stats(self) -> Dict[str, Any]:
+        """Resident session count and sizes as of the last sweep."""
+        with self._lock:
+            sizes: List[int] = sorted(self._sizes.values())
+            return {
+                "resident_sessions": len(self._sessions),
+                "resident_bytes": sum(sizes),
+                "largest_session_bytes": sizes[-1] if sizes else 0,
+                "spilled": self._spilled,
+                "restored": self._restored,
+            }
+
+    def _spill(self, session_id: str, min_idle: float) -> bool:
+        """Write a session's state to the snapshot and drop it, unless it was used in the last ``min_idle`` seconds."""
+        with self._lock:
+            # The session may have rerun since the sweep chose it
+            if time.monotonic() - self._last_seen.get(session_id, 0.0) <= min_idle:
+                return False
+            state = self._sessions.pop(session_id, None)
+            self._last_seen.pop(session_id, None)
+            self._sizes.pop(session_id, None)
+            if state is None:
+                return False
+            self._spilled += 1
+            if self.snapshot is None:
+                return True
+            # A rerun until the record is written takes the state back from here
+            self._spilling[session_id] = state
+
+        name = section_name("session", session_id)
+        record = dict(state, conversation_memory=state["conversation_memory"].to_dict(), spilled_at=time.time())
+        self.snapshot.put(name, record)
+        with self._lock:
+            reclaimed = self._spilling.pop(session_id, None) is None
+        if reclaimed:
+            # The session is resident again, so the record would only go stale
+            self.snapshot.delete(name)
+        return True
+
+    def _restore(self, session_id: str) -> Dict[str, Any]:
+        state = new_session_state()
+        if self.snapshot is None:
+            return state
+        name = section_name("session", session_id)
+        record = self.snapshot.get(name)
+        if record is None:
+            return state
+        record = dict(record)
+        record.pop("spilled_at", None)
+        state.update(record)
+        state["conversation_memory"] = ConversationMemory.from_dict(record["conversation_memory"])
+        # The session is resident again, so the spilled copy would only go stale
+        self.snapshot.delete(name)
+        with self._lock:
+            self._restored += 1
+        return state
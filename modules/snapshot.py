@@ -0,0 +1,343 @@
+import os
+import json
+import mmap
+import time
+import zlib
+import struct
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Optional, Any, Dict, List, Iterator, Tuple
+
+from modules.cache import serialize, deserialize
+
+try:
+    import fcntl
+except ImportError:
+    # Without advisory locks only one process may write a snapshot
+    fcntl = None
+
+DEFAULT_SNAPSHOT_PATH = os.path.join(os.getenv("BHARATTUTOR_DATA_DIR", "data"), "snapshot.bts")
+# An empty value disables snapshots
+SNAPSHOT_PATH = os.getenv("BHARATTUTOR_SNAPSHOT_PATH", DEFAULT_SNAPSHOT_PATH)
+
+FORMAT_VERSION = 1
+MAGIC = b"BTSNAP\r\n"
+# magic, format version, flags
+HEADER = struct.Struct("<8sHH4x")
+# marker, kind, name length, payload length, CRC-32 of name and payload
+RECORD = struct.Struct("<4sBxHII")
+RECORD_MARKER = b"BTRC"
+VALUE = 1
+TOMBSTONE = 0
+
+# Rewrite the file once superseded records outweigh live ones by this much
+COMPACT_MIN_BYTES = 1024 * 1024
+# Seconds between checks for records appended by other processes
+REFRESH_INTERVAL = 1.0
+
+
+class SnapshotError(RuntimeError):
+    """Raised for a file that is not a snapshot or was written by a newer version."""
+
+
+def section_name(prefix: str, key: Any) -> str:
+    """Record name for a structured key, e.g. a quiz bank key."""
+    digest = hashlib.sha256(json.dumps(key, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:32]
+    return f"{prefix}:{digest}"
+
+
+class Snapshot:
+    def __init__(self, path: str):
+        """Append-only, checksummed store of named sections, read through a memory map.
+
+        Every ``put`` appends one record and the newest record of a name wins,
+        so saving one student's history does not rewrite the knowledge base.
+        Each record carries a CRC-32; a torn record at the end of the file
+        (from a crash mid-write) is ignored and cut off by the next append.
+        Several processes may append to the same file.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._index: Dict[str, Tuple[int, int, int, int, int]] = {}
+        self._mmap: Optional[mmap.mmap] = None
+        self._file = None
+        self._inode = None
+        self._end = HEADER.size
+        self._live = 0
+        self._garbage = 0
+        self._checked_at = 0.0
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._locked_file() as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                f.write(HEADER.pack(MAGIC, FORMAT_VERSION, 0))
+                f.flush()
+        with self._lock:
+            self._reload()
+
+    def get(self, name: str, default: Any = None, fresh: bool = False) -> Any:
+        """Newest value stored under ``name``; a damaged record reads as missing.
+
+        Writes and deletes by other processes are picked up within
+        REFRESH_INTERVAL, or at once with ``fresh``.
+        """
+        with self._lock:
+            self._sync_if_due(fresh)
+            entry = self._index.get(name)
+            if entry is None or entry[4] == TOMBSTONE:
+                return default
+            data = self._read(entry)
+        if data is None:
+            logging.error(f"Snapshot record {name} in {self.path} failed its checksum")
+            return default
+        try:
+            return deserialize(data)
+        except Exception as e:
+            logging.error(f"Could not decode snapshot record {name}: {e}")
+            return default
+
+    def version(self, name: str, fresh: bool = False) -> Optional[Tuple[int, int]]:
+        """Token that changes whenever ``name`` is written or deleted; None if it has no value."""
+        with self._lock:
+            self._sync_if_due(fresh)
+            entry = self._index.get(name)
+            if entry is None or entry[4] == TOMBSTONE:
+                return None
+            # Offset and checksum, as compaction moves records to offsets used before
+            return entry[0], entry[3]
+
+    def names(self, prefix: str = "") -> List[str]:
+        with self._lock:
+            self._sync()
+            return [name for name, entry in self._index.items()
+                    if name.startswith(prefix) and entry[4] != TOMBSTONE]
+
+    def items(self, prefix: str = "") -> Iterator[Tuple[str, Any]]:
+        for name in self.names(prefix):
+            value = self.get(name)
+            if value is not None:
+                yield name, value
+
+    def put(self, name: str, value: Any) -> bool:
+        """Append a new version of ``name``; a failed write is logged and reported, not raised."""
+        try:
+            self._append(name, serialize(value), VALUE)
+            return True
+        except OSError as e:
+            logging.error(f"Could not write snapshot record {name} to {self.path}: {e}")
+            return False
+
+    def delete(self, name: str):
+        if name in self._index:
+            try:
+                self._append(name, b"", TOMBSTONE)
+            except OSError as e:
+                logging.error(f"Could not delete snapshot record {name} from {self.path}: {e}")
+
+    def verify(self) -> List[str]:
+        """Names of live records whose checksum does not match."""
+        with self._lock:
+            self._sync()
+            return [name for name, entry in self._index.items() if self._read(entry) is None]
+
+    def compact(self):
+        """Rewrite the file with only the newest intact record of each live name."""
+        with self._locked_file() as f, self._lock:
+            self._reload()
+            temp_path = self.path + ".tmp"
+            with open(temp_path, "wb") as out:
+                out.write(HEADER.pack(MAGIC, FORMAT_VERSION, 0))
+                for name, entry in self._index.items():
+                    offset, name_length, payload_length, _, kind = entry
+                    if kind == TOMBSTONE:
+                        continue
+                    if self._read(entry) is None:
+                        logging.error(f"Dropping snapshot record {name} that failed its checksum")
+                        continue
+                    out.write(self._mmap[offset:offset + RECORD.size + name_length + payload_length])
+                out.flush()
+                os.fsync(out.fileno())
+            os.replace(temp_path, self.path)
+            self._reload()
+        logging.info(f"Compacted snapshot {self.path} to {self._end} bytes")
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"records": len(self._index), "bytes": self._end,
+                    "live_bytes": self._live, "garbage_bytes": self._garbage}
+
+    def close(self):
+        with self._lock:
+            self._unmap()
+
+    def _append(self, name: str, payload: bytes, kind: int):
+        encoded_name = name.encode("utf-8")
+        crc = zlib.crc32(payload, zlib.crc32(encoded_name))
+        record = RECORD.pack(RECORD_MARKER, kind, len(encoded_name), len(payload), crc) + encoded_name + payload
+        with self._locked_file() as f, self._lock:
+            # Pick up records other processes appended, and the file a compaction swapped in
+            self._sync()
+            # Drop a torn record left by a crash
+            f.truncate(self._end)
+            f.seek(self._end)
+            f.write(record)
+            f.flush()
+            self._index_record(name, self._end, len(encoded_name), len(payload), crc, kind)
+            self._end += len(record)
+            compact = self._garbage > max(COMPACT_MIN_BYTES, self._live)
+        if compact:
+            self.compact()
+
+    @contextmanager
+    def _locked_file(self):
+        """The snapshot file opened for writing under an exclusive advisory lock."""
+        while True:
+            f = os.fdopen(os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644), "r+b")
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            # A compaction may have replaced the file while we waited for the lock
+            if os.fstat(f.fileno()).st_ino == os.stat(self.path).st_ino:
+                break
+            f.close()
+        try:
+            yield f
+        finally:
+            # Closing the file releases the lock
+            f.close()
+
+    def _sync_if_due(self, force: bool = False):
+        if force or time.monotonic() - self._checked_at > REFRESH_INTERVAL:
+            self._sync()
+
+    def _sync(self):
+        """Follow a file swapped in by compaction, then index new records."""
+        try:
+            replaced = os.stat(self.path).st_ino != self._inode
+        except FileNotFoundError:
+            replaced = False
+        if replaced:
+            self._reload()
+        else:
+            self._refresh()
+
+    def _reload(self):
+        """Map the file from the start and rebuild the index."""
+        self._unmap()
+        self._index.clear()
+        self._end = HEADER.size
+        self._live = self._garbage = 0
+        self._file = open(self.path, "rb")
+        self._inode = os.fstat(self._file.fileno()).st_ino
+        header = self._file.read(HEADER.size)
+        if len(header) < HEADER.size:
+            return
+        magic, version, _ = HEADER.unpack(header)
+        if magic != MAGIC:
+            raise SnapshotError(f"{self.path} is not a snapshot file")
+        if version > FORMAT_VERSION:
+            raise SnapshotError(f"{self.path} has format version {version}, newer than {FORMAT_VERSION}")
+        self._refresh()
+
+    def _refresh(self):
+        """Index records appended since the last scan."""
+        self._checked_at = time.monotonic()
+        size = os.fstat(self._file.fileno()).st_size
+        if size <= self._end:
+            return
+        self._remap(size)
+        position = self._end
+        while position + RECORD.size <= size:
+            marker, kind, name_length, payload_length, crc = RECORD.unpack_from(self._mmap, position)
+            record_end = position + RECORD.size + name_length + payload_length
+            if marker != RECORD_MARKER or record_end > size:
+                # A torn or damaged tail; everything before it stays readable
+                break
+            name_start = position + RECORD.size
+            name = self._mmap[name_start:name_start + name_length].decode("utf-8", "replace")
+            self._index_record(name, position, name_length, payload_length, crc, kind)
+            position = record_end
+        self._end = position
+
+    def _index_record(self, name: str, offset: int, name_length: int, payload_length: int,
+                      crc: int, kind: int):
+        size = RECORD.size + name_length + payload_length
+        previous = self._index.get(name)
+        if previous is not None:
+            previous_size = RECORD.size + previous[1] + previous[2]
+            self._garbage += previous_size
+            self._live -= previous_size
+        self._index[name] = (offset, name_length, payload_length, crc, kind)
+        self._live += size
+
+    def _read(self, entry: Tuple[int, int, int, int, int]) -> Optional[bytes]:
+        """Payload of a record, or None if its checksum does not match."""
+        offset, name_length, payload_length, crc, _ = entry
+        if self._mmap is None or offset + RECORD.size + name_length + payload_length > len(self._mmap):
+            self._remap(os.fstat(self._file.fileno()).st_size)
+        start = offset + RECORD.size
+        name = self._mmap[start:start + name_length]
+        payload = self._mmap[start + name_length:start + name_length + payload_length]
+        return payload if zlib.crc32(payload, zlib.crc32(name)) == crc else None
+
+    def _remap(self, size: int):
+        if self._mmap is not None:
+            self._mmap.close()
+        self._mmap = mmap.mmap(self._file.fileno(), size, access=mmap.ACCESS_READ)
+
+    def _unmap(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+_snapshot: Optional[Snapshot] = None
+_snapshot_lock = threading.Lock()
+
+
+def get_snapshot() -> Optional[Snapshot]:
+    """Process-wide snapshot at BHARATTUTOR_SNAPSHOT_PATH, or None when disabled or unreadable."""
+    global _snapshot
+    with _snapshot_lock:
+        if _snapshot is None and SNAPSHOT_PATH:
+            try:
+                _snapshot = Snapshot(SNAPSHOT_PATH)
+            except (OSError, SnapshotError) as e:
+                logging.error(f"Snapshots disabled, cannot open {SNAPSHOT_PATH}: {e}")
+                return None
+        return _snapshot
+
+
+def main() -> int:
+    """Inspect or maintain a snapshot: ``python -m modules.snapshot {stats,list,verify,compact} [path]``."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Inspect or maintain a Bharat Tutor snapshot file.")
+    parser.add_argument("command", choices=["stats", "list", "verify", "compact"])
+    parser.add_argument("path", nargs="?", default=SNAPSHOT_PATH)
+    args = parser.parse_args()
+
+    snapshot = Snapshot(args.path)
+    if args.command == "list":
+        for name in snapshot.names():
+            print(name)
+    elif args.command == "verify":
+        damaged = snapshot.verify()
+        for name in damaged:
+            print(f"damaged: {name}")
+        print(f"{len(snapshot.names()) - len(damaged)} intact, {len(damaged)} damaged")
+        return 1 if damaged else 0
+    elif args.command == "compact":
+        snapshot.compact()
+    print(json.dumps(snapshot.stats()))
+    return 0
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(main())
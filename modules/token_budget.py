@@ -0,0 +1,147 @@
+import os
+import math
+import logging
+import threading
+from typing import Dict, Any, Iterable, Optional
+
+from modules.prompts import PromptTemplate
+from modules.profiling import span
+
+# Gemini averages about 4 characters per token for English; Indic scripts
+# take roughly one token per 2 characters
+CHARS_PER_TOKEN = 4
+NON_ASCII_CHARS_PER_TOKEN = 2
+
+MAX_INPUT_TOKENS = int(os.getenv("GEMINI_MAX_INPUT_TOKENS", "6000"))
+MAX_FIELD_TOKENS = int(os.getenv("GEMINI_MAX_FIELD_TOKENS", "1500"))
+
+TRUNCATION_MARKER = "\n[...]"
+
+
+class PromptTooLargeError(ValueError):
+    """Raised when student input alone is over the token budget."""
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap local estimate of the number of tokens in ``text``."""
+    if not text:
+        return 0
+    non_ascii = sum(1 for char in text if ord(char) > 127)
+    ascii_chars = len(text) - non_ascii
+    return math.ceil(ascii_chars / CHARS_PER_TOKEN + non_ascii / NON_ASCII_CHARS_PER_TOKEN)
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Shorten text to about ``max_tokens``, cutting at a paragraph or sentence boundary."""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    if max_tokens <= 0:
+        return ""
+
+    # Binary search on length, since the estimate depends on the script
+    low, high = 0, len(text)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if estimate_tokens(text[:middle]) + estimate_tokens(TRUNCATION_MARKER) <= max_tokens:
+            low = middle
+        else:
+            high = middle - 1
+    cut = text[:low]
+
+    for boundary in ("\n\n", ". ", "\n", " "):
+        position = cut.rfind(boundary)
+        if position > len(cut) // 2:
+            cut = cut[:position + (1 if boundary == ". " else 0)]
+            break
+    return cut.rstrip() + TRUNCATION_MARKER
+
+
+class TokenBudget:
+    def __init__(self, max_input_tokens: int = MAX_INPUT_TOKENS, max_field_tokens: int = MAX_FIELD_TOKENS):
+        """Token limits for one prompt.
+
+        ``max_field_tokens`` caps each piece of student input, which is
+        rejected rather than cut; ``max_input_tokens`` caps the whole prompt,
+        which is brought under budget by truncating supporting fields such as
+        retrieved context.
+        """
+        self.max_input_tokens = max_input_tokens
+        self.max_field_tokens = max_field_tokens
+
+    def render(self, template: PromptTemplate, fields: Dict[str, Any],
+               truncatable: Iterable[str] = ("context",), checked: Iterable[str] = ()) -> str:
+        """Render a template within budget.
+
+        ``checked`` fields are student input and raise PromptTooLargeError when
+        too long. ``truncatable`` fields are shortened in the order given, so
+        list the least important first.
+        """
+        with span("prompt.render", template=template.name):
+            return self._render(template, fields, truncatable, checked)
+
+    def _render(self, template: PromptTemplate, fields: Dict[str, Any],
+                truncatable: Iterable[str], checked: Iterable[str]) -> str:
+        self.check(**{name: fields.get(name, "") for name in checked})
+
+        fields = dict(fields)
+        prompt = template.render(**fields)
+        overflow = self.prompt_tokens(template, prompt) - self.max_input_tokens
+
+        for name in truncatable:
+            if overflow <= 0:
+                break
+            value = str(fields.get(name, ""))
+            tokens = estimate_tokens(value)
+            fields[name] = truncate_to_tokens(value, tokens - overflow)
+            logging.info(f"Truncated {template.name} prompt field '{name}' by about {overflow} tokens")
+            prompt = template.render(**fields)
+            overflow = self.prompt_tokens(template, prompt) - self.max_input_tokens
+
+        if overflow > 0:
+            raise PromptTooLargeError(
+                f"The request is too long (about {overflow} tokens over the limit). Please shorten it and try again."
+            )
+        return prompt
+
+    def check(self, **student_input: Any):
+        """Reject student input that is over the per-field limit before any work is done."""
+        for name, value in student_input.items():
+            tokens = estimate_tokens(str(value))
+            if tokens > self.max_field_tokens:
+                raise PromptTooLargeError(
+                    f"The {name.replace('_', ' ')} is too long (about {tokens} tokens, "
+                    f"limit {self.max_field_tokens}). Please shorten it and try again."
+                )
+
+    def prompt_tokens(self, template: PromptTemplate, prompt: str) -> int:
+        """Estimated input tokens for a rendered prompt, system instruction included."""
+        return estimate_tokens(template.system_instruction) + estimate_tokens(prompt)
+
+
+class TokenUsage:
+    def __init__(self):
+        """Process-wide input/output token counts per request type."""
+        self._lock = threading.Lock()
+        self._totals: Dict[str, Dict[str, int]] = {}
+
+    def record(self, request_type: str, usage_metadata: Any, estimated_input_tokens: Optional[int] = None):
+        """Add the usage reported for one call."""
+        prompt_tokens = getattr(usage_metadata, "prompt_token_count", 0) or 0
+        output_tokens = getattr(usage_metadata, "candidates_token_count", 0) or 0
+        with self._lock:
+            totals = self._totals.setdefault(
+                request_type, {"calls": 0, "input_tokens": 0, "output_tokens": 0, "estimated_input_tokens": 0}
+            )
+            totals["calls"] += 1
+            totals["input_tokens"] += prompt_tokens
+            totals["output_tokens"] += output_tokens
+            totals["estimated_input_tokens"] += estimated_input_tokens or 0
+        logging.debug(f"{request_type} call used {prompt_tokens} input and {output_tokens} output tokens")
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Copy of the totals per request type."""
+        with self._lock:
+            return {request_type: dict(totals) for request_type, totals in self._totals.items()}
+
+
+TOKEN_USAGE = TokenUsage()
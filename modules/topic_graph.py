@@ -0,0 +1,421 @@
+import re
+import json
+import hashlib
+import threading
+import unicodedata
+from typing import Dict, List, Optional, Tuple, Iterable, Callable
+
+# Words that do not tell topics apart, ignored when comparing word sets
+STOPWORDS = {
+    "a", "an", "and", "the", "of", "its", "it", "to", "with", "in", "on", "our", "do", "does",
+    "how", "what", "where", "when", "from", "about", "is", "are", "chapter", "class"
+}
+
+# Other names students and the content use for a curriculum topic
+ALIASES: Dict[Tuple[str, str], List[str]] = {
+    ("Mathematics", "Knowing Our Numbers"): ["large numbers", "place value", "indian number system"],
+    ("Mathematics", "Playing with Numbers"): ["factors and multiples", "hcf and lcm", "prime numbers", "divisibility"],
+    ("Mathematics", "Integers"): ["negative numbers"],
+    ("Mathematics", "Basic Geometrical Ideas"): ["geometry basics", "points lines and angles"],
+    ("Mathematics", "Mensuration"): ["perimeter"],
+    ("Mathematics", "Ratio and Proportion"): ["ratios", "proportion", "unitary method"],
+    ("Mathematics", "Simple Equations"): ["linear equations", "solving equations"],
+    ("Mathematics", "The Triangle and its Properties"): ["triangles", "properties of triangles", "pythagoras theorem"],
+    ("Mathematics", "Comparing Quantities"): ["percentage", "percentages", "profit and loss", "simple interest"],
+    ("Mathematics", "Exponents and Powers"): ["exponents", "powers", "indices"],
+    ("Science", "Components of Food"): ["nutrients", "balanced diet"],
+    ("Science", "Separation of Substances"): ["separation methods", "filtration", "evaporation"],
+    ("Science", "Getting to Know Plants"): ["parts of a plant", "plants"],
+    ("Science", "The Living Organisms and Their Surroundings"): ["habitat", "adaptation"],
+    ("Science", "Motion and Measurement of Distances"): ["motion", "measurement"],
+    ("Science", "Light, Shadows and Reflections"): ["shadows"],
+    ("Science", "Fun with Magnets"): ["magnets"],
+    ("Science", "Water"): ["water cycle"],
+    ("Science", "Air Around Us"): ["air", "atmosphere"],
+    ("Science", "Garbage In, Garbage Out"): ["waste management", "composting"],
+    ("Science", "Chemical Reactions and Equations"): ["chemical reactions", "chemical equations", "balancing equations"],
+    ("Science", "Acids, Bases and Salts"): ["acids and bases", "acids", "bases", "ph scale"],
+    ("Science", "Metals and Non-metals"): ["metals", "non metals"],
+    ("Science", "Carbon and its Compounds"): ["carbon compounds", "organic chemistry"],
+    ("Science", "Periodic Classification of Elements"): ["periodic table", "modern periodic table"],
+    ("Science", "Life Processes"): ["nutrition", "respiration", "transportation in plants", "excretion"],
+    ("Science", "Control and Coordination"): ["nervous system", "hormones"],
+    ("Science", "How do Organisms Reproduce?"): ["reproduction"],
+    ("Science", "Heredity and Evolution"): ["heredity", "evolution", "genetics"],
+    ("Science", "Light - Reflection and Refraction"): ["reflection", "refraction", "mirrors and lenses"],
+    ("Science", "The Human Eye and Colourful World"): ["human eye", "dispersion of light"],
+    ("Science", "Magnetic Effects of Electric Current"): ["electromagnetism", "magnetic field"],
+    ("Science", "Our Environment"): ["ecosystem", "food chain"],
+    ("Science", "Management of Natural Resources"): ["natural resources", "conservation"],
+    ("Social Science", "From Hunting-Gathering to Growing Food"): ["hunter gatherers", "stone age"],
+    ("Social Science", "In the Earliest Cities"): ["indus valley civilization", "harappan civilization", "harappa"],
+    ("Social Science", "Kingdoms, Kings and an Early Republic"): ["mahajanapadas", "vajji"],
+    ("Social Science", "New Questions and Ideas"): ["buddhism", "jainism", "upanishads"],
+    ("Social Science", "Ashoka, The Emperor Who Gave Up War"): ["mauryan empire", "ashoka", "mauryas"],
+    ("English", "Grammar: Nouns, Pronouns, Verbs"): ["parts of speech", "nouns", "pronouns", "verbs"],
+    ("English", "Reading Comprehension"): ["comprehension", "unseen passage"],
+    ("English", "Poetry Analysis"): ["poetry", "poems"],
+    ("Hindi", "व्याकरण"): ["vyakaran", "hindi grammar"],
+    ("Hindi", "पत्र लेखन"): ["patra lekhan", "letter writing"],
+}
+
+# Topics that are needed before another, within a class or across classes.
+# A topic taught again in a later class automatically needs the earlier one.
+PREREQUISITES: Dict[str, List[Tuple[Tuple[str, str], Tuple[str, str]]]] = {
+    "Mathematics": [
+        (("Class 6", "Knowing Our Numbers"), ("Class 6", "Whole Numbers")),
+        (("Class 6", "Whole Numbers"), ("Class 6", "Integers")),
+        (("Class 6", "Whole Numbers"), ("Class 6", "Playing with Numbers")),
+        (("Class 6", "Fractions"), ("Class 6", "Decimals")),
+        (("Class 6", "Fractions"), ("Class 7", "Fractions and Decimals")),
+        (("Class 6", "Decimals"), ("Class 7", "Fractions and Decimals")),
+        (("Class 6", "Basic Geometrical Ideas"), ("Class 6", "Understanding Elementary Shapes")),
+        (("Class 6", "Basic Geometrical Ideas"), ("Class 7", "Lines and Angles")),
+        (("Class 6", "Understanding Elementary Shapes"), ("Class 7", "The Triangle and its Properties")),
+        (("Class 7", "The Triangle and its Properties"), ("Class 7", "Congruence of Triangles")),
+        (("Class 6", "Algebra"), ("Class 7", "Simple Equations")),
+        (("Class 6", "Algebra"), ("Class 7", "Algebraic Expressions")),
+        (("Class 7", "Integers"), ("Class 7", "Rational Numbers")),
+        (("Class 7", "Fractions and Decimals"), ("Class 7", "Rational Numbers")),
+        (("Class 6", "Mensuration"), ("Class 7", "Perimeter and Area")),
+        (("Class 6", "Ratio and Proportion"), ("Class 7", "Comparing Quantities")),
+    ],
+    "Science": [
+        (("Class 6", "Components of Food"), ("Class 10", "Life Processes")),
+        (("Class 6", "Electricity and Circuits"), ("Class 10", "Electricity")),
+        (("Class 6", "Fun with Magnets"), ("Class 10", "Magnetic Effects of Electric Current")),
+        (("Class 6", "Light, Shadows and Reflections"), ("Class 10", "Light - Reflection and Refraction")),
+        (("Class 6", "The Living Organisms and Their Surroundings"), ("Class 10", "Our Environment")),
+        (("Class 10", "Chemical Reactions and Equations"), ("Class 10", "Acids, Bases and Salts")),
+        (("Class 10", "Chemical Reactions and Equations"), ("Class 10", "Metals and Non-metals")),
+        (("Class 10", "Life Processes"), ("Class 10", "Control and Coordination")),
+        (("Class 10", "How do Organisms Reproduce?"), ("Class 10", "Heredity and Evolution")),
+        (("Class 10", "Light - Reflection and Refraction"), ("Class 10", "The Human Eye and Colourful World")),
+        (("Class 10", "Electricity"), ("Class 10", "Magnetic Effects of Electric Current")),
+    ],
+    "Social Science": [
+        (("Class 6", "From Hunting-Gathering to Growing Food"), ("Class 6", "In the Earliest Cities")),
+        (("Class 6", "Kingdoms, Kings and an Early Republic"), ("Class 6", "Ashoka, The Emperor Who Gave Up War")),
+    ],
+    "English": [
+        (("Class 6", "Reading Comprehension"), ("Class 6", "Poetry Analysis")),
+        (("Class 6", "Creative Writing"), ("Class 6", "Story Writing")),
+    ],
+}
+
+# Bump when the graph's stored form changes
+GRAPH_FORMAT = 2
+
+# Resolutions remembered per graph before the memo is cleared
+MAX_MEMO_ENTRIES = 4096
+_END = ""
+
+
+def normalize(text: str) -> str:
+    """Casefold, drop punctuation and collapse spaces; letters and combining marks of any script are kept."""
+    text = unicodedata.normalize("NFKC", text).casefold().replace("'", "").replace("’", "")
+    return " ".join("".join(" " if unicodedata.category(ch)[0] in "PSZC" else ch for ch in text).split())
+
+
+def signature(normalized: str) -> str:
+    """Order-insensitive form of a normalized name without stopwords or plural endings."""
+    words = {word[:-1] if len(word) > 3 and word.endswith("s") and not word.endswith("ss") else word
+             for word in normalized.split() if word not in STOPWORDS}
+    return " ".join(sorted(words))
+
+
+def class_number(class_level: str) -> int:
+    match = re.search(r"\d+", class_level or "")
+    return int(match.group()) if match else 0
+
+
+class Topic:
+    __slots__ = ("id", "name", "subject", "class_level", "aliases", "prerequisites", "cross_class", "content_keys")
+
+    def __init__(self, topic_id: str, name: str, subject: str, class_level: str):
+        """A curriculum topic; ``content_keys`` are the knowledge base entries that belong to it."""
+        self.id = topic_id
+        self.name = name
+        self.subject = subject
+        self.class_level = class_level
+        self.aliases: List[str] = []
+        self.prerequisites: List[str] = []
+        self.cross_class: List[str] = []
+        self.content_keys: List[str] = []
+
+
+class TopicGraph:
+    def __init__(self):
+        """Canonical curriculum topics with an alias trie, prerequisites and cross-class links.
+
+        Build it once per knowledge base with ``from_knowledge_base``; lookups
+        walk the trie and never scan the topic lists.
+        """
+        self.topics: Dict[str, Topic] = {}
+        self._trie: Dict[str, dict] = {}
+        self._signatures: Dict[str, List[str]] = {}
+        self._by_class: Dict[Tuple[str, str], List[str]] = {}
+        self._memo: Dict[Tuple[str, Optional[str], Optional[str], bool, bool], Optional[str]] = {}
+
+    @classmethod
+    def from_knowledge_base(cls, knowledge_base: dict) -> "TopicGraph":
+        """Build the graph from the ``{subject: {class: {"topics", "content"}}}`` knowledge base."""
+        graph = cls()
+        for subject, classes in knowledge_base.items():
+            for class_level, class_content in classes.items():
+                for name in class_content.get("topics", []):
+                    graph._add_topic(name, subject, class_level)
+
+        # Content entries join the topic they name, or become topics of their own
+        for subject, classes in knowledge_base.items():
+            for class_level, class_content in classes.items():
+                for key in class_content.get("content", {}):
+                    topic_id = graph.resolve(key, subject, class_level)
+                    topic = graph.topics.get(topic_id)
+                    if topic is None or topic.class_level != class_level:
+                        topic = graph._add_topic(key, subject, class_level)
+                    topic.content_keys.append(key)
+
+        graph._link()
+        graph._memo.clear()
+        return graph
+
+    def to_dict(self) -> dict:
+        """Plain-data form of the built graph, trie included, for snapshots."""
+        return {
+            "topics": [[getattr(topic, slot) for slot in Topic.__slots__] for topic in self.topics.values()],
+            "trie": self._trie,
+            "signatures": self._signatures,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "TopicGraph":
+        """Restore a graph saved with ``to_dict`` without rebuilding it."""
+        graph = cls()
+        for values in data["topics"]:
+            topic = Topic(*values[:4])
+            topic.aliases, topic.prerequisites, topic.cross_class, topic.content_keys = values[4:]
+            graph.topics[topic.id] = topic
+            graph._by_class.setdefault((topic.subject, topic.class_level), []).append(topic.id)
+        graph._trie = data["trie"]
+        graph._signatures = data["signatures"]
+        return graph
+
+    def get(self, topic_id: Optional[str]) -> Optional[Topic]:
+        return self.topics.get(topic_id) if topic_id else None
+
+    def resolve(self, text: str, subject: Optional[str] = None, class_level: Optional[str] = None,
+                exact: bool = True, any_class: bool = False) -> Optional[str]:
+        """Canonical topic ID for free text, or None if it names no known topic.
+
+        With ``exact`` the whole text must be a topic name or alias (in any
+        word order); otherwise the longest name or alias found inside the text
+        is used. Topics of ``subject`` and ``class_level`` are required; with
+        ``any_class`` other classes are allowed too, the nearest preferred.
+        """
+        memo_key = (text, subject, class_level, exact, any_class)
+        if memo_key in self._memo:
+            return self._memo[memo_key]
+
+        def usable(topic_ids: List[str]) -> List[str]:
+            return [topic_id for topic_id in topic_ids
+                    if (not subject or self.topics[topic_id].subject == subject)
+                    and (any_class or not class_level or self.topics[topic_id].class_level == class_level)]
+
+        normalized = normalize(text)
+        candidates = (usable(self._lookup(normalized)) or usable(self._signatures.get(signature(normalized), []))) \
+            if normalized else []
+        if not candidates and not exact and normalized:
+            candidates = self._scan(normalized, usable)
+        topic_id = self._best(candidates, subject, class_level)
+
+        if len(self._memo) >= MAX_MEMO_ENTRIES:
+            self._memo.clear()
+        self._memo[memo_key] = topic_id
+        return topic_id
+
+    def suggest(self, prefix: str, subject: Optional[str] = None, class_level: Optional[str] = None,
+                limit: int = 5) -> List[str]:
+        """Topic IDs whose name or an alias starts with ``prefix``."""
+        node = self._trie
+        for ch in normalize(prefix):
+            node = node.get(ch)
+            if node is None:
+                return []
+
+        found: List[str] = []
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            for key, child in node.items():
+                if key == _END:
+                    found.extend(topic_id for topic_id in child if topic_id not in found)
+                else:
+                    stack.append(child)
+        if subject:
+            found = [topic_id for topic_id in found if self.topics[topic_id].subject == subject]
+        found.sort(key=lambda topic_id: self._rank(topic_id, subject, class_level))
+        return found[:limit]
+
+    def prerequisites(self, topic_id: str, transitive: bool = False) -> List[str]:
+        """Topics needed before ``topic_id``, nearest first."""
+        topic = self.topics.get(topic_id)
+        if topic is None:
+            return []
+        if not transitive:
+            return list(topic.prerequisites)
+
+        seen, order, queue = {topic_id}, [], list(topic.prerequisites)
+        while queue:
+            current = queue.pop(0)
+            if current in seen:
+                continue
+            seen.add(current)
+            order.append(current)
+            queue.extend(self.topics[current].prerequisites)
+        return order
+
+    def topics_for(self, subject: str, class_level: str) -> List[str]:
+        return list(self._by_class.get((subject, class_level), []))
+
+    def _add_topic(self, name: str, subject: str, class_level: str) -> Topic:
+        topic_id = self._topic_id(subject, class_level, name)
+        topic = self.topics.get(topic_id)
+        if topic is not None:
+            return topic
+
+        topic = Topic(topic_id, name, subject, class_level)
+        self.topics[topic_id] = topic
+        self._by_class.setdefault((subject, class_level), []).append(topic_id)
+
+        names = [name] + ALIASES.get((subject, name), [])
+        # "Grammar: Nouns, ...", "Light - Reflection ...", "Light, Shadows ..." and
+        # "Fractions and Decimals" are also known by their first words
+        head = re.split(r":| - |,| and ", name)[0].strip()
+        if head != name and signature(normalize(head)):
+            names.append(head)
+        for alias in names:
+            self._add_alias(topic, normalize(alias))
+        return topic
+
+    def _add_alias(self, topic: Topic, alias: str):
+        if not alias or alias in topic.aliases:
+            return
+        topic.aliases.append(alias)
+        node = self._trie
+        for ch in alias:
+            node = node.setdefault(ch, {})
+        node.setdefault(_END, []).append(topic.id)
+        if signature(alias):
+            self._signatures.setdefault(signature(alias), []).append(topic.id)
+
+    def _link(self):
+        """Prerequisite edges and cross-class links."""
+        def add_edge(before: str, after: str):
+            if before == after or before in self.topics[after].prerequisites:
+                return
+            self.topics[after].prerequisites.append(before)
+            if self.topics[before].class_level != self.topics[after].class_level:
+                self.topics[before].cross_class.append(after)
+                self.topics[after].cross_class.append(before)
+
+        for subject, edges in PREREQUISITES.items():
+            for (before_class, before_name), (after_class, after_name) in edges:
+                before = self._topic_id(subject, before_class, before_name)
+                after = self._topic_id(subject, after_class, after_name)
+                if before in self.topics and after in self.topics:
+                    add_edge(before, after)
+
+        # The same topic taught again in a later class builds on the earlier one
+        by_name: Dict[Tuple[str, str], List[Topic]] = {}
+        for topic in self.topics.values():
+            by_name.setdefault((topic.subject, normalize(topic.name)), []).append(topic)
+        for same_topics in by_name.values():
+            same_topics.sort(key=lambda topic: class_number(topic.class_level))
+            for before, after in zip(same_topics, same_topics[1:]):
+                add_edge(before.id, after.id)
+
+    def _topic_id(self, subject: str, class_level: str, name: str) -> str:
+        return "/".join(normalize(part).replace(" ", "-") for part in (subject, class_level, name))
+
+    def _lookup(self, normalized: str) -> List[str]:
+        node = self._trie
+        for ch in normalized:
+            node = node.get(ch)
+            if node is None:
+                return []
+        return node.get(_END, [])
+
+    def _scan(self, normalized: str, usable: Callable[[List[str]], List[str]]) -> List[str]:
+        """Usable topics of the longest alias that appears in the text as whole words."""
+        best: List[str] = []
+        best_length = 0
+        length = len(normalized)
+        start = 0
+        while start < length:
+            node = self._trie
+            position = start
+            while position < length:
+                node = node.get(normalized[position])
+                if node is None:
+                    break
+                position += 1
+                if _END in node and (position == length or normalized[position] == " ") \
+                        and position - start > best_length and usable(node[_END]):
+                    best, best_length = usable(node[_END]), position - start
+            next_space = normalized.find(" ", start)
+            if next_space < 0:
+                break
+            start = next_space + 1
+        return best
+
+    def _rank(self, topic_id: str, subject: Optional[str], class_level: Optional[str]) -> Tuple[int, int, int]:
+        topic = self.topics[topic_id]
+        distance = abs(class_number(topic.class_level) - class_number(class_level)) if class_level else 0
+        return (int(bool(subject) and topic.subject != subject), distance,
+                int(bool(class_level) and class_number(topic.class_level) > class_number(class_level)))
+
+    def _best(self, candidates: Iterable[str], subject: Optional[str], class_level: Optional[str]) -> Optional[str]:
+        candidates = [topic_id for topic_id in candidates
+                      if not subject or self.topics[topic_id].subject == subject]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda topic_id: self._rank(topic_id, subject, class_level))
+
+
+_graphs: Dict[str, TopicGraph] = {}
+_graphs_lock = threading.Lock()
+
+
+_tables_fingerprint: Optional[str] = None
+
+
+def get_topic_graph(knowledge_base: dict, fingerprint: str, snapshot=None) -> TopicGraph:
+    """Topic graph for a knowledge base, built once per content fingerprint and shared by every session.
+
+    With a ``snapshot`` the built graph is stored there and loaded by the next
+    worker instead of being rebuilt.
+    """
+    global _tables_fingerprint
+    with _graphs_lock:
+        graph = _graphs.get(fingerprint)
+        if graph is not None:
+            return graph
+
+        if _tables_fingerprint is None:
+            tables = json.dumps([GRAPH_FORMAT, sorted(map(list, ALIASES.items())), PREREQUISITES], ensure_ascii=False)
+            _tables_fingerprint = hashlib.sha256(tables.encode("utf-8")).hexdigest()[:16]
+        # A stored graph is stale when the content or the alias and prerequisite tables change
+        version = f"{fingerprint}:{_tables_fingerprint}"
+        stored = snapshot.get("topic_graph") if snapshot is not None else None
+        if stored and stored.get("version") == version:
+            graph = TopicGraph.from_dict(stored["graph"])
+        else:
+            graph = TopicGraph.from_knowledge_base(knowledge_base)
+            if snapshot is not None:
+                snapshot.put("topic_graph", {"version": version, "graph": graph.to_dict()})
+
+        if len(_graphs) >= 8:
+            _graphs.clear()
+        _graphs[fingerprint] = graph
+        return graph